@@ -0,0 +1,62 @@
+# BatchSim throughput in SM-cycles per second, against the scalar
+# StateMachine on the same program.
+#
+# $ python bench/bench_batch.py
+
+import random
+import time
+
+import numpy as np
+
+from upioasm.emitter import PIOEmitter
+from upioasm.program import PIOProgram
+from upioasm.sim import PIOBlock
+from upioasm.sim.batch import BatchSim
+
+
+def counter() -> PIOProgram:
+    # Branchy, no delays: lanes diverge on their x-- trip counts
+    e = PIOEmitter()
+    e.pull()
+    e.out('x', 32)
+    e.jmp('x--', 2)
+    e.set('pins', 1)
+    e.jmp('', 0)
+    p = PIOProgram('counter')
+    p.set_opcodes(e.get_array())
+    return p
+
+
+def scalar(p: PIOProgram, cycles: int) -> float:
+    b = PIOBlock()
+    b.load(p)
+    sm = b.state_machine(0, p)
+    t0 = time.perf_counter()
+    for _ in range(cycles // 100):
+        while sm.put(random.randint(0, 50)):
+            pass
+        b.run(100)
+    return cycles / (time.perf_counter() - t0)
+
+
+def batch(p: PIOProgram, n: int, cycles: int) -> float:
+    bs = BatchSim(p, n, tx_depth=64)
+    bs.put(np.random.randint(0, 50, size=( n, 64 )))
+    t0 = time.perf_counter()
+    bs.run(cycles)
+    return n * cycles / (time.perf_counter() - t0)
+
+
+def main():
+    p = counter()
+    base = scalar(p, 200_000)
+    print(f'StateMachine         {base:14,.0f} SM-cycles/sec')
+    for n in ( 1_000, 10_000, 100_000 ):
+        r = batch(p, n, 300)
+        print(f'BatchSim n={n:<8,} {r:14,.0f} SM-cycles/sec  ({r / base:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
+
+#--#
@@ -0,0 +1,99 @@
+# Encoder throughput in instructions per second, checked and trusted
+#
+# $ python bench/bench_encode.py [--repeat N] [--rows N] [file.pio ...]
+#
+# Each corpus program is assembled once and turned back into
+# emitter calls by EmitterVisitor, compiled to a function.  Timing
+# then covers only the PIOEmitter / TrustedEmitter methods.  With
+# numpy, upioasm.bulk encodes and decodes the corpus opcodes tiled
+# to --rows.
+
+import argparse
+import glob
+import os
+import re
+import time
+
+from upioasm import pioasm
+from upioasm.decoder import disassemble
+from upioasm.emitter import PIOEmitter, TrustedEmitter
+from upioasm.xpileemitter import EmitterVisitor
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def emit_functions(filenames: list[str]) -> list[tuple]:
+    # ( side-set count, opt, emit(v), instructions ) per program
+    out = [ ]
+    for fn in filenames:
+        for p in pioasm().parse_file(fn):
+            count, opt, _ = p.get_side_set()
+            # The source writes delays as [n], as in the DSL
+            lines = [ re.sub(r'\[(\d+)\]', r'.delay(\1)', l)
+                      for l in disassemble(p, EmitterVisitor()) ]
+            g: dict = { }
+            exec('def emit(v):\n' + ''.join(f'    {l}\n' for l in lines)
+                 + '    return v\n', g)
+            out.append(( count + opt, opt, g['emit'], len(lines) ))
+    return out
+
+
+def bench(cls, programs: list[tuple], repeat: int) -> float:
+    best = float('inf')
+    n = 0
+    for _ in range(repeat):
+        n = 0
+        t0 = time.perf_counter()
+        for count, opt, emit, size in programs:
+            emit(cls(count, opt))
+            n += size
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+
+def bench_bulk(filenames: list[str], rows: int, repeat: int):
+    try:
+        import numpy as np
+    except ImportError:
+        print('bulk: no numpy')
+        return
+    from upioasm.bulk import FIELDS, decode, encode
+    # No side-set, the corpus opcodes as plain words
+    codes = np.array([ c for fn in filenames for p in pioasm().parse_file(fn)
+                       for c in p.get_opcodes() ], dtype=np.uint16)
+    codes = np.resize(codes, rows)
+    fields = [ decode(codes)[k] for k in FIELDS ]
+    assert (encode(*fields) == codes).all()
+    for name, run in (
+            ( 'bulk decode', lambda: decode(codes) ),
+            ( 'bulk encode', lambda: encode(*fields) ),
+            ( 'bulk trusted', lambda: encode(*fields, trusted=True) )):
+        best = float('inf')
+        for _ in range(max(1, repeat // 20)):
+            t0 = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - t0)
+        print(f'{name:14} {rows / best:14,.0f} instructions/sec')
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--repeat', type=int, default=200)
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    ap.add_argument('files', nargs='*')
+    args = ap.parse_args()
+    filenames = args.files or sorted(glob.glob(CORPUS + '/*.pio'))
+    programs = emit_functions(filenames)
+    for cls in ( PIOEmitter, TrustedEmitter ):
+        # Same opcodes either way
+        for count, opt, emit, size in programs:
+            assert list(emit(PIOEmitter(count, opt)).get_array()) == list(
+                emit(cls(count, opt)).get_array())
+        print(f'{cls.__name__:14} {bench(cls, programs, args.repeat):14,.0f} instructions/sec')
+    bench_bulk(filenames, args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
+
+#--#
@@ -0,0 +1,111 @@
+# Import time, RAM and modules loaded by each upioasm entry path
+#
+# $ python bench/bench_import.py
+#
+# Each path runs in a fresh interpreter.  Exits 1 when a path with a
+# budget loads a upioasm module outside it.
+
+import json
+import subprocess
+import sys
+
+from upioasm.bundle import pack_bundle
+from upioasm.program import PIOProgram
+
+
+def bundle() -> bytes:
+    p = PIOProgram('blink')
+    p.set_opcodes([ 0xe001, 0xe000, 0x0000 ])
+    return pack_bundle([ p ])
+
+
+ASM = '''
+from upioasm import pioasm
+pa = pioasm()
+@pa.asm_pio('blink')
+def blink():
+    with label('top'):
+        set(pins, 1)
+        set(pins, 0)
+        jmp('top')
+'''
+
+PARSE = '''
+from upioasm import pioasm
+pa = pioasm()
+pa.parse_str(""".program blink
+top:
+    set pins, 1
+    set pins, 0
+    jmp top
+""")
+'''
+
+BASE = { 'upioasm', 'upioasm.error', 'upioasm.program' }
+EMITTER = BASE | { 'upioasm.emitter', 'upioasm.opcodes' }
+
+# name => ( code, upioasm modules allowed or None )
+PATHS = {
+    'program': ( 'from upioasm.program import PIOProgram', BASE ),
+    'bundle': ( 'from upioasm import pioasm\n'
+                f'pioasm().add_bundle({bundle()!r})["blink"]',
+                BASE | { 'upioasm.bundle' } ),
+    'emitter': ( 'from upioasm import pioasm\n'
+                 'pioasm().emitter().set("pins", 1)',
+                 EMITTER ),
+    'assembler': ( ASM, EMITTER | {
+        'upioasm.assembler', 'upioasm.defines', 'upioasm.registers',
+        'upioasm.resolver', 'upioasm.syntax', 'upioasm.trace',
+    } ),
+    'parser': ( PARSE, None ),
+    'listing': ( ASM.replace('pioasm()', 'pioasm(tracer=Tracer(ALL, lambda s: None))')
+                    .replace('from upioasm import pioasm',
+                             'from upioasm import pioasm\nfrom upioasm.trace import Tracer, ALL'),
+                 None ),
+}
+
+# typing is loaded first, it is a stub on micropython.
+RUNNER = '''
+import json, sys, time, tracemalloc, typing
+code = sys.stdin.read()
+tracemalloc.start()
+t0 = time.perf_counter()
+exec(code, { })
+t1 = time.perf_counter()
+peak = tracemalloc.get_traced_memory()[1]
+mods = sorted(m for m in sys.modules if m == 'upioasm' or m.startswith('upioasm.'))
+print(json.dumps({ 'usec': int((t1 - t0) * 1e6), 'peak': peak, 'modules': mods }))
+'''
+
+
+def measure(code: str) -> dict:
+    out = subprocess.run([ sys.executable, '-c', RUNNER ], input=code,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+def check(name: str, result: dict) -> list[str]:
+    """Modules loaded by path `name` outside its budget"""
+    allowed = PATHS[name][1]
+    if allowed is None:
+        return [ ]
+    return [ m for m in result['modules'] if m not in allowed ]
+
+
+def main() -> int:
+    failed = 0
+    for name, ( code, allowed ) in PATHS.items():
+        r = measure(code)
+        extra = check(name, r)
+        print(f'{name:10} {r["usec"]:8,} usec {r["peak"]:10,} bytes'
+              f' {len(r["modules"]):3} modules')
+        if extra:
+            print(f'{"":10} not in budget: {", ".join(extra)}')
+            failed = 1
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+#--#
@@ -0,0 +1,210 @@
+# Heap used by each upioasm entry path, for the micropython unix port
+#
+# $ micropython bench/bench_mem.py [-o mem.json] [-l label] [path ...]
+#
+# Runs under CPython too (tracemalloc).  Per path the import of its
+# modules and the run are measured separately: bytes allocated, peak
+# and retained, allocation count where known, and time.  Paths share
+# one process, so an import only counts modules not already loaded
+# by an earlier path; name a single path for its full import cost.
+#
+# On micropython the gc is disabled while measuring, nothing is freed
+# so `alloc` is the total allocated and `peak` is the same (or from
+# micropython.mem_peak() on a MICROPY_MEM_STATS build).  The number
+# of allocations is not available there and is null.
+
+import gc
+import json
+import sys
+
+try:
+    from time import ticks_us, ticks_diff  # type: ignore[attr-defined]
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us() -> int:
+        return int(perf_counter() * 1e6)
+
+    def ticks_diff(a: int, b: int) -> int:
+        return a - b
+
+try:
+    import typing  # Not counted, a stub on micropython (lib/typing.py)
+except ImportError:
+    pass
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # type: ignore[assignment]
+
+
+def measure(fn) -> dict:
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        s0 = tracemalloc.take_snapshot()
+        t0 = ticks_us()
+        keep = fn()
+        t1 = ticks_us()
+        retained, peak = tracemalloc.get_traced_memory()
+        s1 = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        allocs = sum(max(0, s.count_diff) for s in s1.compare_to(s0, 'lineno'))
+        return { 'usec': ticks_diff(t1, t0), 'alloc': None, 'peak': peak,
+                 'retained': retained, 'allocs': allocs }
+    import micropython  # type: ignore[import-not-found]
+    gc.collect()
+    mem_peak = getattr(micropython, 'mem_peak', None)
+    a0 = gc.mem_alloc()  # type: ignore[attr-defined]
+    p0 = mem_peak() if mem_peak else 0
+    gc.disable()
+    t0 = ticks_us()
+    keep = fn()
+    t1 = ticks_us()
+    alloc = gc.mem_alloc() - a0  # type: ignore[attr-defined]
+    gc.enable()
+    gc.collect()
+    retained = gc.mem_alloc() - a0  # type: ignore[attr-defined]
+    return { 'usec': ticks_diff(t1, t0), 'alloc': alloc,
+             'peak': mem_peak() - p0 if mem_peak else alloc,
+             'retained': retained, 'allocs': None }
+
+
+def import_program():
+    from upioasm.program import PIOProgram
+    return PIOProgram
+
+def run_program():
+    from upioasm.program import PIOProgram
+    p = PIOProgram('blink')
+    p.set_opcodes([ 0xe001, 0xe000, 0x0000 ])
+    return p
+
+def import_bundle():
+    from upioasm import bundle
+    return bundle
+
+def run_bundle():
+    from upioasm import pioasm
+    pa = pioasm()
+    pa.add_bundle(BUNDLE)
+    return pa['blink']
+
+def import_emitter():
+    from upioasm import emitter
+    return emitter
+
+def run_emitter():
+    from upioasm import pioasm
+    e = pioasm().emitter(1)
+    for _ in range(4):
+        e.out('x', 1).side(0).delay(2)
+        e.jmp('!x', 3).side(1).delay(2)
+        e.jmp('', 0).side(1).delay(3)
+        e.nop().side(0).delay(3)
+    return e.get_array()
+
+def import_assembler():
+    from upioasm import assembler, syntax
+    return assembler, syntax
+
+def run_assembler():
+    from upioasm import pioasm
+    pa = pioasm()
+    g = { }
+    exec(ASM, g)
+    return g['blink'](pa)
+
+def import_parser():
+    from upioasm import parser
+    return parser
+
+def run_parser():
+    from upioasm import pioasm
+    return pioasm().parse_str(SOURCE)
+
+
+ASM = '''
+def blink(pa):
+    @pa.asm_pio('blink')
+    def blink():
+        with label('top'):
+            set(pins, 1)            [7]
+            set(pins, 0)            [7]
+            jmp('top')
+    return blink
+'''
+
+SOURCE = '''
+.program ws2812
+.side_set 1
+.define public T1 2
+.define public T2 5
+.define public T3 3
+.wrap_target
+bitloop:
+    out x, 1       side 0 [T3 - 1]
+    jmp !x do_zero side 1 [T1 - 1]
+do_one:
+    jmp  bitloop   side 1 [T2 - 1]
+do_zero:
+    nop            side 0 [T2 - 1]
+.wrap
+'''
+
+def make_bundle() -> bytes:
+    # pack_bundle() of run_program(), as it would be frozen.  Then
+    # unloaded, so each path still imports upioasm from scratch.
+    from upioasm.bundle import pack_bundle
+    data = pack_bundle([ run_program() ])
+    for name in list(sys.modules):
+        if name == 'upioasm' or name.startswith('upioasm.'):
+            del sys.modules[name]
+    return data
+
+BUNDLE = make_bundle()
+
+PATHS = {
+    'program': ( import_program, run_program ),
+    'bundle': ( import_bundle, run_bundle ),
+    'emitter': ( import_emitter, run_emitter ),
+    'assembler': ( import_assembler, run_assembler ),
+    'parser': ( import_parser, run_parser ),
+}
+
+
+def main(argv: list[str]) -> int:
+    out = None
+    label = ''
+    names = [ ]
+    args = iter(argv)
+    for a in args:
+        if a == '-o':
+            out = next(args)
+        elif a == '-l':
+            label = next(args)
+        elif a in PATHS:
+            names.append(a)
+        else:
+            print('usage: bench_mem.py [-o file.json] [-l label] [path ...]')
+            return 2
+    results = { }
+    for name in names or PATHS:
+        imp, run = PATHS[name]
+        results[name] = { 'import': measure(imp), 'run': measure(run) }
+        r = results[name]['run']
+        i = results[name]['import']
+        print('%-10s import %7d B %7d us   run %7d B peak %7d B %7d us' % (
+            name, i['retained'], i['usec'], r['retained'], r['peak'], r['usec']))
+    doc = { 'label': label, 'impl': sys.implementation.name, 'results': results }
+    if out:
+        with open(out, 'w') as fobj:
+            json.dump(doc, fobj)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#--#
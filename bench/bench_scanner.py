@@ -0,0 +1,33 @@
+# Scanner throughput: char-at-a-time Scanner vs LineScanner
+#
+# $ python bench/bench_scanner.py [file.pio ...]
+
+import sys
+import time
+
+from io import StringIO
+
+from upioasm.parser import Scanner, LineScanner
+
+
+def bench(scanner, source: str, repeat: int):
+    t0 = time.perf_counter()
+    count = 0
+    for _ in range(repeat):
+        for tok in scanner.token_reader(StringIO(source).readline):
+            count += 1
+    return count / (time.perf_counter() - t0)
+
+
+def main(filenames: list[str]):
+    source = ''.join(open(fn).read() for fn in filenames)
+    before = bench(Scanner(), source, 200)
+    after = bench(LineScanner(), source, 200)
+    print(f'Scanner      {before:12,.0f} tokens/sec')
+    print(f'LineScanner  {after:12,.0f} tokens/sec  ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [ 'tests/ws2812.pio' ])
+
+#--#
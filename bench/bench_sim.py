@@ -0,0 +1,61 @@
+# Simulator throughput in PIO clock cycles per second
+#
+# $ python bench/bench_sim.py
+
+import time
+
+from upioasm.emitter import PIOEmitter
+from upioasm.program import PIOProgram
+from upioasm.sim import PIOBlock
+
+
+def blink() -> PIOProgram:
+    # As examples/pio_1hz.py, 2000 cycles per period
+    e = PIOEmitter()
+    e.irq(0)
+    e.set('pins', 1)
+    e.set('x', 31).delay(5)
+    e.nop().delay(29)
+    e.jmp('x--', 3)
+    e.nop()
+    e.set('pins', 0)
+    e.set('x', 31).delay(5)
+    e.nop().delay(29)
+    e.jmp('x--', 8)
+    p = PIOProgram('blink')
+    p.set_opcodes(e.get_array())
+    return p
+
+
+def tight() -> PIOProgram:
+    # No delays, one instruction per cycle
+    e = PIOEmitter()
+    e.jmp('x--', 0)
+    p = PIOProgram('tight')
+    p.set_opcodes(e.get_array())
+    return p
+
+
+def bench(program: PIOProgram, nsm: int, cycles: int) -> float:
+    b = PIOBlock()
+    b.load(program)
+    for i in range(nsm):
+        b.state_machine(i, program)
+    t0 = time.perf_counter()
+    b.run(cycles)
+    return cycles / (time.perf_counter() - t0)
+
+
+def main():
+    for name, p, nsm, cycles in (
+            ( 'blink, 1 SM', blink(), 1, 2_000_000 ),
+            ( 'blink, 4 SMs', blink(), 4, 2_000_000 ),
+            ( 'tight, 1 SM', tight(), 1, 200_000 ),
+            ( 'tight, 4 SMs', tight(), 4, 100_000 )):
+        print(f'{name:14} {bench(p, nsm, cycles):14,.0f} cycles/sec')
+
+
+if __name__ == '__main__':
+    main()
+
+#--#
@@ -0,0 +1,231 @@
+# Throughput of each assembler stage over a corpus of .pio programs
+#
+# $ python bench/bench_suite.py [--save base.json] [--compare base.json]
+#                               [--repeat N] [--max-regress PCT] [file.pio ...]
+#
+# The corpus defaults to bench/corpus/*.pio, hand-written equivalents
+# of the SDK examples.  Each stage runs over the whole corpus, the
+# best of --repeat runs is kept, then one more run under tracemalloc
+# gives the peak.  scan, parse, transpile and assemble start from the
+# text; resolve starts from the parsed records and emit from resolved
+# arguments, both prepared before timing.  --compare prints the change against a --save'd
+# baseline, and exits 1 when a stage is more than --max-regress
+# percent slower.
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from io import StringIO
+
+from upioasm import pioasm
+from upioasm.emitter import InstructionVisitor, PIOEmitter
+from upioasm.parser import InstructionRecord, LineScanner, PIOParser
+from upioasm.pipeline import PIOPipeline
+from upioasm.resolver import ResolverVisitor
+from upioasm.xpileemitter import EmitterVisitor
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def scan(sources: list[str]) -> int:
+    n = 0
+    for source in sources:
+        for tok in LineScanner().token_reader(StringIO(source).readline):
+            n += 1
+    return n
+
+
+def parse(sources: list[str]) -> int:
+    n = 0
+    for source in sources:
+        for stmt in PIOParser().parse('-', StringIO(source).readline):
+            n += 1
+    return n
+
+
+def transpile(sources: list[str]) -> int:
+    # Records to emitter calls, symbols left as they are
+    n = 0
+    for source in sources:
+        v = EmitterVisitor()
+        for stmt in PIOParser().parse('-', StringIO(source).readline):
+            if isinstance(stmt, InstructionRecord):
+                stmt.visit(v)
+        n += len(list(v))
+    return n
+
+
+def assemble(sources: list[str]) -> int:
+    # Parse, resolve and emit, see upioasm.pipeline
+    n = 0
+    for source in sources:
+        for p in pioasm().parse_str(source):
+            n += len(p)
+    return n
+
+
+class _Capture(PIOPipeline):
+    # The pipeline, keeping ( defines, side-set, records ) per program
+    def __init__(self, pa):
+        super().__init__(pa)
+        self.captured: list[tuple] = [ ]
+
+    def _instruction(self, r):
+        super()._instruction(r)
+        if not self.captured or self.captured[-1][0] is not self._pdefs:
+            self.captured.append(( self._pdefs, self._side_set, [ ] ))
+        self.captured[-1][2].append(r)
+
+
+class _Calls(InstructionVisitor):
+    # Records the calls made, to replay them on an emitter
+    def __init__(self):
+        self.calls: list[tuple] = [ ]
+
+    def side(self, side): return self._call('side', ( side, ), { })
+    def delay(self, delay): return self._call('delay', ( delay, ), { })
+    def jmp(self, *args): return self._call('jmp', args, { })
+    def wait(self, *args, **kw): return self._call('wait', args, kw)
+    def in_(self, *args): return self._call('in_', args, { })
+    def out(self, *args): return self._call('out', args, { })
+    def push(self, **kw): return self._call('push', ( ), kw)
+    def pull(self, **kw): return self._call('pull', ( ), kw)
+    def mov(self, *args): return self._call('mov', args, { })
+    def irq(self, *args, **kw): return self._call('irq', args, kw)
+    def set(self, *args): return self._call('set', args, { })
+    def nop(self): return self._call('nop', ( ), { })
+
+    def _call(self, name: str, args: tuple, kw: dict):
+        self.calls.append(( name, args, kw ))
+        return self
+
+
+def records(sources: list[str]) -> list[tuple]:
+    # ( defines, side-set, records ) per program, labels all defined
+    out = [ ]
+    for source in sources:
+        pl = _Capture(pioasm())
+        pl.run('-', StringIO(source).readline)
+        out.extend(pl.captured)
+    return out
+
+
+def resolve(programs: list[tuple]) -> int:
+    # Symbols and expressions to numbers, into a do-nothing visitor
+    n = 0
+    sink = InstructionVisitor()
+    for pdefs, side_set, rs in programs:
+        rv = ResolverVisitor(pdefs, sink)
+        for r in rs:
+            r.visit(rv)
+        n += len(rs)
+    return n
+
+
+def resolved(sources: list[str]) -> list[tuple]:
+    # ( side-set, [ ( method, args, kwargs ), ... ] ) per program
+    out = [ ]
+    for pdefs, side_set, rs in records(sources):
+        calls = _Calls()
+        rv = ResolverVisitor(pdefs, calls)
+        for r in rs:
+            r.visit(rv)
+        out.append(( side_set, calls.calls, len(rs) ))
+    return out
+
+
+def emit(programs: list[tuple]) -> int:
+    n = 0
+    for ( count, opt, pindirs ), calls, size in programs:
+        e = PIOEmitter(count + opt, opt)
+        for name, args, kw in calls:
+            getattr(e, name)(*args, **kw)
+        n += size
+    return n
+
+
+# name => ( stage(input) => items handled, sources => input or None )
+STAGES = {
+    'scan': ( scan, None ),
+    'parse': ( parse, None ),
+    'resolve': ( resolve, records ),
+    'emit': ( emit, resolved ),
+    'transpile': ( transpile, None ),
+    'assemble': ( assemble, None ),
+}
+
+
+def run(stage, data, repeat: int) -> dict:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        stage(data)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    stage(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return { 'sec': best, 'peak': peak }
+
+
+def bench(filenames: list[str], repeat: int) -> dict:
+    sources = [ open(fn).read() for fn in filenames ]
+    programs = sum(s.count('\n.program ') + s.startswith('.program ') for s in sources)
+    tokens = scan(sources)
+    results = { }
+    for name, ( stage, setup ) in STAGES.items():
+        r = run(stage, sources if setup is None else setup(sources), repeat)
+        r['programs_sec'] = programs / r['sec']
+        r['tokens_sec'] = tokens / r['sec']
+        results[name] = r
+    return { 'files': len(sources), 'programs': programs, 'tokens': tokens,
+             'stages': results }
+
+
+def report(doc: dict, base: dict|None, max_regress: float) -> int:
+    print(f'{doc["files"]} files, {doc["programs"]} programs, {doc["tokens"]} tokens')
+    failed = 0
+    for name, r in doc['stages'].items():
+        line = (f'{name:10} {r["programs_sec"]:12,.0f} programs/sec'
+                f' {r["tokens_sec"]:12,.0f} tokens/sec {r["peak"]:10,} bytes peak')
+        b = (base or { }).get('stages', { }).get(name)
+        if b is not None:
+            change = 100 * (b['sec'] / r['sec'] - 1)
+            line += f' {change:+6.1f}% speed {r["peak"] - b["peak"]:+9,} bytes'
+            if max_regress and -change > max_regress:
+                line += '  REGRESSED'
+                failed = 1
+        print(line)
+    return failed
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description='upioasm stage throughput')
+    ap.add_argument('files', nargs='*')
+    ap.add_argument('--repeat', type=int, default=20)
+    ap.add_argument('--save', metavar='JSON')
+    ap.add_argument('--compare', metavar='JSON')
+    ap.add_argument('--max-regress', type=float, default=0, metavar='PCT')
+    args = ap.parse_args(argv)
+    filenames = args.files or sorted(glob.glob(os.path.join(CORPUS, '*.pio')))
+    doc = bench(filenames, args.repeat)
+    base = None
+    if args.compare:
+        with open(args.compare) as fobj:
+            base = json.load(fobj)
+    failed = report(doc, base, args.max_regress)
+    if args.save:
+        with open(args.save, 'w') as fobj:
+            json.dump(doc, fobj, indent=1)
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#--#
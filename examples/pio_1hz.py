@@ -8,8 +8,9 @@ if TYPE_CHECKING:
     from upioasm.syntax import *
 
 from upioasm import pioasm
+from upioasm.trace import Tracer, ASM
 
-pa = pioasm()
+pa = pioasm(tracer=Tracer(ASM))
 
 
 #@rp2.asm_pio(set_init=rp2.PIO.OUT_LOW)
@@ -0,0 +1,157 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from upioasm import pioasm, PIOSyntaxError
+from upioasm import syntax
+
+MARK = 'module globals'
+
+
+def test_globals_kept():
+    pa = pioasm()
+    seen = [ ]
+
+    def probe():
+        # Runs while the body is active
+        seen.append(globals().get('MARK'))
+
+    @pa.asm_pio('kept')
+    def kept() -> None:
+        with label('top'):
+            set(x, 1)
+        probe()
+        jmp('top')
+
+    assert seen == [ MARK ]
+    assert list(pa['kept'].get_opcodes()) == [ 0xe021, 0x0000 ]
+
+
+def test_threads():
+    n = 8
+    barrier = threading.Barrier(n)
+
+    def assemble(k: int) -> list[int]:
+        pa = pioasm()
+
+        @pa.asm_pio(f'p{k}')
+        def p() -> None:
+            set(x, k)
+            # Every thread is inside a body here
+            barrier.wait()
+            set(y, k)                   [k]
+
+        return list(pa[f'p{k}'].get_opcodes())
+
+    with ThreadPoolExecutor(n) as ex:
+        results = list(ex.map(assemble, range(n)))
+    for k, codes in enumerate(results):
+        assert codes == [ 0xe020 | k, 0xe040 | k | (k << 8) ]
+
+
+def test_nested():
+    pa = pioasm()
+
+    def inner():
+        @pa.asm_pio('inner')
+        def inner() -> None:
+            nop()
+
+    @pa.asm_pio('outer')
+    def outer() -> None:
+        set(x, 1)
+        inner()
+        set(x, 2)
+
+    assert len(pa['inner'].get_opcodes()) == 1
+    assert list(pa['outer'].get_opcodes()) == [ 0xe021, 0xe022 ]
+    try:
+        syntax.nop()
+        assert False
+    except PIOSyntaxError:
+        pass
+
+
+def test_compact():
+    from upioasm import registers
+    pa = pioasm()
+    seen = [ ]
+
+    @pa.asm_pio('compact')
+    def compact() -> None:
+        with label('top'):
+            seen.append(mov(x, ~y))
+        seen.append(mov(x, ~y)                  [1])
+        seen.append(jmp.x_dec('top'))
+
+    # Operators give shared registers, instructions have no __dict__
+    assert ~registers.y is ~registers.y
+    assert registers.osr.reversed is registers.osr.reversed
+    assert seen[0]._source is seen[1]._source
+    for i in seen:
+        assert not hasattr(i, '__dict__'), i
+    assert list(pa['compact'].get_opcodes()) == [ 0xa02a, 0xa12a, 0x0040 ]
+
+
+def test_outputs():
+    from upioasm.assembler import OUT_LISTING, OUT_LABELS, OUT_SOURCE
+    a = pioasm().assembler()
+
+    @a.asm_pio('plain')
+    def plain() -> None:
+        nop()
+
+    # Opcodes only by default
+    assert a.generated is None
+
+    @a.asm_pio('asked', outputs=OUT_LISTING | OUT_LABELS | OUT_SOURCE)
+    def asked() -> None:
+        dot_define('N', 3)
+        with label('top'):
+            set(x, 'N')
+        jmp('top')                  [1]
+
+    g = a.generated
+    assert list(g.codes) == [ 0xe023, 0x0100 ]
+    assert g.listing == [ 'set x N', 'jmp  top [1]' ]
+    assert g.source == [ 'v.set("x", 3)', 'v.jmp("", 0)[1]' ]
+    assert g.labels == { 0: [ 'top' ] }
+    assert g.timing is None
+
+
+def test_unplaced():
+    pa = pioasm()
+
+    @pa.asm_pio('unplaced')
+    def unplaced() -> None:
+        label('later', public=True, forward=True)
+        with label('top', public=True):
+            jmp('top')
+
+    # A forward label never placed has no value to export
+    p = pa['unplaced']
+    assert p.get_defines() == { 'top': 0 } and p.get_labels() == { 'top': 0 }
+    assert p.get_relocs() == 1
+
+
+print('==> Test assembler[globals_kept]')
+test_globals_kept()
+
+print('==> Test assembler[threads]')
+test_threads()
+
+print('==> Test assembler[nested]')
+test_nested()
+
+print('==> Test assembler[compact]')
+test_compact()
+
+print('==> Test assembler[outputs]')
+test_outputs()
+
+print('==> Test assembler[unplaced]')
+test_unplaced()
+
+print('==> ok.')
+
+#--#
@@ -0,0 +1,97 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from upioasm.emitter import PIOEmitter
+from upioasm.program import PIOProgram
+from upioasm.sim import PIOBlock
+
+
+def program(e: PIOEmitter) -> PIOProgram:
+    p = PIOProgram('test')
+    p.set_opcodes(e.get_array())
+    return p
+
+
+def counter() -> PIOProgram:
+    # Pulse a pin for every word pulled, x-- loop for the length
+    e = PIOEmitter()
+    e.pull()
+    e.out('x', 32)
+    e.set('pins', 1)
+    e.jmp('x--', 3)
+    e.set('pins', 0)
+    e.in_('x', 4)
+    e.push()
+    return program(e)
+
+
+def test_blink():
+    if np is None:
+        return
+    from upioasm.sim.batch import BatchSim
+    e = PIOEmitter()
+    e.set('pins', 1).delay(3)
+    e.set('pins', 0).delay(1)
+    bs = BatchSim(program(e), 4, set_base=2, set_count=1)
+    hist = bs.run(12, record=True)
+    assert hist[:, 0].tolist() == [ 4, 4, 4, 4, 0, 0 ] * 2
+    assert (hist == hist[:, :1]).all()
+
+
+def test_lanes():
+    # Each lane with its own stream, checked against the scalar sim
+    if np is None:
+        return
+    from upioasm.sim.batch import BatchSim
+    p = counter()
+    words = [ [ 3, 0, 7 ], [ 1, 2, 1 ], [ 0, 0, 0 ] ]
+    bs = BatchSim(p, len(words), set_base=5, set_count=1)
+    bs.put(np.array(words))
+    hist = bs.run(60, record=True)
+    rx = bs.get()
+    for lane, ws in enumerate(words):
+        b = PIOBlock(log=True)
+        b.load(p)
+        sm = b.state_machine(0, p, set_base=5, set_count=1)
+        for w in ws:
+            sm.put(w)
+        b.run(60)
+        edges = [ t for t in range(1, 60) if hist[t, lane] != hist[t - 1, lane] ]
+        assert edges == [ t for t, v in b.pin_log ]
+        assert rx[lane] == [ sm.get() for _ in ws ]
+        assert bs.stalled[lane] and sm.stalled
+
+
+
+def test_unsupported():
+    if np is None:
+        return
+    from upioasm.sim.batch import BatchSim
+    for emit in ( lambda e: e.out('exec', 16), lambda e: e.mov('exec', '', 'x') ):
+        e = PIOEmitter()
+        e.pull()
+        emit(e)
+        try:
+            BatchSim(program(e), 4)
+            assert False
+        except ValueError as ex:
+            assert 'batch mode' in str(ex)
+
+
+if np is None:
+    print('==> Skip batch, no numpy')
+else:
+    print('==> Test batch[blink]')
+    test_blink()
+
+    print('==> Test batch[lanes]')
+    test_lanes()
+
+    print('==> Test batch[unsupported]')
+    test_unsupported()
+
+print('==> ok.')
+
+#--#
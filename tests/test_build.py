@@ -0,0 +1,138 @@
+import glob
+import tempfile
+
+from upioasm.__main__ import main
+from upioasm.build import assemble_unit, build, listing, split_source
+from upioasm.bundle import open_bundle
+
+CORPUS = sorted(glob.glob('bench/corpus/*.pio'))
+
+SOURCE = '''.define public N 3
+.program one
+    set x, N
+.program two
+    jmp nowhere
+'''
+
+
+def test_split():
+    one, two = split_source('f.pio', SOURCE)
+    assert one[:2] == ( 'f.pio', 'one' ) and two[1] == 'two'
+    # The defines go with each, line numbers are kept
+    assert two[2].splitlines() == [ '.define public N 3', '', '', '.program two',
+                                    '    jmp nowhere' ]
+    assert split_source('f.pio', '; nothing\n') == [ ]
+    # Not a .program in a comment
+    src = '/* multi\n.program fake\n*/\n.program real\n    nop\n'
+    assert split_source('e.pio', src) == [ ( 'e.pio', 'real', src ) ]
+
+
+def test_unit_errors():
+    # Any exception is a diagnostic of its unit, not the build's
+    assert assemble_unit(( 'f.pio', 'a', '.program a\n    set x, (N + 1)\n' ),
+                         'rp2040', { 'N': 'x' })[1] == [
+        'f.pio: a: TypeError: can only concatenate str (not "int") to str' ]
+    d = tempfile.mkdtemp()
+    with open(d + '/e.pio', 'w') as fobj:
+        fobj.write('/* multi\n.program fake\n*/\n.program real\n    nop\n')
+    with open(d + '/bad.pio', 'w') as fobj:
+        fobj.write('$\n.program bad\n')
+    r = build([ d + '/e.pio', d + '/bad.pio' ], 2)
+    assert [ p.name for p in r.programs ] == [ 'real' ]
+    assert r.errors == [ f'{d}/bad.pio: Bad input at <file>:1.0' ]
+
+
+def test_build():
+    d = tempfile.mkdtemp()
+    with open(d + '/two.pio', 'w') as fobj:
+        fobj.write(SOURCE)
+    r = build([ d + '/two.pio', CORPUS[-1], CORPUS[-1] ], jobs=1)
+    assert not r
+    # Only `two` failed, and says where
+    assert r.errors == [ d + '/two.pio:5: not defined (jmp nowhere)' ]
+    assert [ p.name for p in r.programs ] == [ 'one', 'ws2812' ]
+    assert r.sources[d + '/two.pio'] == [ 'one', 'two' ]
+
+    # The same whatever the number of workers
+    r1 = build(CORPUS, jobs=1)
+    r2 = build(CORPUS, jobs=2)
+    assert r1 and r2
+    assert [ listing(p) for p in r1.programs ] == [ listing(p) for p in r2.programs ]
+    assert '.wrap_target' in listing(r1.programs[-1])
+
+
+def test_incremental():
+    d = tempfile.mkdtemp()
+
+    def write(name: str, text: str):
+        with open(d + '/' + name, 'w') as fobj:
+            fobj.write(text)
+
+    def rebuild() -> dict:
+        r = build([ d + '/a.pio', CORPUS[-1] ], jobs=1,
+                  defines=[ d + '/defs.pio' ], state=d + '/state.json')
+        assert r, r.errors
+        assert [ p.name for p in r.programs ] == [ 'uses', 'other', 'ws2812' ]
+        return { name: why for name, filename, why in r.report }
+
+    write('defs.pio', '.define T 3\n.define U 1\n')
+    write('a.pio', '.program uses\n    set x, T\n.program other\n    nop\n')
+    assert set(rebuild().values()) == { 'new' }
+    assert set(rebuild().values()) == { 'up to date' }
+    # Only the program using T depends on it
+    write('defs.pio', '.define T 4\n.define U 1\n')
+    assert rebuild() == { 'uses': 'defines changed: ' + d + '/defs.pio',
+                          'other': 'up to date', 'ws2812': 'up to date' }
+    write('defs.pio', '.define T 4\n.define U 2\n')
+    assert set(rebuild().values()) == { 'up to date' }
+    # Blank lines moving a block do not count
+    write('a.pio', '\n.program uses\n    set x, T\n\n.program other\n    nop [1]\n')
+    assert rebuild() == { 'uses': 'up to date', 'other': 'source changed',
+                          'ws2812': 'up to date' }
+    r = build([ d + '/a.pio' ], jobs=1, defines=[ d + '/defs.pio' ], state=d + '/state.json')
+    assert r.skipped == 2 and r.programs[0].get_opcodes()[0] == 0xe024
+
+    # A bad character is reported, not raised by the dependency scan
+    write('bad.pio', '.program bad\n    nop $\n')
+    r = build([ d + '/bad.pio', CORPUS[-1] ], jobs=1, defines=[ d + '/defs.pio' ])
+    assert len(r.errors) == 1 and r.errors[0].startswith(d + '/bad.pio: ')
+    assert [ p.name for p in r.programs ] == [ 'ws2812' ]
+    assert main([ 'build', '--defines', d + '/defs.pio', d + '/bad.pio' ]) == 1
+
+
+def test_cli():
+    d = tempfile.mkdtemp()
+    assert main([ 'build', '-j', '1', '--bundle', d + '/pio.bin',
+                  '--listing', d + '/pio.lst' ] + CORPUS) == 0
+    b = open_bundle(d + '/pio.bin')
+    assert len(b) == 11 and list(b['uart_tx'].get_opcodes())[0] == 0x9fa0
+    assert open(d + '/pio.lst').read().count('\n; ') == 10
+    with open(d + '/dup.pio', 'w') as fobj:
+        fobj.write('.program ws2812\n    nop\n')
+    assert main([ 'build', '--module', d + '/m.py', CORPUS[-1], d + '/dup.pio' ]) == 1
+    # Constants clash, nothing written
+    with open(d + '/clash.pio', 'w') as fobj:
+        fobj.write('.program ab\n    nop\n.program AB\n    nop\n')
+    assert main([ 'build', '--bundle', d + '/clash.bin', '--module', d + '/m.py',
+                  d + '/clash.pio' ]) == 1
+    assert not glob.glob(d + '/clash.bin') and not glob.glob(d + '/m.py')
+
+
+print('==> Test build[split]')
+test_split()
+
+print('==> Test build[unit_errors]')
+test_unit_errors()
+
+print('==> Test build[build]')
+test_build()
+
+print('==> Test build[incremental]')
+test_incremental()
+
+print('==> Test build[cli]')
+test_cli()
+
+print('==> ok.')
+
+#--#
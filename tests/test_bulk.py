@@ -0,0 +1,90 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from upioasm.decoder import PIODecoder
+from upioasm.emitter import PIOEmitter
+from upioasm.error import PIOSyntaxError
+
+
+def test_round_trip():
+    from upioasm.bulk import FIELDS, decode, encode
+    codes = np.arange(0, 0x10000, 7)
+    for count, opt in ( ( 0, False ), ( 3, False ), ( 3, True ) ):
+        f = decode(codes, sideset_count=count, side_en=opt)
+        # Valid as PIODecoder says
+        d = PIODecoder(count, opt)
+        for code, valid in zip(codes.tolist(), f['valid'].tolist()):
+            try:
+                d.decode([ code ], PIOEmitter(count, opt))
+                assert valid, hex(code)
+            except PIOSyntaxError:
+                assert not valid, hex(code)
+        # Every valid word encodes back to itself
+        v = f['valid']
+        en = (1 << (count - 1)) << (13 - count) if opt else 0
+        ignored = ((1 << (count - 1)) - 1) << (13 - count) if opt else 0
+        want = np.where(codes[v] & en, codes[v], codes[v] & (0xffff & ~ignored))
+        for trusted in ( False, True ):
+            got = encode(*( f[k][v] for k in FIELDS ), sideset_count=count,
+                         side_en=opt, trusted=trusted)
+            assert got.dtype == np.uint16
+            assert (got == want).all()
+
+
+def test_fields():
+    from upioasm import opcodes
+    from upioasm.bulk import IN, JMP, MOV, PULL, SET, encode
+    e = PIOEmitter(2, True)
+    e.set('pins', 1).side(1)
+    e.in_('x', 32).delay(7)
+    e.mov('isr', '::', 'osr')
+    e.pull(block=False).side(0)
+    e.jmp('!osre', 31)
+    got = encode(
+        [ SET, IN, MOV, PULL, JMP ],
+        [ opcodes.set_dest['pins'] >> 5, 0, opcodes.mov_dest['isr'] >> 5, 0,
+          opcodes.jmp_cond['!osre'] >> 5 ],
+        [ 0, opcodes.in_source['x'] >> 5, opcodes.mov_source['::osr'], 0, 0 ],
+        [ 1, 32, 0, 0, 31 ],
+        [ 0, 7, 0, 0, 0 ],
+        [ 1, -1, -1, 0, -1 ],
+        sideset_count=2, side_en=True)
+    assert got.tolist() == list(e.get_array())
+    # Scalars broadcast
+    assert encode(SET, 1, count=np.arange(3)).tolist() == [ 0xe020, 0xe021, 0xe022 ]
+
+
+def test_errors():
+    from upioasm.bulk import IN, MOV, SET, encode
+    for args, kwargs, what in (
+        ( ( [ SET, 9 ], ), { }, 'mnemonic invalid at [1]' ),
+        ( ( [ SET, SET ], [ 0, 3 ] ), { }, 'dest invalid at [1]' ),
+        ( ( MOV, 1, [ 1, 4 ] ), { }, 'source invalid at [1]' ),
+        ( ( IN, 0, 0, [ 0 ] ), { }, 'count invalid at [0]' ),
+        ( ( SET, 0, 0, 0, [ 8 ] ), { 'sideset_count': 2 }, 'delay invalid at [0]' ),
+        ( ( SET, 0, 0, 0, 0, [ 0, -1 ] ), { 'sideset_count': 2 }, 'side invalid at [1]' ),
+    ):
+        try:
+            encode(*args, **kwargs)
+            assert False, what
+        except PIOSyntaxError as e:
+            assert str(e) == what, str(e)
+
+
+if np is None:
+    print('==> Skip bulk, no numpy')
+else:
+    print('==> Test bulk[round_trip]')
+    test_round_trip()
+
+    print('==> Test bulk[fields]')
+    test_fields()
+
+    print('==> Test bulk[errors]')
+    test_errors()
+
+print('==> ok.')
+
+#--#
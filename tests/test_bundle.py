@@ -0,0 +1,107 @@
+from upioasm import pioasm
+from upioasm.bundle import Bundle, open_bundle, pack_bundle
+from upioasm.program import PIOProgram
+import os
+import tempfile
+
+
+def make_program(name: str, n: int) -> PIOProgram:
+    p = PIOProgram(name, pio_version='rp2350')
+    p.set_opcodes([ 0xe020 | k for k in range(n - 1) ] + [ 0x0001 ])
+    p.set_defines({ 'T1': 3, 'NEG': -2 })
+    p.set_labels({ 'loop': 1 })
+    p.set_wrap(1, n - 1)
+    p.origin(4)
+    p.side_set(1, True, True)
+    return p
+
+
+def check_same(p: PIOProgram, q: PIOProgram):
+    assert q.name == p.name and q.pio_version == p.pio_version
+    assert q.get_opcodes() == p.get_opcodes()
+    assert q.get_relocs() == p.get_relocs()
+    assert q.get_defines() == p.get_defines()
+    assert q.get_labels() == p.get_labels()
+    assert q.get_wrap() == p.get_wrap()
+    assert q.get_origin() == p.get_origin()
+    assert q.get_side_set() == p.get_side_set()
+
+
+def test_round_trip():
+    programs = [ make_program(name, n) for name, n in
+                 ( ( 'uart_tx', 4 ), ( 'blink', 3 ), ( 'ws2812', 5 ) ) ]
+    data = pack_bundle(programs)
+    b = Bundle(data)
+    assert len(b) == 3
+    assert b.names() == [ 'blink', 'uart_tx', 'ws2812' ]
+    assert 'ws2812' in b and 'spi' not in b
+    for p in programs:
+        check_same(p, b[p.name])
+    # A view into the bundle, opcodes little-endian
+    mv = b.opcodes('blink')
+    assert isinstance(mv, memoryview) and bytes(mv) == bytes([ 0x20, 0xe0, 0x21, 0xe0, 0x01, 0x00 ])
+    try:
+        b['spi']
+        assert False
+    except KeyError:
+        pass
+    try:
+        Bundle(b'PIOB\x09\x00')
+        assert False
+    except ValueError:
+        pass
+
+
+def test_pioasm():
+    pa = pioasm()
+    pa.add_bundle(pack_bundle([ make_program('blink', 3) ]))
+    p = pa['blink']
+    assert p is pa['blink']
+    assert list(p.get_opcodes()) == [ 0xe020, 0xe021, 0x0001 ]
+    try:
+        pa['uart_tx']
+        assert False
+    except KeyError:
+        pass
+
+
+def test_errors():
+    many = make_program('many', 3)
+    many.set_defines({ f'D{k}': k for k in range(256) })
+    for programs, what in (
+        ( [ make_program('blink', 3), make_program('blink', 4) ],
+          'blink: duplicate program name' ),
+        ( [ many ], 'many: over 255 defines or labels' ),
+    ):
+        try:
+            pack_bundle(programs)
+            assert False, what
+        except ValueError as e:
+            assert str(e) == what, str(e)
+
+
+def test_file():
+    with tempfile.TemporaryDirectory() as d:
+        fn = os.path.join(d, 'programs.bin')
+        with open(fn, 'wb') as fobj:
+            fobj.write(pack_bundle([ make_program('blink', 3) ]))
+        b = open_bundle(fn)
+        check_same(make_program('blink', 3), b['blink'])
+        del b
+
+
+print('==> Test bundle[round_trip]')
+test_round_trip()
+
+print('==> Test bundle[pioasm]')
+test_pioasm()
+
+print('==> Test bundle[errors]')
+test_errors()
+
+print('==> Test bundle[file]')
+test_file()
+
+print('==> ok.')
+
+#--#
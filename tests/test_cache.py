@@ -0,0 +1,73 @@
+from upioasm import pioasm
+from upioasm.cache import DirCache, FileCache, ProgramCache
+from upioasm.program import PIOProgram
+import tempfile
+
+
+def make_program(name):
+    p = PIOProgram(name)
+    p.set_opcodes([ 0xe001, 0x0001 ])
+    p.set_defines({ 'T1': 3 })
+    p.set_labels({ 'loop': 1 })
+    p.set_wrap(1, 1)
+    p.side_set(2, True)
+    return p
+
+
+def check_cache(c):
+    p = make_program('blink')
+    k0 = c.key('.program blink', 'rp2040')
+    assert c.load(k0) is None
+    c.store(k0, [ p ])
+    q, = c.load(k0)
+    assert q.name == 'blink'
+    assert list(q.get_opcodes()) == [ 0xe001, 0x0001 ]
+    assert q.get_relocs() == 0b10
+    assert q.get_defines() == { 'T1': 3 }
+    assert q.get_labels() == { 'loop': 1 }
+    assert q.get_wrap() == ( 1, 1 )
+    assert q.get_side_set() == ( 2, True, False )
+    # Key depends on the pio_version
+    assert c.key('.program blink', 'rp2350') != k0
+    # Oldest entry is evicted
+    for n in range(2):
+        c.store(c.key(str(n), 'rp2040'), [ p ])
+    assert c.load(k0) is None
+    assert c.load(c.key('1', 'rp2040')) is not None
+
+
+def test_mem_cache():
+    check_cache(ProgramCache(max_entries=2))
+
+
+def test_dir_cache():
+    check_cache(DirCache(tempfile.mkdtemp() + '/cache', max_entries=2))
+
+
+def test_file_cache():
+    check_cache(FileCache(tempfile.mkdtemp() + '/cache.json', max_entries=2))
+
+
+def test_parse_cached():
+    c = FileCache(tempfile.mkdtemp() + '/cache.json')
+    c.store(c.key('; cached\n', 'rp2040'), [ make_program('blink') ])
+    pa = pioasm(c)
+    p, = pa.parse_str('; cached\n')
+    assert pa['blink'] is p
+
+
+print('==> Test cache[mem]')
+test_mem_cache()
+
+print('==> Test cache[dir]')
+test_dir_cache()
+
+print('==> Test cache[file]')
+test_file_cache()
+
+print('==> Test parse[cached]')
+test_parse_cached()
+
+print('==> ok.')
+
+#--#
@@ -0,0 +1,107 @@
+from upioasm import pioasm
+from upioasm.decoder import PIODecoder, disassemble
+from upioasm.emitter import PIOEmitter, TrustedEmitter
+from upioasm.error import PIOSyntaxError
+from upioasm.xpileemitter import EmitterVisitor
+from upioasm.xpileprinter import PrintVisitor
+
+
+def test_round_trip():
+    # Every valid word encodes back to itself, checked or not
+    for cls, count, opt in ( ( PIOEmitter, 0, False ), ( PIOEmitter, 3, False ),
+                             ( PIOEmitter, 3, True ), ( TrustedEmitter, 0, False ),
+                             ( TrustedEmitter, 3, False ), ( TrustedEmitter, 3, True ) ):
+        d = PIODecoder(count, opt)
+        en = (1 << (count - 1)) << (13 - count) if opt else 0
+        ignored = ((1 << (count - 1)) - 1) << (13 - count) if opt else 0
+        n = 0
+        for code in range(0, 0x10000, 7):
+            e = cls(count, opt)
+            try:
+                d.decode([ code ], e)
+            except PIOSyntaxError:
+                continue
+            want = code if code & en else code & ~ignored
+            assert e.get_array()[0] == want, hex(code)
+            n += 1
+        assert n > 5000
+
+
+def test_visitors():
+    pa = pioasm()
+
+    @pa.asm_pio('pulse')
+    def pulse() -> None:
+        dot_side_set(1, opt=False)
+        with dot_wrap_target():
+            wait(1).irq(2, rel=True)
+            out(pins, 32)               .side(1) [3]
+            mov(x, ~isr)                .side(0)
+            nop()                       .side(1)
+            dot_wrap()
+
+    p = pa['pulse']
+    assert list(disassemble(p, PrintVisitor())) == [
+        'wait 1 irq 2 rel=True side 0',
+        'out pins, 32 [3] side 1',
+        'mov x, ~isr side 0',
+        'nop side 1',
+    ]
+    # Stored little-endian bytes decode the same
+    raw = bytes(b for c in p.get_opcodes() for b in ( c & 0xff, c >> 8 ))
+    lines = list(PIODecoder(1).decode(raw, EmitterVisitor()))
+    assert lines[1] == 'v.out("pins", 32)[3].side(1)'
+    # A stray trailing byte is not dropped
+    try:
+        PIODecoder(1).decode(raw + b'\x00', EmitterVisitor())
+        assert False
+    except PIOSyntaxError as e:
+        assert str(e) == 'odd opcode byte count 9', str(e)
+
+
+def test_trusted():
+    pa = pioasm()
+    e = pa.emitter(2, True)
+    t = pa.emitter(2, True, trusted=True)
+    assert type(t) is TrustedEmitter
+    for v in ( e, t ):
+        v.set('pins', 1).side(1)
+        v.out('x', 32).delay(7)
+        v.mov('isr', '::', 'osr')
+        v.nop().delay(3).side(0)
+        v.jmp('!osre', 31)
+        v.wait(1, 'irq', 2, rel=True)
+        v.irq(5, clear=True)
+        v.pull(block=False)
+    assert list(t.get_array()) == list(e.get_array())
+    # Out of range values stay in their field
+    t = pa.emitter(2, True, trusted=True)
+    t.wait(2, 'gpio', 33).delay(9).side(3)
+    t.nop().side(-1)
+    assert list(t.get_array()) == [ 0x3901, 0xb842 ]
+    # Only the checked one says why
+    for call in ( lambda v: v.set('osr', 1), lambda v: v.mov('x', '~', 'exec') ):
+        try:
+            call(e)
+            assert False
+        except PIOSyntaxError:
+            pass
+        try:
+            call(t)
+            assert False
+        except KeyError:
+            pass
+
+
+print('==> Test decoder[round_trip]')
+test_round_trip()
+
+print('==> Test decoder[visitors]')
+test_visitors()
+
+print('==> Test decoder[trusted]')
+test_trusted()
+
+print('==> ok.')
+
+#--#
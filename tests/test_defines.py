@@ -0,0 +1,49 @@
+from upioasm.defines import Defines
+from upioasm.error import PIOSyntaxError
+
+
+def raises(fn, *args):
+    try:
+        fn(*args)
+    except PIOSyntaxError:
+        return True
+    return False
+
+
+def test_scopes():
+    g = Defines()
+    g.define('T1', 3, True)
+    g.define('secret', 7, False)
+    p = g.copy(True)
+    # Public globals are visible, private are not
+    assert 'T1' in p and p.resolve('T1') == 3
+    assert 'secret' not in p and raises(p.resolve, 'secret')
+    assert raises(p.define, 'T1', 4, False)
+    p.define('secret', 8, False)
+    assert p.resolve('secret') == 8 and g.resolve('secret') == 7
+    assert len(p) == 2
+    assert list(p.items()) == [ ( 'T1', 3, True ), ( 'secret', 8, False ) ]
+    # Globals defined later are seen through the chain
+    g.define('T2', 5, True)
+    assert p.resolve('T2') == 5
+
+
+def test_forward():
+    p = Defines().copy(True)
+    p.declare('fwd', False)
+    assert raises(p.resolve, 'fwd')
+    p.assign('fwd', 12)
+    assert p.resolve('fwd') == 12
+    assert raises(p.assign, 'fwd', 13)
+    assert raises(p.assign, 'other', 1)
+
+
+print('==> Test defines[scopes]')
+test_scopes()
+
+print('==> Test defines[forward]')
+test_forward()
+
+print('==> ok.')
+
+#--#
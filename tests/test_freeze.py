@@ -0,0 +1,87 @@
+from upioasm import pioasm
+from upioasm.freeze import module_source, write_module
+import os
+import sys
+import tempfile
+
+
+def programs():
+    pa = pioasm()
+
+    @pa.asm_pio('blink-1hz')
+    def blink() -> None:
+        dot_define('T1', 3, public=True)
+        with dot_wrap_target():
+            set(pins, 1)            ['T1']
+        with label('low', public=True):
+            set(pins, 0)            ['T1']
+            jmp('low')
+            dot_wrap()
+
+    @pa.asm_pio('count')
+    def count() -> None:
+        dot_side_set(1)
+        with label('top'):
+            jmp.y_dec('top')        .side(1)
+
+    return [ pa['blink-1hz'], pa['count'] ]
+
+
+def test_module():
+    ps = programs()
+    with tempfile.TemporaryDirectory() as d:
+        write_module(os.path.join(d, 'frozen_pio.py'), ps)
+        sys.path.insert(0, d)
+        try:
+            import frozen_pio
+        finally:
+            sys.path.pop(0)
+    assert frozen_pio.NAMES == ( 'blink-1hz', 'count' )
+    assert frozen_pio.BLINK_1HZ_T1 == 3
+    assert frozen_pio.BLINK_1HZ_WRAP == 2
+    assert frozen_pio.COUNT_WRAP_TARGET == 0
+    for p in ps:
+        q = frozen_pio.load(p.name)
+        assert q.get_opcodes() == p.get_opcodes()
+        assert q.get_relocs() == p.get_relocs()
+        assert q.get_wrap() == p.get_wrap()
+        assert q.get_side_set() == p.get_side_set()
+        assert q.get_defines() == p.get_defines()
+        assert q.get_labels() == p.get_labels()
+    # No assembler in the generated module
+    assert 'assembler' not in module_source(ps)
+
+
+def test_collision():
+    from upioasm.program import PIOProgram
+    ps = [ PIOProgram('a-b'), PIOProgram('a_b') ]
+    for p in ps:
+        p.set_opcodes([ 0xa042 ])
+    with tempfile.TemporaryDirectory() as d:
+        fn = os.path.join(d, 'frozen_pio.py')
+        try:
+            write_module(fn, ps)
+            assert False
+        except ValueError as e:
+            assert str(e) == 'A_B_WRAP_TARGET: from both a-b WRAP_TARGET and a_b WRAP_TARGET', str(e)
+        assert not os.path.exists(fn)
+    # Defines too
+    p = PIOProgram('p')
+    p.set_opcodes([ 0xa042 ])
+    p.set_defines({ 'T-1': 1, 't_1': 2 })
+    try:
+        module_source([ p ])
+        assert False
+    except ValueError as e:
+        assert str(e) == 'P_T_1: from both p T-1 and p t_1', str(e)
+
+
+print('==> Test freeze[module]')
+test_module()
+
+print('==> Test freeze[collision]')
+test_collision()
+
+print('==> ok.')
+
+#--#
@@ -0,0 +1,61 @@
+from upioasm import pioasm
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASE = [ 'upioasm', 'upioasm.error', 'upioasm.program' ]
+
+
+def loaded(code: str) -> list[str]:
+    # upioasm modules loaded by `code` in a fresh interpreter
+    code += ('\nimport sys\nprint(" ".join(sorted(m for m in sys.modules'
+             ' if m.split(".")[0] == "upioasm")))')
+    out = subprocess.run([ sys.executable, '-c', code ], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return out.split()
+
+
+def test_minimal():
+    assert loaded('from upioasm.program import PIOProgram') == BASE
+    assert loaded('from upioasm import pioasm\n'
+                  'pioasm().emitter().set("pins", 1)') == sorted(
+                      BASE + [ 'upioasm.emitter', 'upioasm.opcodes' ])
+
+
+def test_assembler():
+    mods = loaded('from upioasm import pioasm\n'
+                  'pioasm().asm_pio("p")(lambda: None)')
+    for m in ( 'upioasm.assembler', 'upioasm.syntax', 'upioasm.resolver' ):
+        assert m in mods
+    # No listing, timing or optimizer without a tracer
+    for m in mods:
+        assert not m.startswith('upioasm.xpile')
+        assert m not in ( 'upioasm.timing', 'upioasm.optimizer', 'upioasm.parser' )
+
+
+def test_emit_pio():
+    pa = pioasm()
+
+    @pa.emit_pio
+    def blink(e) -> None:
+        e.set('pins', 1)
+        e.set('pins', 0)
+
+    assert pa['blink'] is blink
+    assert list(blink.get_opcodes()) == [ 0xe001, 0xe000 ]
+
+
+print('==> Test imports[minimal]')
+test_minimal()
+
+print('==> Test imports[assembler]')
+test_assembler()
+
+print('==> Test imports[emit_pio]')
+test_emit_pio()
+
+print('==> ok.')
+
+#--#
@@ -0,0 +1,100 @@
+from upioasm import pioasm
+from upioasm.linker import PIOLinker
+from upioasm.program import PIOProgram
+from upioasm.sim import PIOBlock
+
+
+def blob(name: str, n: int, origin: int=-1) -> PIOProgram:
+    # n words, set x <first letter>, nops, then a jmp to the start
+    p = PIOProgram(name)
+    p.set_opcodes([ 0xe020 | (ord(name[0]) & 0x1f) ] + [ 0xa042 ] * (n - 2) + [ 0x0000 ])
+    p.origin(origin)
+    return p
+
+
+def test_relocate():
+    p = PIOProgram('r')
+    p.set_opcodes([ 0x0005, 0x1f1f, 0xe001, 0x0045 ])
+    assert p.get_relocs() == 0b1011
+    assert list(p.relocate(0)) == list(p.get_opcodes())
+    # jmp addresses only, wrapping at 32
+    assert list(p.relocate(3)) == [ 0x0008, 0x1f02, 0xe001, 0x0048 ]
+    # Word 3 is data, not a jmp
+    p.set_opcodes(p.get_opcodes(), 0b0011)
+    assert list(p.relocate(3)) == [ 0x0008, 0x1f02, 0xe001, 0x0045 ]
+
+
+def test_pack():
+    lk = PIOLinker()
+    # 10 at .origin 8 leaves 8 + 14, largest first without
+    # backtracking leaves 3 words over
+    lk.add(blob('fixed', 10, 8))
+    for name, n in ( ( 'a', 6 ), ( 'b', 5 ), ( 'c', 4 ), ( 'd', 4 ), ( 'e', 3 ) ):
+        lk.add(blob(name, n))
+    li = lk.link()
+    assert li.used == 0xffffffff
+    assert li.offsets['fixed'] == 8
+    for p in lk._programs:
+        offset = li.offset(p)
+        # The last word is the relocated jmp to the start
+        assert li.image[offset + len(p) - 1] == offset
+    try:
+        lk.add(blob('f', 1))
+        lk.link()
+        assert False
+    except ValueError:
+        pass
+
+
+def test_share_and_run():
+    pa = pioasm()
+
+    @pa.asm_pio('count')
+    def count() -> None:
+        with label('top', public=True):
+            jmp.y_dec('next')
+        with label('next'):
+            jmp('top')
+
+    @pa.asm_pio('blink')
+    def blink() -> None:
+        dot_origin(20)
+        set(pins, 1)                [1]
+        set(pins, 0)                [1]
+
+    count2 = PIOProgram('count2')
+    count2.set_opcodes(pa['count'].get_opcodes())
+    lk = PIOLinker(used=1)
+    for p in ( pa['count'], count2, pa['blink'] ):
+        lk.add(p)
+    li = lk.link()
+    # One copy of count, after the word already used
+    assert li.offsets == { 'count': 1, 'count2': 1, 'blink': 20 }
+    assert li.used == 0b110 | (0b11 << 20)
+    assert li.wrap(pa['count']) == ( 1, 2 )
+    assert pa['count'].get_labels() == { 'top': 0 }
+    assert pa['count'].get_relocs() == 0b11
+
+    b = PIOBlock(log=True)
+    for addr, code in enumerate(li.image):
+        b.instr[addr] = code
+    b.state_machine(0, pa['count'], li.offset(pa['count']))
+    b.state_machine(1, count2, li.offset(count2))
+    b.state_machine(2, pa['blink'], li.offset(pa['blink']), set_base=0)
+    b.run(8)
+    assert b.sm[0].y == b.sm[1].y == (-4) & 0xffffffff
+    assert b.pin_log == [ ( 0, 1 ), ( 2, 0 ), ( 4, 1 ), ( 6, 0 ) ]
+
+
+print('==> Test linker[relocate]')
+test_relocate()
+
+print('==> Test linker[pack]')
+test_pack()
+
+print('==> Test linker[share_and_run]')
+test_share_and_run()
+
+print('==> ok.')
+
+#--#
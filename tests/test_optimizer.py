@@ -0,0 +1,125 @@
+from upioasm import pioasm
+from upioasm.optimizer import DEFAULT, SET_SIDE, TIMING
+from upioasm.sim import PIOBlock
+from upioasm.trace import Tracer, OPT
+
+
+def square(pa: pioasm, name: str, optimize: int=0):
+    @pa.asm_pio(name, optimize=optimize)
+    def square() -> None:
+        set(pins, 1)
+        with label('top'):
+            set(x, 3)
+            nop()                   [4]
+            jmp('next')
+        with label('next'):
+            set(pins, 0)            [1]
+            nop()                   [2]
+            jmp('top')
+
+    return pa[name]
+
+
+def pin_log(p, cycles: int=100):
+    b = PIOBlock(log=True)
+    b.load(p)
+    b.state_machine(0, p, set_base=0, set_count=1)
+    b.run(cycles)
+    return b.pin_log
+
+
+def test_keep_timing():
+    lines: list[str] = [ ]
+    pa = pioasm(tracer=Tracer(OPT, lines.append))
+    p0 = square(pa, 'plain')
+    p1 = square(pa, 'opt', DEFAULT)
+    # Both nops folded, the jmp to next and the trailing jmp gone
+    assert len(p0.get_opcodes()) == 7
+    assert len(p1.get_opcodes()) == 3
+    assert p1.get_wrap() == ( 1, 2 )
+    assert '# 4 slots saved, 3 used' in lines
+    assert pin_log(p0) == pin_log(p1)
+
+
+def test_barrier():
+    pa = pioasm()
+
+    @pa.asm_pio('loop', optimize=DEFAULT)
+    def loop() -> None:
+        set(x, 7)
+        with label('wait'):
+            nop()                   [3]
+            jmp.x_dec('wait')
+
+    # The labelled nop stays
+    assert len(pa['loop'].get_opcodes()) == 3
+    assert pa['loop'].get_defines() == { }
+
+    # Nor does TIMING drop a trailing jmp target
+    @pa.asm_pio('tail', optimize=DEFAULT | TIMING)
+    def tail() -> None:
+        set(x, 1)
+        jmp.not_x('end')
+        set(y, 2)
+        with label('end'):
+            nop()                   [3]
+
+    codes = list(pa['tail'].get_opcodes())
+    assert codes == [ 0xe021, 0x0023, 0xe042, 0xa342 ]
+
+
+def test_set_side():
+    lines: list[str] = [ ]
+    pa = pioasm(tracer=Tracer(OPT, lines.append))
+
+    def body():
+        dot_side_set(1)
+        set(pins, 1)
+        set(x, 3)                   [3]
+        set(pins, 0)                [2]
+        set(y, 3)                   [3]
+
+    p0 = pa.asm_pio('keep', optimize=DEFAULT)(body)
+    assert len(p0.get_opcodes()) == 4
+    p1 = pa.asm_pio('side', optimize=SET_SIDE | TIMING)(body)
+    assert len(p1.get_opcodes()) == 2
+    b = PIOBlock(log=True)
+    b.load(p1)
+    b.state_machine(0, p1, sideset_base=0)
+    b.run(10)
+    assert b.pin_log == [ ( 0, 1 ), ( 4, 0 ), ( 8, 1 ) ]
+    # The delay lost with the set is reported
+    assert '#  0: set pins 1 => side 1 on 1, -1 cycles' in lines
+    assert '#  2: set pins 0 => side 0 on 3, -3 cycles' in lines
+
+
+def test_over_32():
+    pa = pioasm()
+
+    @pa.asm_pio('long', optimize=DEFAULT)
+    def long() -> None:
+        set(pins, 1)
+        for _ in range(20):
+            nop()
+        set(pins, 0)
+        for _ in range(20):
+            nop()
+
+    assert len(pa['long'].get_opcodes()) == 2
+
+
+print('==> Test optimizer[keep_timing]')
+test_keep_timing()
+
+print('==> Test optimizer[barrier]')
+test_barrier()
+
+print('==> Test optimizer[set_side]')
+test_set_side()
+
+print('==> Test optimizer[over_32]')
+test_over_32()
+
+print('==> ok.')
+
+#--#
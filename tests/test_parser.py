@@ -1,4 +1,12 @@
-from upioasm.parser import PIOParser, PRATT_TAB, get_rule
+from upioasm.emitter import PIOEmitter
+from upioasm.error import PIOSyntaxError
+from upioasm.parser import (
+    PIOParser, PRATT_TAB, get_rule,
+    DirectiveRecord, LabelRecord, InstructionRecord,
+)
+from upioasm.trace import Tracer, ALL, PARSE
+from contextlib import redirect_stdout
+from io import StringIO
 
 
 def test_rules():
@@ -21,17 +29,133 @@ def test_ws2812():
 
     print(';; Result')
     for stmt in stmts:
-        if ':' in stmt or stmt.startswith('.'):
+        if not isinstance(stmt, InstructionRecord):
             print(stmt)
         else:
             print('   ', stmt)
 
+def test_sdk_syntax():
+    # Statements used by the SDK examples, see bench/corpus
+    src = '''.program uart_tx
+.side_set 1 opt pindirs
+.origin 4
+public start:
+    set x, 7   side 0 [7]
+    jmp x-- start [6]
+    irq wait 0 rel
+    mov isr, y side 1
+    out exec, 16
+    push noblock [1]
+'''
+    stmts = [ str(s) for s in PIOParser().parse('-', StringIO(src).readline) ]
+    assert stmts == [
+        '.program uart_tx', '.side_set 1 opt pindirs', '.origin 4',
+        'public start:', 'set x, 7 side 0 [7]', 'jmp x--, start [6]',
+        'irq wait 0 rel', 'mov isr, y side 1', 'out exec, 16',
+        'push noblock [1]',
+    ]
+
+
+def test_records():
+    src = '''.define public T (1 + 2) * 3
+.define S (T + 1)
+loop:
+    mov x, !y       side 1 [T]
+    wait 1 gpio 3
+    jmp !x loop
+'''
+    define, symbolic, label, mov, wait, jmp = PIOParser().parse(
+        '-', StringIO(src).readline)
+    # Constants are folded, symbols left for the resolver
+    assert isinstance(define, DirectiveRecord)
+    assert define.name == 'define' and define.args == ( 'T', 9, True )
+    assert symbolic.args[1].evaluate({ 'T': 9 }.__getitem__) == 10
+    assert isinstance(label, LabelRecord) and label.name == 'loop'
+    assert ( label.line_no, mov.line_no, mov.col_no ) == ( 3, 4, 4 )
+    assert ( mov.op, mov.args, mov.side, mov.delay ) == (
+        'mov', ( 'x', '~', 'y' ), 1, 'T' )
+    assert wait.args == ( 1, 'gpio', 3 ) and wait.kwargs == { 'rel': False }
+    assert jmp.args == ( '!x', 'loop' )
+    # Straight to an emitter, no strings
+    e = PIOEmitter(1)
+    mov.delay = 9
+    for instr in ( mov, wait ):
+        instr.visit(e)
+    assert list(e.get_array()) == [ 0xb92a, 0x2083 ]
+
+
+def test_math_errors():
+    # As PIOSyntaxError, when folded or evaluated later
+    for src, what in (
+        ( 'set x, (4 / 0)\n', '(/ 4 0): division by zero' ),
+        ( 'set x, (4 % 0)\n', '(% 4 0): division by zero' ),
+        ( 'set x, (1 << -1)\n', '(<< 1 (- 1)): negative shift count' ),
+    ):
+        try:
+            list(PIOParser().parse('-', StringIO(src).readline))
+            assert False, src
+        except PIOSyntaxError as e:
+            assert str(e) == what, str(e)
+    set_, = PIOParser().parse('-', StringIO('set x, (4 / Z)\n').readline)
+    try:
+        set_.args[1].evaluate({ 'Z': 0 }.__getitem__)
+        assert False
+    except PIOSyntaxError as e:
+        assert str(e) == '(/ 4 Z): division by zero', str(e)
+
+
+def test_streaming():
+    # Records come out a line at a time, never all buffered
+    def lines():
+        for k in range(10000):
+            yield f'set x, {k & 31}\n'
+        yield ''
+    p = PIOParser()
+    n = 0
+    for stmt in p.parse('-', lines().__next__):
+        assert len(p._stmts) <= 1
+        n += 1
+    assert n == 10000
+
+
+def test_trace():
+    # Silent by default
+    out = StringIO()
+    with redirect_stdout(out):
+        list(PIOParser().parse('ws2812.pio', open('tests/ws2812.pio').readline))
+    assert out.getvalue() == ''
+    # Per-category to a sink
+    lines = [ ]
+    tr = Tracer(PARSE, lines.append)
+    list(PIOParser(tracer=tr).parse('-', StringIO('nop\n').readline))
+    assert lines and all('Advance' in l or 'Consuming' in l for l in lines)
+    lines.clear()
+    tr.enable(ALL)
+    list(PIOParser(tracer=tr).parse('-', StringIO('.define T (1 + 2)\n').readline))
+    assert any('push' in l for l in lines)
+
+
 print('==> Test rules')
 test_rules()
 
 print('==> Test parser[ws2812.pio]')
 test_ws2812()
 
+print('==> Test parser[sdk_syntax]')
+test_sdk_syntax()
+
+print('==> Test parser[records]')
+test_records()
+
+print('==> Test parser[math_errors]')
+test_math_errors()
+
+print('==> Test parser[streaming]')
+test_streaming()
+
+print('==> Test trace')
+test_trace()
+
 print('==> ok.')
 
 #--#
@@ -0,0 +1,111 @@
+from upioasm import pioasm, PIOSyntaxError
+from upioasm.sim import PIOBlock
+
+
+def test_ws2812():
+    pa = pioasm()
+    p, = pa.parse_file('bench/corpus/ws2812.pio')
+    # As the SDK pioasm
+    assert list(p.get_opcodes()) == [ 0x6221, 0x1123, 0x1400, 0xa442 ]
+    assert p.get_wrap() == ( 0, 3 )
+    assert p.get_side_set() == ( 1, False, False )
+    assert p.get_defines() == { 'T1': 2, 'T2': 5, 'T3': 3 }
+    assert p.get_relocs() == 0b0110
+    assert pa['ws2812'] is p
+
+
+def test_forward_and_wrap():
+    pa = pioasm()
+    src = '''
+.define HALF 2
+.program blink
+.side_set 1 opt
+.origin 8
+    set pins, 1     side 1
+    jmp skip        [(HALF * 2) - 1]
+public loop:
+    set pins, 0
+.wrap_target
+skip:
+    jmp x-- loop    side 0 [HALF]
+.wrap
+    .word 0xa042
+.program other
+    jmp done
+done:
+    jmp done
+'''
+    blink, other = pa.parse_str(src)
+    codes = list(blink.get_opcodes())
+    # Forward jmp patched to skip: at 3
+    assert codes[1] == 0x0303
+    assert codes[3] == 0x0042 | 0x1000 | 0x0200
+    assert codes[4] == 0xa042
+    assert blink.get_relocs() == 0b01010
+    assert blink.get_wrap() == ( 3, 3 )
+    assert blink.get_origin() == 8
+    assert blink.get_labels() == { 'loop': 2 }
+    assert blink.get_side_set() == ( 1, True, False )
+    # Labels are per program, global defines for all
+    assert list(other.get_opcodes()) == [ 0x0001, 0x0001 ]
+
+    b = PIOBlock(log=True)
+    b.load(other)
+    b.state_machine(0, other)
+    b.run(4)
+    assert b.sm[0].pc == 1
+
+
+def test_jmp_conditions():
+    # All the SDK spellings, !osre included
+    p, = pioasm().parse_str('''.program j
+top:
+    jmp top
+    jmp !x top
+    jmp x-- top
+    jmp !y top
+    jmp y-- top
+    jmp x!=y top
+    jmp pin top
+    jmp !osre top
+''')
+    assert list(p.get_opcodes()) == [ k << 5 for k in range(8) ]
+
+
+def test_errors():
+    pa = pioasm()
+    for src, where in (
+        ( '.program e\n  nop\n  jmp nowhere\n', '-:3' ),
+        ( '.program e\n  set x, 1\n  .side_set 1\n', '-:3' ),
+        ( '  nop\n', '-:1' ),
+        ( '.program e\n  set x, 1 side 1\n', '-:2' ),
+        # Raised by the parser itself
+        ( '.program e\n  nop\n  mov x\n', '-:3' ),
+        ( '.program e\n  nop $\n', '-:2' ),
+        # Or by the scanner, before the parser has a token
+        ( '$\n', '-:1: Bad input' ),
+        ( '/* open\n.program e\n  nop\n', '-:3: Unterminated comment' ),
+        ( '.program e\n  nop\n$\n', '-:3: Bad input' ),
+    ):
+        try:
+            pa.parse_str(src)
+            assert False, src
+        except PIOSyntaxError as e:
+            assert str(e).startswith(where), str(e)
+
+
+print('==> Test pipeline[ws2812]')
+test_ws2812()
+
+print('==> Test pipeline[forward_and_wrap]')
+test_forward_and_wrap()
+
+print('==> Test pipeline[jmp_conditions]')
+test_jmp_conditions()
+
+print('==> Test pipeline[errors]')
+test_errors()
+
+print('==> ok.')
+
+#--#
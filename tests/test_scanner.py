@@ -1,4 +1,4 @@
-from upioasm.parser import Scanner, RESERVED_TAB, is_reserved
+from upioasm.parser import Scanner, LineScanner, RESERVED_TAB, is_reserved
 from io import StringIO
 
 def test_reserved():
@@ -20,12 +20,42 @@ def test_ws2812():
         print(tok)
 
 
+def tokens(scanner, readline):
+    return [
+        ( repr(tok), tok.line_no, tok.col_no )
+        for tok in scanner.token_reader(readline)
+    ]
+
+
+def test_line_scanner():
+    # Same token stream as the reference char-at-a-time Scanner
+    assert (
+        tokens(LineScanner(), open('tests/ws2812.pio').readline)
+        == tokens(Scanner(), open('tests/ws2812.pio').readline)
+    )
+    src = (
+        'jmp x-- loop ; comment\n'
+        'set x, (T1 / 2) // comment\n'
+        'a/* inline */b: c/*\n'
+        'multi-line\n'
+        '*/d [0x10]\n'
+        'nop'
+    )
+    assert (
+        tokens(LineScanner(), StringIO(src).readline)
+        == tokens(Scanner(), StringIO(src).readline)
+    )
+
+
 print('==> Test reserved')
 test_reserved()
 
 print('==> Test scanner[ws2812.pio]')
 test_ws2812()
 
+print('==> Test line scanner')
+test_line_scanner()
+
 print('==> ok.')
 
 #--#
@@ -0,0 +1,147 @@
+from upioasm import pioasm
+from upioasm.emitter import PIOEmitter
+from upioasm.program import PIOProgram
+from upioasm.sim import PIOBlock
+
+
+def program(e: PIOEmitter, side_set=( 0, False, False ), wrap=-1) -> PIOProgram:
+    p = PIOProgram('test')
+    p.set_opcodes(e.get_array())
+    p.side_set(*side_set)
+    p.set_wrap(0, wrap)
+    return p
+
+
+def test_blink_1hz():
+    pa = pioasm()
+
+    @pa.asm_pio('blink_1hz')
+    def blink_1hz() -> None:
+        with dot_wrap_target():
+            irq(0, rel=True)
+            set(pins, 1)
+            set(x, 31)              [5]
+        with label("delay_high"):
+            nop()                   [29]
+            jmp.x_dec("delay_high")
+            nop()
+            set(pins, 0)
+            set(x, 31)              [5]
+        with label("delay_low"):
+            nop()                   [29]
+            jmp.x_dec("delay_low")
+            dot_wrap()
+
+    p = pa['blink_1hz']
+    b = PIOBlock(log=True)
+    b.load(p)
+    b.state_machine(0, p, set_base=25, set_count=1)
+    b.run(4002)
+    # 1000 cycles high, 1000 low, the irq once per period
+    assert b.pin_log == [ ( 1, 1 << 25 ), ( 1001, 0 ),
+                          ( 2001, 1 << 25 ), ( 3001, 0 ),
+                          ( 4001, 1 << 25 ) ]
+    assert b.irq_log == [ ( 0, 0 ), ( 2000, 0 ), ( 4000, 0 ) ]
+
+
+def test_side_set():
+    # .side_set 1 opt, side 1 on the nop with [2]
+    e = PIOEmitter(2, True)
+    e.nop().side(1).delay(2)
+    e.nop()
+    e.nop().side(0)
+    b = PIOBlock(log=True)
+    p = program(e, ( 1, True, False ))
+    b.load(p)
+    b.state_machine(0, p, sideset_base=3)
+    b.run(5)
+    assert b.pin_log == [ ( 0, 8 ), ( 4, 0 ) ]
+
+
+def test_fifo():
+    # pull, out x 8, mov isr x, push; a byte at a time
+    e = PIOEmitter()
+    e.pull()
+    e.out('x', 8)
+    e.in_('x', 8)
+    e.push()
+    b = PIOBlock()
+    p = program(e)
+    b.load(p)
+    sm = b.state_machine(0, p, out_shiftdir=1)
+    for w in ( 0x12, 0x34 ):
+        assert sm.put(w)
+    b.run(10)
+    assert sm.get() == 0x12 and sm.get() == 0x34
+    assert sm.get() is None
+    # Stalled on the pull until more data
+    assert sm.stalled and sm.pc == 0
+    sm.put(0x56)
+    b.run(4)
+    assert sm.get() == 0x56
+
+
+def test_two_sms():
+    # SM0 raises irq 3 every 4 cycles, SM1 waits on it, counts in y
+    e = PIOEmitter()
+    e.irq(3).delay(3)
+    b = PIOBlock()
+    b.load(program(e))
+    e = PIOEmitter()
+    e.wait(1, 'irq', 3)
+    e.jmp('y--', 0)
+    # Relocated to jmp y--, 1
+    b.load(program(e), 1)
+    b.state_machine(1, None, wrap_target=1, wrap=2).restart()
+    b.state_machine(0, None, wrap=0)
+    b.run(40)
+    assert b.sm[1].y == (-10) & 0xffffffff
+
+
+def test_exec_delay():
+    # The [7] on out exec is ignored, set pins runs the next clock
+    e = PIOEmitter()
+    e.pull()
+    e.out('exec', 16).delay(7)
+    b = PIOBlock(log=True)
+    p = program(e)
+    b.load(p)
+    sm = b.state_machine(0, p, set_base=25, set_count=1, out_shiftdir=1)
+    sm.put(0xe001)
+    b.run(10)
+    assert b.pin_log == [ ( 2, 1 << 25 ) ]
+
+
+def test_reserved():
+    # wait with source 3 is refused when loaded
+    p = PIOProgram('reserved')
+    p.set_opcodes([ 0xa042, 0x2060 ])
+    b = PIOBlock()
+    try:
+        b.load(p)
+        assert False
+    except ValueError as e:
+        assert '0x2060' in str(e)
+
+
+print('==> Test sim[blink_1hz]')
+test_blink_1hz()
+
+print('==> Test sim[side_set]')
+test_side_set()
+
+print('==> Test sim[fifo]')
+test_fifo()
+
+print('==> Test sim[two_sms]')
+test_two_sms()
+
+print('==> Test sim[exec_delay]')
+test_exec_delay()
+
+print('==> Test sim[reserved]')
+test_reserved()
+
+print('==> ok.')
+
+#--#
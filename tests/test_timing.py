@@ -0,0 +1,76 @@
+from upioasm import pioasm
+from upioasm.timing import CycleAnalyzer, TimingVisitor
+from upioasm.trace import Tracer, ASM
+
+
+def blink() -> TimingVisitor:
+    # As examples/pio_1hz.py
+    v = TimingVisitor()
+    v.irq(0)
+    v.set('pins', 1)
+    v.set('x', 31).delay(5)
+    v.nop().delay(29)
+    v.jmp('x--', 3)
+    v.nop()
+    v.set('pins', 0)
+    v.set('x', 31).delay(5)
+    v.nop().delay(29)
+    v.jmp('x--', 8)
+    return v
+
+
+def test_blink():
+    ca = CycleAnalyzer(list(blink()), labels={ 'high': 3, 'low': 8 })
+    # Cycles: 1 + 1 + 6 + 32 * (30 + 1) = 1000
+    assert ca.cycles(0, 5) == ( 1000, 1000 )
+    assert ca.cycles('high', 'low') == ( 1000, 1000 )
+    assert ca.wrap_cycles() == ( 2000, 2000 )
+
+
+def test_unbounded():
+    v = TimingVisitor()
+    v.wait(1, 'gpio', 5)
+    v.out('x', 32)
+    v.jmp('x--', 2).delay(1)
+    v.pull(block=False)
+    ca = CycleAnalyzer(list(v))
+    # Blocking wait, then a loop on an unknown x
+    assert ca.cycles(0, 3) == ( 4, None )
+    assert ca.cycles(1, 3) == ( 3, None )
+    # pull noblock only
+    assert ca.cycles(3, 0) == ( 1, 1 )
+    # Never past a jmp always
+    v = TimingVisitor()
+    v.set('y', 3)
+    v.jmp('', 0)
+    v.nop()
+    assert CycleAnalyzer(list(v)).cycles(0, 2) == ( None, None )
+
+
+def test_listing():
+    lines: list[str] = [ ]
+    pa = pioasm(tracer=Tracer(ASM, lines.append))
+
+    @pa.asm_pio('count')
+    def count() -> None:
+        with dot_wrap_target():
+            set(y, 2)
+        with label('loop'):
+            jmp.y_dec('loop')       [3]
+            dot_wrap()
+
+    assert '# cycles .wrap_target -> .wrap_target = 13' in lines
+
+
+print('==> Test timing[blink]')
+test_blink()
+
+print('==> Test timing[unbounded]')
+test_unbounded()
+
+print('==> Test timing[listing]')
+test_listing()
+
+print('==> ok.')
+
+#--#
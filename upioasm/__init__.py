@@ -1,8 +1,15 @@
-from typing import Iterable
+from typing import Callable, TYPE_CHECKING
+
+__version__ = '0.1.0'
 
 from .program import PIOProgram
 from .error import PIOSyntaxError
 
+if TYPE_CHECKING:
+    from .bundle import Bundle
+    from .cache import ProgramCache
+    from .trace import Tracer
+
 
 class pioasm:
     """pioasm - assembler for the PIO peripheral, in micropython
@@ -23,25 +30,65 @@ class pioasm:
     and static type checks.
 
     The PIOParser accepts a string/file and supports most of the
-    official SDK tools pioasm syntax.
+    official SDK tools pioasm syntax, parse_str and parse_file
+    assemble it in one pass through the emitter.
+
+    Each of these is imported on first use, so loading programs
+    from a bundle or frozen module only needs this file and
+    program.py.
+
+    An optional ProgramCache skips parsing of unchanged sources, and
+    an optional Tracer enables diagnostic output.
+
+    Programs can also come pre-assembled from a Bundle, each one is
+    only unpacked when first asked for by name.
     """
-    def __init__(self) -> None:
+    def __init__(self, cache: 'ProgramCache|None'=None,
+                 tracer: 'Tracer|None'=None) -> None:
         self._programs: dict[str, PIOProgram] = { }
+        self._cache = cache
+        self._trace = tracer
+        self._bundles: list[Bundle] = [ ]
         return
 
     def __getitem__(self, name: str) -> PIOProgram:
-        """Get a previously defined program by name"""
-        return self._programs[name]
+        """Get a previously defined or bundled program by name"""
+        p = self._programs.get(name)
+        if p is None:
+            for b in self._bundles:
+                if name in b:
+                    p = self._programs[name] = b[name]
+                    break
+            else:
+                raise KeyError(name)
+        return p
+
+    def add_bundle(self, data) -> 'Bundle':
+        """Look up programs in a bundle (bytes or a Bundle) too"""
+        from .bundle import Bundle
+        b = data if isinstance(data, Bundle) else Bundle(data)
+        self._bundles.append(b)
+        return b
 
-    def asm_pio(self, func):
+    def asm_pio(self, name: str, **kwargs):
         """Create a new assembler and decorates `func`"""
         a = self.assembler()
-        return a.asm_pio(func)
+        return a.asm_pio(name, **kwargs)
 
-    def emit_pio(self, func):
-        """Create a new emitter and decorates `func`"""
+    def emit_pio(self, func) -> PIOProgram:
+        """Call `func` with a new emitter, the program is named after it"""
         e = self.emitter()
-        return a.emit_pio(func)
+        func(e)
+        p = self.program(func.__name__)
+        p.set_opcodes(e.get_array())
+        return p
+
+    def tracer(self) -> 'Tracer':
+        """The tracer shared by parsers and assemblers, off by default"""
+        if self._trace is None:
+            from .trace import Tracer
+            self._trace = Tracer()
+        return self._trace
 
     def program(self, name: str, **kwargs) -> PIOProgram:
         """Create a new program from raw data"""
@@ -49,26 +96,47 @@ class pioasm:
         self._programs[name] = p
         return p
 
-    def emitter(self):
-        """Create a new emitter"""
-        from .emitter import PIOEmitter
-        return PIOEmitter(self)
+    def emitter(self, sideset_count: int=0, side_en: bool=False, trusted: bool=False):
+        """Create a new emitter, without checks if `trusted`"""
+        from .emitter import PIOEmitter, TrustedEmitter
+        return (TrustedEmitter if trusted else PIOEmitter)(sideset_count, side_en)
 
     def assembler(self):
         """Create a new assembler"""
         from .assembler import PIOAssembler
         return PIOAssembler(self)
 
-    def parse(self, filename: str, source: Iterable[str]):
+    def parse(self, filename: str, readline: Callable[[], str]):
+        """Parse source lines, generates statement records"""
         from .parser import PIOParser
         p = PIOParser(self)
-        return p.parse(filename, source)
+        return p.parse(filename, readline)
 
-    def parse_str(self, source: str):
-        return self.parse('-', source)
+    def parse_str(self, source: str, pio_version='rp2040') -> list[PIOProgram]:
+        """Parse source text, returns the programs defined"""
+        return self._parse_cached('-', source, pio_version)
 
-    def parse_file(self, filename: str):
+    def parse_file(self, filename: str, pio_version='rp2040') -> list[PIOProgram]:
+        """Parse a source file, returns the programs defined"""
         with open(filename) as fobj:
-            return self.parse(filename, fobj)
+            source = fobj.read()
+        return self._parse_cached(filename, source, pio_version)
+
+    def _parse_cached(self, filename: str, source: str, pio_version: str):
+        cache = self._cache
+        if cache is not None:
+            key = cache.key(source, pio_version)
+            programs = cache.load(key)
+            if programs is not None:
+                for p in programs:
+                    self._programs[p.name] = p
+                return programs
+        from io import StringIO
+        from .pipeline import PIOPipeline
+        programs = PIOPipeline(self, pio_version).run(
+            filename, StringIO(source).readline)
+        if cache is not None:
+            cache.store(key, programs)
+        return programs
 
 #--#
@@ -0,0 +1,77 @@
+# $ python -m upioasm build [-j N] [--bundle FILE] [--module FILE]
+#                           [--listing FILE|-] [--pio-version V]
+#                           [--defines FILE ...] [--state FILE] [-v]
+#                           file.pio ...
+
+import argparse
+import sys
+
+from .build import build, listing
+
+
+def cmd_build(args) -> int:
+    r = build(args.files, args.jobs, args.pio_version, args.defines, args.state)
+    if args.verbose:
+        for name, filename, why in r.report:
+            print(f'{"skip " if why == "up to date" else "build"} {name}'
+                  f' ({filename}): {why}', file=sys.stderr)
+    for e in r.errors:
+        print(e, file=sys.stderr)
+    if r.errors:
+        print(f'{len(r.errors)} errors, nothing written', file=sys.stderr)
+        return 1
+    source = None
+    if args.module:
+        from .freeze import module_source
+        module = args.module.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        try:
+            source = module_source(r.programs, module)
+        except ValueError as e:
+            # Clashing constant names
+            print(f'{args.module}: {e}', file=sys.stderr)
+            print('1 errors, nothing written', file=sys.stderr)
+            return 1
+    if args.bundle:
+        from .bundle import pack_bundle
+        with open(args.bundle, 'wb') as fobj:
+            fobj.write(pack_bundle(r.programs))
+    if source is not None:
+        with open(args.module, 'w') as fobj:
+            fobj.write(source)
+    if args.listing:
+        text = '\n'.join(listing(p) for p in r.programs)
+        if args.listing == '-':
+            sys.stdout.write(text)
+        else:
+            with open(args.listing, 'w') as fobj:
+                fobj.write(text)
+    print(f'{len(r.programs)} programs from {len(r.sources)} files,'
+          f' {r.skipped} up to date', file=sys.stderr)
+    return 0
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(prog='python -m upioasm')
+    sub = ap.add_subparsers(dest='command', required=True)
+    bp = sub.add_parser('build', help='assemble .pio files')
+    bp.add_argument('files', nargs='+')
+    bp.add_argument('-j', '--jobs', type=int, default=0,
+                    help='worker processes, 0 for one per core')
+    bp.add_argument('--bundle', metavar='FILE', help='write a bundle')
+    bp.add_argument('--module', metavar='FILE', help='write a frozen module')
+    bp.add_argument('--listing', metavar='FILE', help='write listings, - for stdout')
+    bp.add_argument('--pio-version', default='rp2040')
+    bp.add_argument('--defines', metavar='FILE', action='append', default=[ ],
+                    help='.define lines shared by all programs')
+    bp.add_argument('--state', metavar='FILE', default='',
+                    help='rebuild only what changed since the last build')
+    bp.add_argument('-v', '--verbose', action='store_true',
+                    help='say why each program was built or skipped')
+    args = ap.parse_args(argv)
+    return cmd_build(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#--#
@@ -9,68 +9,124 @@ if TYPE_CHECKING:
     from . import pioasm
     from .syntax import Instruction
 
+# Listing, timing and optimizer modules are imported when used.
 from .defines import Defines
 from .emitter import InstructionVisitor, PIOEmitter
 from .error import PIOSyntaxError
 from .program import PIOProgram
-from .registers import Register
-from .resolver import ResolverVisitor
-from .xpileemitter import EmitterVisitor
-from .xpilelabels import LabelsVisitor
-from .xpileprinter import PrintVisitor
+from .resolver import ResolverVisitor, TeeVisitor
 from . import syntax
+from . import trace
 
 Value = Union[str, int]
 
+# generate() outputs besides the opcodes, asm_pio(outputs=...)
+OUT_LISTING = const(1)  # Source lines as written
+OUT_SOURCE = const(2)   # InstructionVisitor calls, symbols resolved
+OUT_LABELS = const(4)   # Offset => jmp targets
+OUT_TIMING = const(8)   # Per instruction cycle records
+OUT_ALL = const(15)
+
+
+class Generated:
+    """The outputs of one generate(), None unless asked for"""
+    __slots__ = ( 'codes', 'listing', 'source', 'labels', 'timing' )
+
+    def __init__(self) -> None:
+        self.codes: Any = None
+        self.listing: list[str]|None = None
+        self.source: list[str]|None = None
+        self.labels: dict[int, list[Value]]|None = None
+        self.timing: list|None = None
+        return
+
+
 class Word(syntax.Instruction):
+    __slots__ = ( '_code', )
+
     def __init__(self, value):
         self._code = value
-        super(self).__init__()
+        super().__init__()
 
 
 def _use_label_noop(label: syntax.Label):
     pass
 
 
+_NAMESPACE: dict[str, Any] = { }
+
+def _namespace() -> dict[str, Any]:
+    # The globals of a DSL body, built on first use
+    if not _NAMESPACE:
+        ns = { }
+        for key, val in syntax.__dict__.items():
+            # No privates or Types
+            if 'a' <= key[0] <= 'z':
+                ns[key] = val
+        import builtins
+        ns['__builtins__'] = builtins
+        _NAMESPACE.update(ns)
+    return _NAMESPACE
+
+
 class PIOAssembler:
-    def __init__(self, pioasm: pioasm) -> None:
+    def __init__(self, pioasm: 'pioasm') -> None:
         self._pioasm = pioasm
+        self._trace = pioasm.tracer()
         self._adefs = Defines()
         self._program: PIOProgram|None = None
         self._pdefs: Defines|None = None
         self._ilist: list[Instruction] = [ ]
         self._options: dict[str, Any] = { }
+        self._labels: list[str] = [ ]
+        self._optimize = 0
+        self._outputs = 0
+        self.generated: Generated|None = None
         return
 
     def asm_pio(self, name: str, **kwargs):
         def deco(func) -> PIOProgram:
             p = self.phase_one(name, kwargs)
-            gl = func.__globals__
-            org_gl = gl.copy()
+            previous = syntax._enter(self)
             try:
-                gl.clear()
-                self.import_syntax(gl)
-                syntax._asm = self
-                func()
+                self._run(func)
             finally:
-                del syntax._asm
-                gl.clear()
-                gl.update(org_gl)
-                del gl
+                syntax._enter(previous)
             self.phase_two()
             return p
         return deco
 
+    def _run(self, func) -> None:
+        # Call the DSL body with the syntax names as its globals
+        code = getattr(func, '__code__', None)
+        if code is not None:
+            type(func)(code, dict(_namespace()), func.__name__,
+                       func.__defaults__, func.__closure__)()
+            return
+        # micropython can not rebind globals, swap them meanwhile
+        gl = func.__globals__
+        org_gl = gl.copy()
+        try:
+            gl.clear()
+            self.import_syntax(gl)
+            func()
+        finally:
+            gl.clear()
+            gl.update(org_gl)
+            del gl
+
     def phase_one(self, name: str, kwargs: dict[str, Any]):
+        # optimize= optimizer passes, see optimizer.py
+        # outputs= generate() outputs kept in .generated
+        kwargs = dict(kwargs)
+        self._optimize = kwargs.pop('optimize', 0)
+        self._outputs = kwargs.pop('outputs', 0)
         self.program(name, **kwargs)
         self._pdefs = self._adefs.copy(True)
         return self._program
 
     def import_syntax(self, g: dict[str, Any]):
-        for key, val in syntax.__dict__.items():
-            # No privates or Types
-            if 'a' <= key[0] <= 'z':
-                g[key] = val
+        g.update(_namespace())
         return
 
     def phase_two(self) -> PIOProgram:
@@ -78,16 +134,62 @@ class PIOAssembler:
             raise PIOSyntaxError('phase two without a program')
         p = self._program
         try:
-            opcodes = self.generate(self._pdefs, self._ilist)
-            #p.set_opcodes()
-            #p.set_defines(self._pdefs)
+            if self._optimize:
+                self.optimize(self._optimize)
+            if len(self._ilist) > 32:
+                raise PIOSyntaxError('program > 32 instructions')
+            tr = self._trace
+            listing = tr.flags & trace.ASM
+            g = self.generate(self._pdefs, self._ilist,
+                              self._outputs | (OUT_ALL if listing else 0))
+            if listing:
+                self.print_generated(self._pdefs, g)
+            self.generated = g if self._outputs else None
+            opcodes = g.codes
+            # Only jmp words hold an address
+            relocs = 0
+            for addr, i in enumerate(self._ilist):
+                if isinstance(i, syntax._jmp):
+                    relocs |= 1 << addr
+            p.set_opcodes(opcodes, relocs)
+            defines = {
+                key: value
+                for key, value, public in self._pdefs.items()
+                if public and value is not None
+            }
+            p.set_defines(defines)
+            p.set_labels({
+                name: defines[name] for name in self._labels if name in defines
+            })
+            # .wrap is recorded after the last instruction of the loop
+            p.set_wrap(
+                self._options.get('.wrap_target', 0),
+                self._options.get('.wrap', 0) - 1,
+            )
+            p.side_set(*self._options.get('.side_set', ( 0, False, False )))
         finally:
             self._program = None
             self._pdefs = None
             self._ilist = [ ]
             self._options = { }
+            self._labels = [ ]
+            self._optimize = 0
+            self._outputs = 0
         return p
 
+    def optimize(self, passes: int) -> int:
+        """Run the peephole optimizer over the instructions, => slots saved"""
+        from .optimizer import PeepholeOptimizer
+        po = PeepholeOptimizer(passes, cast(Defines, self._pdefs),
+                               self._labels, self._options)
+        self._ilist = po.run(self._ilist)
+        tr = self._trace
+        if tr.flags & trace.OPT:
+            tr('-- optimizer')
+            for line in po.report:
+                tr('# ' + line)
+        return po.saved
+
     def program(self, name: str, pio_version='rp2040'):
         # Begin a new program.
         p = self._pioasm.program(name, pio_version=pio_version)
@@ -106,13 +208,18 @@ class PIOAssembler:
         return
 
     def origin(self, offset: Value):
-        #offset = _check_5_bits(offset)
-        #return self
         if self._program is None:
             raise PIOSyntaxError('origin outside of program')
-        #self._program.origin(offset)
+        if isinstance(offset, str):
+            offset = cast(Defines, self._pdefs).resolve(offset)
+        if not 0 <= offset < 32:
+            raise PIOSyntaxError('origin not 0..31')
+        self._program.origin(offset)
 
     def side_set(self, count: Value, opt: bool=True, pindirs: bool=False):
+        if self._ilist:
+            raise PIOSyntaxError('.side_set after instructions')
+        self._options['.side_set'] = ( count, opt, pindirs )
         return self
 
     #def set(count)
@@ -141,6 +248,7 @@ class PIOAssembler:
             name = 'L%d' % len(self._pdefs)
         elif name.startswith(';'):
             forward = True
+        self._labels.append(name)
         if forward:
             self._pdefs.declare(name, public)
             return syntax.Label(name, self._label_used)
@@ -151,62 +259,106 @@ class PIOAssembler:
         cast(Defines, self._pdefs).assign(label._name, len(self._ilist))
         return
 
-    def append(self, i: Instruction) -> None:
+    def append(self, i: 'Instruction') -> None:
         if self._pdefs is None:
             raise PIOSyntaxError('instruction outside of program')
-        if len(self._ilist) >= 32:
+        if len(self._ilist) >= 32 and not self._optimize:
             raise PIOSyntaxError('program > 32 instructions')
         self._ilist.append(i)
         return
 
-    def generate(self, pdefs: Defines, ilist: list[Instruction]):
-        print('-- defines')
-        for d in pdefs._tab:
-            print(d)
-
-        # Instructions to opcodes
-        ee = PIOEmitter() #**self._options)
-        rw = ResolverVisitor(pdefs, ee)
-
-        # Extract jmp target addrs/labels
-        # todo - add .wrap and .wrap_target
-        lv = LabelsVisitor()
-
-        # Simplified source
-        pv = PrintVisitor()
-
+    def generate(self, pdefs: Defines, ilist: 'list[Instruction]',
+                 outputs: int=0) -> Generated:
+        """Opcodes plus the requested `outputs`, in one pass over `ilist`"""
+        count, opt, pindirs = self._options.get('.side_set', ( 0, False, False ))
+        g = Generated()
+        ee = PIOEmitter(count + opt, opt)
+        resolved: list[InstructionVisitor] = [ ee ]
+        raw: list[InstructionVisitor] = [ ]
+        if outputs & OUT_SOURCE:
+            from .xpileemitter import EmitterVisitor
+            vv = EmitterVisitor()
+            resolved.append(vv)
+        if outputs & OUT_TIMING:
+            from .timing import TimingVisitor
+            tv = TimingVisitor()
+            resolved.append(tv)
+        if outputs & OUT_LABELS:
+            from .xpilelabels import LabelsVisitor
+            lv = LabelsVisitor()
+            raw.append(lv)
+        if outputs & OUT_LISTING:
+            from .xpileprinter import PrintVisitor
+            pv = PrintVisitor()
+            raw.append(pv)
+
+        # Symbols are resolved once for the emitter and its peers,
+        # listings and labels see them as written.
+        v: InstructionVisitor = ResolverVisitor(
+            pdefs, resolved[0] if len(resolved) == 1 else TeeVisitor(resolved))
+        if raw:
+            v = TeeVisitor([ v ] + raw)
         for i in ilist:
-            i.visit(rw)
-            i.visit(lv)
-            i.visit(pv)
-
-        codes = ee.get_array()
-        addrs = lv.get_jmp_addrs()
-
-        def matching_addrs(ofs):
-            for addr in addrs:
+            i.visit(v)
+
+        g.codes = ee.get_array()
+        if outputs & OUT_SOURCE:
+            g.source = list(vv)
+        if outputs & OUT_TIMING:
+            g.timing = list(tv)
+        if outputs & OUT_LABELS:
+            # Offset => jmp targets (labels or addrs)
+            # todo - add .wrap and .wrap_target
+            targets: dict[int, list[Value]] = { }
+            for addr in lv.get_jmp_addrs():
                 a = addr if isinstance(addr, int) else pdefs.resolve(addr)
-                if a == ofs:
-                    yield addr
-
-        print('-- output')
-        print('{name}_opcodes = [')
-        for ofs, (code, src) in enumerate(zip(codes, pv)):
-            for addr in matching_addrs(ofs):
-                print(f'    # ==> {addr}:')
-            print('    0x%04x, # %2d ; %s' % (code, ofs, src))
-        print(']')
+                targets.setdefault(a, [ ]).append(addr)
+            g.labels = targets
+        if outputs & OUT_LISTING:
+            g.listing = list(pv)
+        return g
+
+    def print_generated(self, pdefs: Defines, g: Generated):
+        tr = self._trace
+        targets = g.labels or { }
+
+        tr('-- defines')
+        for d in pdefs.items():
+            tr(str(d))
+
+        tr('-- output')
+        tr('{name}_opcodes = [')
+        for ofs, (code, src) in enumerate(zip(g.codes, g.listing or ( ))):
+            for addr in targets.get(ofs, ( )):
+                tr(f'    # ==> {addr}:')
+            tr('    0x%04x, # %2d ; %s' % (code, ofs, src))
+        tr(']')
+        self.print_cycles(g.timing or [ ], targets)
 
         # Visitor source
-        print('-- visitor')
-        vv = EmitterVisitor()
-        rw = ResolverVisitor(pdefs, vv)
-        for i in ilist:
-            i.visit(rw)
-        print('def {name}_emit(v: InstructionVisitor):')
-        for ofs, line in enumerate(vv):
-            for addr in matching_addrs(ofs):
-                print(f'    # [{ofs:2}] ==> {addr}:')
-            print('   ', line)
+        tr('-- visitor')
+        tr('def {name}_emit(v: InstructionVisitor):')
+        for ofs, line in enumerate(g.source or ( )):
+            for addr in targets.get(ofs, ( )):
+                tr(f'    # [{ofs:2}] ==> {addr}:')
+            tr('    ' + line)
+        return
+
+    def print_cycles(self, timing: list, targets: dict[int, list[Value]]):
+        from .timing import CycleAnalyzer, format_cycles
+        tr = self._trace
+        labels = { str(a[0]): ofs for ofs, a in targets.items() }
+        wrap_target = self._options.get('.wrap_target', 0)
+        wrap = self._options.get('.wrap', 0) - 1
+        ca = CycleAnalyzer(timing, wrap_target, wrap, labels)
+        tr('# cycles .wrap_target -> .wrap_target = '
+           + format_cycles(*ca.wrap_cycles()))
+        # Each label to the next one reached
+        names = sorted(labels, key=lambda n: labels[n])
+        for a, b in zip(names, names[1:]):
+            best, worst = ca.cycles(a, b)
+            if best is not None:
+                tr(f'# cycles {a} -> {b} = ' + format_cycles(best, worst))
+        return
 
 #--#
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+
+from binascii import hexlify
+from io import StringIO
+from typing import Any, Tuple
+
+from . import pioasm, __version__
+from .error import PIOSyntaxError
+from .program import PIOProgram
+
+# A unit is ( filename, program name, source ), one .program block
+# plus the lines before the first .program of its file.  Other blocks
+# are blanked so diagnostics keep their line numbers.
+Unit = Tuple[str, str, str]
+
+
+def split_source(filename: str, source: str) -> list[Unit]:
+    """The independent programs of a .pio source
+
+    Blocks start at the `.program` tokens, so not in comments.  A
+    scan error ends the last block there, assembling it reports the
+    error; before the first block it is raised.
+    """
+    from .parser import KeywordToken, LineScanner, NewlineToken, SymbolToken
+    lines = source.splitlines(True)
+    starts: list[tuple[int, str]] = [ ]  # ( line index, name )
+    w0 = w1 = w2 = None  # The tokens before t
+    try:
+        for t in LineScanner().token_reader(StringIO(source).readline):
+            if (isinstance(w1, KeywordToken) and w1.inp == '.'
+                    and isinstance(w2, KeywordToken) and w2.inp == 'program'
+                    and (w0 is None or isinstance(w0, NewlineToken))
+                    and isinstance(t, ( KeywordToken, SymbolToken ))):
+                starts.append(( w1.line_no - 1, t.inp ))
+            w0, w1, w2 = w1, w2, t
+    except PIOSyntaxError:
+        if not starts:
+            raise
+    if not starts:
+        return [ ]
+    first = starts[0][0]
+    prelude = ''.join(lines[:first])
+    units = [ ]
+    ends = [ a for a, _ in starts[1:] ] + [ len(lines) ]
+    for ( a, name ), b in zip(starts, ends):
+        text = prelude + '\n' * (a - first) + ''.join(lines[a:b])
+        units.append(( filename, name, text ))
+    return units
+
+
+def assemble_unit(unit: Unit, pio_version: str='rp2040',
+                  defines: 'dict[str, int]|None'=None) -> tuple[list[PIOProgram], list[str]]:
+    """( programs, diagnostics ) of one unit, run in a worker"""
+    filename, name, text = unit
+    from .pipeline import PIOPipeline
+    try:
+        pp = PIOPipeline(pioasm(), pio_version, defines)
+        return pp.run(filename, StringIO(text).readline), [ ]
+    except PIOSyntaxError as e:
+        return [ ], [ str(e) ]
+    except Exception as e:
+        # An assembler bug, still only this unit fails
+        return [ ], [ f'{filename}: {name}: {e.__class__.__name__}: {e}' ]
+
+
+class BuildResult:
+    """BuildResult - programs in source order, plus diagnostics
+
+    `sources` maps each filename to the names of its programs, and
+    `report` says why each one was ( name, filename, reason ) built
+    or skipped.
+    """
+
+    def __init__(self) -> None:
+        self.programs: list[PIOProgram] = [ ]
+        self.errors: list[str] = [ ]
+        self.sources: dict[str, list[str]] = { }
+        self.report: list[tuple[str, str, str]] = [ ]
+        self.skipped = 0
+        return
+
+    def __bool__(self):
+        return not self.errors
+
+
+def _assemble(units: list[Unit], pio_version: str, jobs: int,
+              defines: list[dict[str, int]]) -> list:
+    if jobs != 1 and len(units) > 1:
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+        except ImportError:
+            pass  # micropython
+        else:
+            n = jobs or os.cpu_count() or 1
+            with ProcessPoolExecutor(n) as ex:
+                # map() keeps the order whatever finishes first
+                return list(ex.map(assemble_unit, units, [ pio_version ] * len(units),
+                                   defines, chunksize=max(1, len(units) // (4 * n))))
+    return [ assemble_unit(u, pio_version, d) for u, d in zip(units, defines) ]
+
+
+def _hash(parts) -> str:
+    h = hashlib.sha256()
+    for s in parts:
+        h.update(s.encode())
+        h.update(b'\0')
+    return hexlify(h.digest()[:16]).decode()
+
+
+def _symbols(text: str) -> set[str]:
+    from .parser import LineScanner, SymbolToken
+    return { t.inp for t in LineScanner().token_reader(StringIO(text).readline)
+             if isinstance(t, SymbolToken) }
+
+
+def _shared_defines(filenames: list[str], pio_version: str, r: BuildResult) -> dict:
+    # name => ( value, filename ) from the defines files
+    from .pipeline import PIOPipeline
+    shared: dict[str, tuple[int, str]] = { }
+    for fn in filenames:
+        try:
+            with open(fn) as fobj:
+                pp = PIOPipeline(pioasm(), pio_version)
+                if pp.run(fn, fobj.readline):
+                    raise PIOSyntaxError(f'{fn}: programs in a defines file')
+        except (OSError, PIOSyntaxError) as e:
+            r.errors.append(str(e) if fn in str(e) else f'{fn}: {e}')
+            continue
+        for key, value in pp.get_defines().items():
+            shared[key] = ( value, fn )
+    return shared
+
+
+def _load_state(filename: str) -> dict:
+    try:
+        with open(filename) as fobj:
+            state = json.load(fobj)
+        return state['units'] if isinstance(state, dict) else { }
+    except (OSError, ValueError, KeyError):
+        return { }
+
+
+def _save_state(filename: str, units: dict):
+    with open(filename + '.tmp', 'w') as fobj:
+        json.dump({ 'version': __version__, 'units': units }, fobj, indent=1,
+                  sort_keys=True)
+    os.replace(filename + '.tmp', filename)
+
+
+def _stale(entry: dict|None, want: dict, shared: dict) -> str:
+    # Why a unit must be built, '' when `entry` is up to date
+    if entry is None:
+        return 'new'
+    for key, why in ( ( 'version', 'upioasm version changed' ),
+                      ( 'pio_version', 'pio_version changed' ),
+                      ( 'source', 'source changed' ) ):
+        if entry.get(key) != want[key]:
+            return why
+    old, new = entry.get('defines', { }), want['defines']
+    if old != new:
+        changed = sorted({ shared[k][1] if k in shared else 'removed'
+                           for k in set(old) | set(new) if old.get(k) != new.get(k) })
+        return 'defines changed: ' + ', '.join(changed)
+    return ''
+
+
+def build(filenames: list[str], jobs: int=0, pio_version: str='rp2040',
+          defines: 'list[str]|None'=None, state: str='') -> BuildResult:
+    """Assemble every program of `filenames`
+
+    Each .program block is assembled on its own, across a process
+    pool of `jobs` workers (0 for one per core, 1 for none).  The
+    result is in file then program order whatever the scheduling.
+
+    `defines` are files of .define lines shared by every program.
+
+    With a `state` file a block is only assembled again when its
+    text (blank lines aside), the shared defines it uses, the
+    pio_version or the upioasm version changed since the last build.
+    """
+    from .cache import _pack, _unpack
+    r = BuildResult()
+    shared = _shared_defines(defines or [ ], pio_version, r)
+    units: list[Unit] = [ ]
+    for fn in filenames:
+        if fn in r.sources:
+            continue
+        try:
+            with open(fn) as fobj:
+                source = fobj.read()
+        except OSError as e:
+            r.errors.append(f'{fn}: {e}')
+            continue
+        try:
+            found = split_source(fn, source)
+        except PIOSyntaxError as e:
+            r.errors.append(f'{fn}: {e}')
+            continue
+        r.sources[fn] = [ name for _, name, _ in found ]
+        units.extend(found)
+
+    # What each unit depends on, and which need building
+    old = _load_state(state) if state else { }
+    wants: list[dict[str, Any]] = [ ]
+    todo = [ ]
+    failed: set[int] = set()
+    for k, ( fn, name, text ) in enumerate(units):
+        try:
+            used = sorted(_symbols(text) & set(shared)) if shared else [ ]
+        except PIOSyntaxError as e:
+            # Would fail the same way when assembled
+            r.errors.append(f'{fn}: {e}')
+            r.report.append(( name, fn, 'error' ))
+            failed.add(k)
+            wants.append({ })
+            continue
+        wants.append({
+            'version': __version__,
+            'pio_version': pio_version,
+            'source': _hash(l for l in text.splitlines() if l.strip()),
+            'defines': { key: shared[key][0] for key in used },
+        })
+        why = _stale(old.get(fn + ':' + name), wants[-1], shared) if state else 'full build'
+        if why:
+            todo.append(k)
+        r.report.append(( name, fn, why or 'up to date' ))
+    built = dict(zip(todo, _assemble([ units[k] for k in todo ], pio_version, jobs,
+                                     [ wants[k]['defines'] for k in todo ])))
+
+    seen: dict[str, str] = { }
+    new_state = { }
+    for k, ( fn, name, text ) in enumerate(units):
+        key = fn + ':' + name
+        if k in failed:
+            continue
+        if k in built:
+            programs, errors = built[k]
+            r.errors.extend(errors)
+        else:
+            programs = [ _unpack(d) for d in old[key]['programs'] ]
+            r.skipped += 1
+        if programs:
+            new_state[key] = dict(wants[k], programs=[ _pack(p) for p in programs ])
+        for p in programs:
+            if p.name in seen:
+                r.errors.append(f'{fn}: {p.name} also defined in {seen[p.name]}')
+                continue
+            seen[p.name] = fn
+            r.programs.append(p)
+    if state:
+        _save_state(state, new_state)
+    return r
+
+
+def listing(p: PIOProgram) -> str:
+    """Annotated opcodes of `p`, as the SDK pioasm hex output"""
+    from .decoder import disassemble
+    from .xpileprinter import PrintVisitor
+    wrap_target, wrap = p.get_wrap()
+    labels: dict[int, list[str]] = { }
+    for name, addr in p.get_labels().items():
+        labels.setdefault(addr, [ ]).append(name)
+    count, opt, pindirs = p.get_side_set()
+    out = [ f'; {p.name}' ]
+    if count:
+        out.append(f'.side_set {count}{" opt" if opt else ""}{" pindirs" if pindirs else ""}')
+    if p.get_origin() >= 0:
+        out.append(f'.origin {p.get_origin()}')
+    for key, value in p.get_defines().items():
+        if key not in p.get_labels():
+            out.append(f'.define public {key} {value}')
+    pv = PrintVisitor()
+    disassemble(p, pv)
+    text = list(pv)
+    for addr, ( code, line ) in enumerate(zip(p.get_opcodes(), text)):
+        if addr == wrap_target:
+            out.append('.wrap_target')
+        for name in labels.get(addr, ( )):
+            out.append(f'public {name}:')
+        out.append(f'    0x{code:04x}, ; {addr:2} {line}')
+        if addr == wrap:
+            out.append('.wrap')
+    return '\n'.join(out) + '\n'
+
+#--#
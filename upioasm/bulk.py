@@ -0,0 +1,197 @@
+# Needs numpy, so not imported by upioasm
+
+from typing import Any
+
+import numpy as np
+
+from . import opcodes
+from .error import PIOSyntaxError
+
+# Mnemonic codes, in opcode order
+MNEMONICS = ( 'jmp', 'wait', 'in', 'out', 'push', 'pull', 'mov', 'irq', 'set' )
+JMP, WAIT, IN, OUT, PUSH, PULL, MOV, IRQ, SET = range(len(MNEMONICS))
+
+FIELDS = ( 'mnemonic', 'dest', 'source', 'count', 'delay', 'side' )
+
+
+def _field(bits) -> tuple[int, int]:
+    # ( shift, mask ) of a field from all its bit patterns
+    if isinstance(bits, dict):
+        bits = bits.values()
+    v = 0
+    for b in bits:
+        v |= b
+    shift = (v & -v).bit_length() - 1
+    return shift, v >> shift
+
+
+def _valid(tab: dict[str, int], shift: int, size: int) -> np.ndarray:
+    # Field value => legal, from an opcodes table
+    ok = np.zeros(size, dtype=bool)
+    for value in tab.values():
+        ok[value >> shift] = True
+    return ok
+
+
+# Per mnemonic ( base, dest table, source table, count range ).  The
+# tables give each field its position and legal values, dicts are
+# opcodes tables, tuples the flag bits of the field.
+_LAYOUT: list[tuple[int, Any, Any, tuple[int, int]|None]] = [
+    ( opcodes.op_jmp, opcodes.jmp_cond, None, ( 0, 31 ) ),
+    ( opcodes.op_wait, ( opcodes.wait_pol, ), opcodes.wait_source, ( 0, 31 ) ),
+    ( opcodes.op_in, None, opcodes.in_source, ( 1, 32 ) ),
+    ( opcodes.op_out, opcodes.out_dest, None, ( 1, 32 ) ),
+    ( opcodes.op_push, ( opcodes.push_iff, opcodes.push_blk ), None, None ),
+    ( opcodes.op_pull, ( opcodes.pull_ife, opcodes.pull_blk ), None, None ),
+    ( opcodes.op_mov, opcodes.mov_dest, opcodes.mov_source, None ),
+    ( opcodes.op_irq, ( opcodes.irq_clr, opcodes.irq_wait ), None, ( 0, 31 ) ),
+    ( opcodes.op_set, opcodes.set_dest, None, ( 0, 31 ) ),
+]
+
+
+class _Tables:
+    # Whole-array lookups by mnemonic code, built from _LAYOUT
+    def __init__(self) -> None:
+        n = len(_LAYOUT)
+        self.base = np.zeros(n, dtype=np.uint16)
+        self.shift = np.zeros(( 2, n ), dtype=np.uint16)      # dest, source
+        self.mask = np.zeros(( 2, n ), dtype=np.uint16)
+        self.ok = np.zeros(( 2, n, 32 ), dtype=bool)
+        self.count = np.zeros(( 2, n ), dtype=np.int32)       # lo, hi
+        for m, ( base, dest, source, count ) in enumerate(_LAYOUT):
+            self.base[m] = base
+            for f, tab in enumerate(( dest, source )):
+                if tab is None:
+                    self.ok[f, m, 0] = True
+                    continue
+                shift, mask = _field(tab)
+                self.shift[f, m] = shift
+                self.mask[f, m] = mask
+                if isinstance(tab, dict):
+                    self.ok[f, m] = _valid(tab, shift, 32)
+                else:
+                    self.ok[f, m, :mask + 1] = True
+            self.count[:, m] = count or ( 0, 0 )
+        # Bits 4:0 are the count, or mov source
+        self.uses_count = self.count[1] > 0
+        # op field => mnemonic, push/pull split by bit 7
+        self.op = np.array([ m for m in range(n) if m != PULL ], dtype=np.uint8)
+        self.pull_bit = opcodes.op_pull ^ opcodes.op_push
+        return
+
+
+_T: _Tables|None = None
+
+def _tables() -> _Tables:
+    global _T
+    if _T is None:
+        _T = _Tables()
+    return _T
+
+
+def _delay_side(sideset_count: int, side_en: bool) -> tuple[int, int]:
+    # ( delay bits, side-set enable bit or 0 ) as PIOEmitter
+    if (sideset_count < 0
+        or sideset_count > 5
+        or side_en and sideset_count < 2
+    ):
+        raise PIOSyntaxError('invalid side-set count / en')
+    nd = 5 - sideset_count
+    return nd, (1 << (sideset_count - 1)) if side_en else 0
+
+
+def _first(bad: np.ndarray, what: str):
+    if bad.any():
+        i = int(np.flatnonzero(bad)[0])
+        raise PIOSyntaxError(f'{what} invalid at [{i}]')
+
+
+def encode(mnemonic, dest=0, source=0, count=0, delay=0, side=-1, *,
+           sideset_count: int=0, side_en: bool=False, trusted: bool=False) -> np.ndarray:
+    """Opcodes, a uint16 array, from arrays of instruction fields
+
+    Fields are integers, the value of the field in the opcode (as
+    the opcodes tables shifted down), and broadcast as numpy does:
+
+        mnemonic  dest                source           count
+        jmp       condition           -                address
+        wait      polarity            gpio|pin|irq     index (+16 rel)
+        in        -                   source           bits 1..32
+        out       destination         -                bits 1..32
+        push      iffull<<1 | block   -                -
+        pull      ifempty<<1 | block  -                -
+        mov       destination         (op)source       -
+        irq       clear<<1 | wait     -                index (+16 rel)
+        set       destination         -                data
+
+    `side` is -1 for none, allowed with side_en only.  Unless
+    `trusted`, reserved values and anything out of range raise a
+    PIOSyntaxError naming the first bad row.
+    """
+    t = _tables()
+    nd, en = _delay_side(sideset_count, side_en)
+    m, d, s, c, dl, sd = np.broadcast_arrays(*(
+        np.asarray(a, dtype=np.int32) for a in ( mnemonic, dest, source, count, delay, side )))
+    if not trusted:
+        _first((m < 0) | (m >= len(MNEMONICS)), 'mnemonic')
+        for f, what, v in ( ( 0, 'dest', d ), ( 1, 'source', s ) ):
+            _first((v < 0) | (v > 31) | ~t.ok[f, m, v & 31], what)
+        _first((c < t.count[0, m]) | (c > t.count[1, m]), 'count')
+        _first((dl < 0) | (dl >= (1 << nd)), 'delay')
+        if not sideset_count:
+            _first(sd != -1, 'side')
+        else:
+            # -1 only with side_en
+            _first((sd < (-1 if en else 0)) | (sd >= (1 << (sideset_count - bool(en)))), 'side')
+    # Values are masked to their field, as TrustedEmitter
+    code = (t.base[m]
+            | ((d & t.mask[0, m]) << t.shift[0, m])
+            | ((s & t.mask[1, m]) << t.shift[1, m])
+            | np.where(t.uses_count[m], c & 31, 0)
+            | ((dl & ((1 << nd) - 1)) << 8))
+    if sideset_count:
+        code |= np.where(sd >= 0, (sd | en) << (8 + nd), 0)
+    return code.astype(np.uint16)
+
+
+def decode(codes, *, sideset_count: int=0, side_en: bool=False) -> dict[str, np.ndarray]:
+    """Fields of uint16 `codes`, the reverse of encode
+
+    A dict of FIELDS arrays plus `valid`, False where an opcode has
+    reserved values or stray bits.  `side` is -1 for none.  Unlike
+    PIODecoder, `mov y, y` stays a mov.
+    """
+    t = _tables()
+    nd, en = _delay_side(sideset_count, side_en)
+    code = np.asarray(codes, dtype=np.uint16).astype(np.int32)
+    op = code >> 13
+    m = t.op[op] + ((op == (opcodes.op_pull >> 13)) & ((code & t.pull_bit) != 0))
+    d = (code >> t.shift[0, m]) & t.mask[0, m]
+    s = (code >> t.shift[1, m]) & t.mask[1, m]
+    c = np.where(t.uses_count[m], code & 31, 0)
+    c = np.where((c == 0) & (t.count[0, m] == 1), 32, c)
+    # Bits 7:0 not covered by a field must be zero
+    used = ((t.mask[0, m].astype(np.int32) << t.shift[0, m])
+            | (t.mask[1, m].astype(np.int32) << t.shift[1, m])
+            | np.where(t.uses_count[m], 31, 0)
+            | np.where(m == PULL, t.pull_bit, 0))
+    valid = t.ok[0, m, d] & t.ok[1, m, s] & ((code & 0xff & ~used) == 0)
+    ds = (code >> 8) & 31
+    delay = ds & ((1 << nd) - 1)
+    if sideset_count:
+        side = ds >> nd
+        if en:
+            side = np.where(side & en, side & (en - 1), -1)
+    else:
+        side = np.full(code.shape, -1)
+    return {
+        'mnemonic': m.astype(np.uint8),
+        'dest': d.astype(np.uint8),
+        'source': s.astype(np.uint8),
+        'count': c.astype(np.uint8),
+        'delay': delay.astype(np.uint8),
+        'side': side.astype(np.int8),
+        'valid': valid,
+    }
+
+#--#
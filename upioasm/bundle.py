@@ -0,0 +1,175 @@
+import struct
+
+from .program import PIOProgram
+
+# Little-endian throughout, offsets from the start of the bundle.
+#
+#   header  magic, version, count, string table offset
+#   index   count * ( name, record ), sorted by name
+#   records header, opcodes, defines, labels; 4 byte aligned
+#   strings u8 length + utf-8 bytes
+#
+# A record header is n opcodes, wrap_target, wrap, origin, side-set
+# count, side-set flags (opt 1, pindirs 2), n defines, n labels, the
+# relocation mask and the pio_version string.  Defines and labels
+# are ( name, value ) pairs.
+MAGIC = b'PIOB'
+VERSION = 1
+_HEADER = '<4sHHI'
+_INDEX = '<II'
+_RECORD = '<BBbbBBBBII'
+_PAIR = '<Ii'
+_HEADER_SIZE = struct.calcsize(_HEADER)
+_RECORD_SIZE = struct.calcsize(_RECORD)
+
+
+class Bundle:
+    """Bundle - many assembled programs in one binary blob
+
+    `data` is any buffer: bytes frozen into the firmware, a file
+    read into a bytearray, or an mmap on CPython (`open_bundle`).
+    Only the header is read up front; a lookup by name is a binary
+    search of the index through a memoryview, and only the record
+    found is unpacked into a PIOProgram.
+    """
+
+    def __init__(self, data) -> None:
+        mv = memoryview(data)
+        if len(mv) < _HEADER_SIZE:
+            raise ValueError('bundle too short')
+        magic, version, count, strings = struct.unpack_from(_HEADER, mv, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a bundle, or a newer version')
+        self._mv = mv
+        self._count = count
+        self._strings = strings
+        return
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, name: str):
+        return self._find(name.encode()) >= 0
+
+    def _str(self, ofs: int) -> memoryview:
+        ofs += self._strings
+        return self._mv[ofs + 1:ofs + 1 + self._mv[ofs]]
+
+    def _entry(self, k: int) -> tuple[int, int]:
+        return struct.unpack_from(_INDEX, self._mv, _HEADER_SIZE + 8 * k)
+
+    def _find(self, key: bytes) -> int:
+        # Record offset of `key`, or -1
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name, rec = self._entry(mid)
+            s = bytes(self._str(name))
+            if s == key:
+                return rec
+            if s < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def names(self) -> list[str]:
+        return [ str(bytes(self._str(self._entry(k)[0])), 'utf-8')
+                 for k in range(self._count) ]
+
+    def opcodes(self, name: str) -> memoryview:
+        """The little-endian opcode bytes of `name`, not copied"""
+        rec = self._record(name)
+        n = self._mv[rec]
+        ofs = rec + _RECORD_SIZE
+        return self._mv[ofs:ofs + 2 * n]
+
+    def _record(self, name: str) -> int:
+        rec = self._find(name.encode())
+        if rec < 0:
+            raise KeyError(name)
+        return rec
+
+    def __getitem__(self, name: str) -> PIOProgram:
+        mv = self._mv
+        rec = self._record(name)
+        (n, wrap_target, wrap, origin, ss_count, ss_flags,
+         ndefines, nlabels, relocs, version) = struct.unpack_from(_RECORD, mv, rec)
+        p = PIOProgram(name, pio_version=str(bytes(self._str(version)), 'utf-8'))
+        ofs = rec + _RECORD_SIZE
+        p.set_opcodes(struct.unpack_from('<%dH' % n, mv, ofs), relocs)
+        ofs += 2 * (n + (n & 1))
+        pairs = [ ]
+        for k in range(ndefines + nlabels):
+            s, value = struct.unpack_from(_PAIR, mv, ofs)
+            pairs.append(( str(bytes(self._str(s)), 'utf-8'), value ))
+            ofs += 8
+        p.set_defines(dict(pairs[:ndefines]))
+        p.set_labels(dict(pairs[ndefines:]))
+        p.set_wrap(wrap_target, wrap)
+        p.origin(origin)
+        p.side_set(ss_count, bool(ss_flags & 1), bool(ss_flags & 2))
+        return p
+
+
+def pack_bundle(programs: list[PIOProgram]) -> bytes:
+    """Programs => bundle bytes, see Bundle"""
+    strings = bytearray()
+    string_ofs: dict[str, int] = { }
+
+    def string(s: str) -> int:
+        ofs = string_ofs.get(s)
+        if ofs is None:
+            b = s.encode()
+            if len(b) > 255:
+                raise ValueError(f'{s[:16]}...: name too long')
+            ofs = string_ofs[s] = len(strings)
+            strings.append(len(b))
+            strings.extend(b)
+        return ofs
+
+    programs = sorted(programs, key=lambda p: p.name.encode())
+    records = bytearray()
+    index = [ ]
+    base = _HEADER_SIZE + 8 * len(programs)
+    for k, p in enumerate(programs):
+        if k and p.name == programs[k - 1].name:
+            # The index lookup would find either
+            raise ValueError(f'{p.name}: duplicate program name')
+        index.append(( string(p.name), base + len(records) ))
+        codes = p.get_opcodes()
+        n = len(codes)
+        wrap_target, wrap = p.get_wrap()
+        count, opt, pindirs = p.get_side_set()
+        defines = p.get_defines()
+        labels = p.get_labels()
+        if len(defines) > 255 or len(labels) > 255:
+            raise ValueError(f'{p.name}: over 255 defines or labels')
+        records += struct.pack(
+            _RECORD, n, wrap_target, wrap, p.get_origin(), count,
+            opt | pindirs << 1, len(defines), len(labels), p.get_relocs(),
+            string(p.pio_version),
+        )
+        records += struct.pack('<%dH' % n, *codes)
+        if n & 1:
+            records += b'\0\0'
+        for tab in ( defines, labels ):
+            for key, value in tab.items():
+                records += struct.pack(_PAIR, string(key), value)
+    header = struct.pack(_HEADER, MAGIC, VERSION, len(programs), base + len(records))
+    out = bytearray(header)
+    for e in index:
+        out += struct.pack(_INDEX, *e)
+    return bytes(out + records + strings)
+
+
+def open_bundle(filename: str) -> Bundle:
+    """Bundle from a file, mapped rather than read where possible"""
+    with open(filename, 'rb') as fobj:
+        try:
+            import mmap
+        except ImportError:
+            return Bundle(fobj.read())  # micropython
+        return Bundle(mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ))
+
+#--#
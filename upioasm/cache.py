@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+
+from binascii import hexlify
+
+from . import __version__
+from .program import PIOProgram
+
+
+def _pack(p: PIOProgram) -> dict:
+    return {
+        'name': p.name,
+        'pio_version': p.pio_version,
+        'opcodes': list(p.get_opcodes()),
+        'relocs': p.get_relocs(),
+        'defines': p.get_defines(),
+        'labels': p.get_labels(),
+        'wrap': list(p.get_wrap()),
+        'origin': p.get_origin(),
+        'side_set': list(p.get_side_set()),
+    }
+
+
+def _unpack(d: dict) -> PIOProgram:
+    p = PIOProgram(d['name'], pio_version=d['pio_version'])
+    p.set_opcodes(d['opcodes'], d['relocs'])
+    p.set_defines(d['defines'])
+    p.set_labels(d['labels'])
+    p.set_wrap(*d['wrap'])
+    p.origin(d['origin'])
+    p.side_set(*d['side_set'])
+    return p
+
+
+class ProgramCache:
+    """ProgramCache - assembled programs keyed by their source
+
+    The key is a hash of the source text, the pio_version and the
+    upioasm version, so a stale entry is never hit, just evicted.
+
+    Entries are only written by `store`, a hit never writes (to
+    spare the flash) so eviction is oldest-stored first.
+
+    This class keeps up to `max_entries` in memory, DirCache and
+    FileCache keep them in flash.
+    """
+
+    def __init__(self, max_entries: int=8):
+        self._max_entries = max_entries
+        self._entries: list[list] = [ ]  # [ key, entry ], newest first
+        return
+
+    def key(self, source: str, pio_version: str) -> str:
+        h = hashlib.sha256()
+        for s in ( __version__, pio_version, source ):
+            h.update(s.encode())
+            h.update(b'\0')
+        return hexlify(h.digest()).decode()
+
+    def load(self, key: str) -> list[PIOProgram]|None:
+        """Programs stored under `key`, or None on a miss"""
+        entry = self._read(key)
+        if entry is None:
+            return None
+        try:
+            return [ _unpack(d) for d in entry ]
+        except (KeyError, TypeError, ValueError):
+            # Corrupt or from an older format.
+            self._drop(key)
+            return None
+
+    def store(self, key: str, programs: list[PIOProgram]):
+        self._write(key, [ _pack(p) for p in programs ])
+
+    def _read(self, key: str) -> list|None:
+        for k, entry in self._entries:
+            if k == key:
+                return entry
+        return None
+
+    def _write(self, key: str, entry: list):
+        self._drop(key)
+        self._entries.insert(0, [ key, entry ])
+        del self._entries[self._max_entries:]
+
+    def _drop(self, key: str):
+        self._entries = [ e for e in self._entries if e[0] != key ]
+
+
+class DirCache(ProgramCache):
+    """DirCache - one json file per entry in a directory
+
+    An index file keeps the entry keys and sizes, newest first.
+    """
+
+    def __init__(self, path: str, max_entries: int=64, max_bytes: int=1<<20):
+        self._path = path
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass  # Exists
+        return
+
+    def _file(self, name: str) -> str:
+        return self._path + '/' + name + '.json'
+
+    def _load_index(self) -> list:
+        try:
+            with open(self._file('index')) as fobj:
+                return json.load(fobj)
+        except (OSError, ValueError):
+            return [ ]
+
+    def _save_index(self, index: list):
+        total = 0
+        for n, (k, size) in enumerate(index):
+            total += size
+            if n >= self._max_entries or total > self._max_bytes:
+                for k, size in index[n:]:
+                    self._remove(k)
+                del index[n:]
+                break
+        fn = self._file('index')
+        with open(fn + '.tmp', 'w') as fobj:
+            json.dump(index, fobj)
+        os.rename(fn + '.tmp', fn)
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def _read(self, key: str) -> list|None:
+        try:
+            with open(self._file(key)) as fobj:
+                return json.load(fobj)
+        except OSError:
+            return None
+        except ValueError:
+            self._drop(key)
+            return None
+
+    def _write(self, key: str, entry: list):
+        data = json.dumps(entry)
+        fn = self._file(key)
+        with open(fn + '.tmp', 'w') as fobj:
+            fobj.write(data)
+        os.rename(fn + '.tmp', fn)
+        index = [ e for e in self._load_index() if e[0] != key ]
+        index.insert(0, [ key, len(data) ])
+        self._save_index(index)
+
+    def _drop(self, key: str):
+        self._remove(key)
+        self._save_index([ e for e in self._load_index() if e[0] != key ])
+
+
+class FileCache(ProgramCache):
+    """FileCache - all entries in a single small json file
+
+    Intended for micropython, where a directory of files costs
+    flash blocks.  Entries are kept newest first.
+    """
+
+    def __init__(self, path: str, max_entries: int=4, max_bytes: int=8192):
+        self._path = path
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        return
+
+    def _load_all(self) -> list:
+        try:
+            with open(self._path) as fobj:
+                return json.load(fobj)
+        except (OSError, ValueError):
+            return [ ]
+
+    def _save_all(self, entries: list):
+        data = json.dumps(entries)
+        while len(entries) > 1 and (len(entries) > self._max_entries
+                                    or len(data) > self._max_bytes):
+            entries.pop(-1)
+            data = json.dumps(entries)
+        with open(self._path + '.tmp', 'w') as fobj:
+            fobj.write(data)
+        os.rename(self._path + '.tmp', self._path)
+
+    def _read(self, key: str) -> list|None:
+        for k, entry in self._load_all():
+            if k == key:
+                return entry
+        return None
+
+    def _write(self, key: str, entry: list):
+        entries = [ e for e in self._load_all() if e[0] != key ]
+        entries.insert(0, [ key, entry ])
+        self._save_all(entries)
+
+    def _drop(self, key: str):
+        self._save_all([ e for e in self._load_all() if e[0] != key ])
+
+#--#
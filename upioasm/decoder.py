@@ -0,0 +1,145 @@
+from typing import TYPE_CHECKING
+
+from . import opcodes
+from .emitter import InstructionVisitor
+from .error import PIOSyntaxError
+
+if TYPE_CHECKING:
+    from .program import PIOProgram
+
+
+def _names(tab: dict[str, int], shift: int=5, size: int=8) -> list:
+    # Invert an opcodes table, field value => name (None if reserved)
+    names: list = [ None ] * size
+    for name, value in tab.items():
+        i = value >> shift
+        if names[i] is None:
+            names[i] = name  # First wins, '' before 'always'
+    return names
+
+_JMP_COND = _names(opcodes.jmp_cond)
+_WAIT_SOURCE = _names(opcodes.wait_source)
+_IN_SOURCE = _names(opcodes.in_source)
+_OUT_DEST = _names(opcodes.out_dest)
+_MOV_DEST = _names(opcodes.mov_dest)
+_MOV_SOURCE = _names(opcodes.mov_source, 0, 32)
+_SET_DEST = _names(opcodes.set_dest)
+_MOV_OPS = ( '', '~', '::' )
+
+
+class PIODecoder:
+    """PIODecoder - opcodes back to InstructionVisitor calls
+
+    The reverse of PIOEmitter, taking the same side-set arguments:
+
+        PIODecoder(2, True).decode(codes, PrintVisitor())
+
+    Fields are split with shifts and looked up in tables inverted
+    from `opcodes`, and the delay/side-set field is split by a 32
+    entry table built here.  `mov y, y` comes back as nop().  With
+    side_en, side-set bits without the enable bit are dropped.
+    """
+
+    def __init__(self, sideset_count: int=0, side_en: bool=False):
+        if (sideset_count < 0
+            or sideset_count > 5
+            or side_en and sideset_count < 2
+        ):
+            raise PIOSyntaxError('invalid side-set count / en')
+        nd = 5 - sideset_count
+        # delay/side field => ( side or -1, delay )
+        self._ds: list[tuple[int, int]] = [ ]
+        for ds in range(32):
+            side = ds >> nd if sideset_count else -1
+            if side_en:
+                en = 1 << (sideset_count - 1)
+                side = (side & (en - 1)) if side & en else -1
+            self._ds.append(( side, ds & ((1 << nd) - 1) ))
+        self._ops = (
+            self._jmp, self._wait, self._in, self._out,
+            self._push_pull, self._mov, self._irq, self._set,
+        )
+        return
+
+    def decode(self, codes, v: InstructionVisitor) -> InstructionVisitor:
+        """Visit each of `codes`, an array('H'), list or little-endian bytes"""
+        if isinstance(codes, (bytes, bytearray, memoryview)):
+            b = bytes(codes)
+            if len(b) & 1:
+                raise PIOSyntaxError(f'odd opcode byte count {len(b)}')
+            codes = [ b[i] | (b[i + 1] << 8) for i in range(0, len(b), 2) ]
+        ops = self._ops
+        ds = self._ds
+        for code in codes:
+            ops[code >> 13](v, code)
+            side, delay = ds[(code >> 8) & 0x1f]
+            # Same order as Instruction.visit
+            if delay:
+                v.delay(delay)
+            if side >= 0:
+                v.side(side)
+        return v
+
+    def _bad(self, code: int):
+        raise PIOSyntaxError(f'invalid opcode 0x{code:04x}')
+
+    def _jmp(self, v: InstructionVisitor, code: int):
+        v.jmp(_JMP_COND[(code >> 5) & 7], code & 0x1f)
+
+    def _wait(self, v: InstructionVisitor, code: int):
+        source = _WAIT_SOURCE[(code >> 5) & 3]
+        if source is None:
+            self._bad(code)
+        index = code & 0x1f
+        if source == 'irq':
+            v.wait((code >> 7) & 1, source, index & 0x0f, rel=bool(index & 0x10))
+        else:
+            v.wait((code >> 7) & 1, source, index)
+
+    def _in(self, v: InstructionVisitor, code: int):
+        source = _IN_SOURCE[(code >> 5) & 7]
+        if source is None:
+            self._bad(code)
+        v.in_(source, (code & 0x1f) or 32)
+
+    def _out(self, v: InstructionVisitor, code: int):
+        v.out(_OUT_DEST[(code >> 5) & 7], (code & 0x1f) or 32)
+
+    def _push_pull(self, v: InstructionVisitor, code: int):
+        if code & 0x1f:
+            self._bad(code)
+        if code & 0x80:
+            v.pull(ifempty=bool(code & opcodes.pull_ife), block=bool(code & opcodes.pull_blk))
+        else:
+            v.push(iffull=bool(code & opcodes.push_iff), block=bool(code & opcodes.push_blk))
+
+    def _mov(self, v: InstructionVisitor, code: int):
+        dest = _MOV_DEST[(code >> 5) & 7]
+        source = _MOV_SOURCE[code & 0x1f]
+        if dest is None or source is None:
+            self._bad(code)
+        op = (code >> 3) & 3
+        if dest == 'y' and source == 'y':
+            v.nop()
+        else:
+            v.mov(dest, _MOV_OPS[op], source[len(_MOV_OPS[op]):])
+
+    def _irq(self, v: InstructionVisitor, code: int):
+        if code & 0x80:
+            self._bad(code)
+        v.irq(code & 0x0f, rel=bool(code & 0x10),
+              clear=bool(code & opcodes.irq_clr), wait=bool(code & opcodes.irq_wait))
+
+    def _set(self, v: InstructionVisitor, code: int):
+        dest = _SET_DEST[(code >> 5) & 7]
+        if dest is None:
+            self._bad(code)
+        v.set(dest, code & 0x1f)
+
+
+def disassemble(program: 'PIOProgram', v: InstructionVisitor) -> InstructionVisitor:
+    """Visit the opcodes of `program` with its side-set config"""
+    count, opt, pindirs = program.get_side_set()
+    return PIODecoder(count + opt, opt).decode(program.get_opcodes(), v)
+
+#--#
@@ -1,57 +1,111 @@
-from typing import TYPE_CHECKING
+from typing import Iterator
 
 from .error import PIOSyntaxError
 
 
 class Defines:
-    def __init__(self) -> None:
-        self._tab: list[tuple[str, int|None, bool]] = [ ]
+    """Defines - symbol table, optionally chained to a parent scope
+
+    Lookups are by dict, first in this scope and then up the chain
+    (only public entries when the scope was made by `copy(True)`).
+    Resolved values from parent scopes are cached in the child,
+    which is safe because a value can only be assigned once.
+    """
+
+    def __init__(self, parent: 'Defines|None'=None, public: bool=False) -> None:
+        # key => ( value, public )
+        self._tab: dict[str, tuple[int|None, bool]] = { }
+        self._parent = parent
+        self._public = public
+        self._npublic = 0
+        self._resolved: dict[str, int] = { }
 
     def __len__(self):
-        return len(self._tab)
+        n = len(self._tab)
+        p = self._parent
+        if p is not None:
+            n += p._count_public() if self._public else len(p)
+        return n
 
     def __contains__(self, key: str):
-        for e in self._tab:
-            if e[0] == key:
-                return True
-        return False
+        return self._lookup(key) is not None
+
+    def _count_public(self) -> int:
+        n = self._npublic
+        if self._parent is not None:
+            n += self._parent._count_public()
+        return n
+
+    def _lookup(self, key: str) -> tuple[int|None, bool]|None:
+        e = self._tab.get(key)
+        if e is not None:
+            return e
+        p = self._parent
+        if p is None:
+            return None
+        e = p._lookup(key)
+        if e is None or (self._public and not e[1]):
+            return None
+        return e
+
+    def items(self) -> Iterator[tuple[str, int|None, bool]]:
+        """( key, value, public ) for all visible entries"""
+        p = self._parent
+        if p is not None:
+            for e in p.items():
+                if (not self._public or e[2]) and e[0] not in self._tab:
+                    yield e
+        for key, (value, public) in self._tab.items():
+            yield key, value, public
 
     def define(self, key: str, value: int, public: bool):
         if key in self:
             raise PIOSyntaxError('already defined')
-        self._tab.append(( key, value, public ))
+        self._tab[key] = ( value, public )
+        self._npublic += public
         return
 
     def assign(self, key: str, value: int):
-        for i, e in enumerate(self._tab):
-            if e[0] == key:
-                if e[1] is not None:
-                    raise PIOSyntaxError('already assigned')
-                self._tab[i] = ( e[0], value, e[2] )
-                return
-        raise PIOSyntaxError('not declared')
+        e = self._tab.get(key)
+        if e is None:
+            raise PIOSyntaxError('not declared')
+        if e[0] is not None:
+            raise PIOSyntaxError('already assigned')
+        self._tab[key] = ( value, e[1] )
+        return
+
+    def reassign(self, key: str, value: int):
+        """Move an assigned value in this scope, for the optimizer"""
+        e = self._tab.get(key)
+        if e is None or e[0] is None:
+            raise PIOSyntaxError('not assigned')
+        self._tab[key] = ( value, e[1] )
+        return
 
     def declare(self, key: str, public: bool):
         if key in self:
             raise PIOSyntaxError('already defined')
-        self._tab.append(( key, None, public ))
+        self._tab[key] = ( None, public )
+        self._npublic += public
         return
 
     def resolve(self, key: str) -> int:
-        for e in self._tab:
-            if e[0] == key:
-                if e[1] is None:
-                    raise PIOSyntaxError('value not assigned')
-                return e[1]
-        raise PIOSyntaxError('not defined')
+        e = self._tab.get(key)
+        if e is not None and e[0] is not None:
+            return e[0]
+        value = self._resolved.get(key)
+        if value is not None:
+            return value
+        e = self._lookup(key)
+        if e is None:
+            raise PIOSyntaxError('not defined')
+        if e[0] is None:
+            raise PIOSyntaxError('value not assigned')
+        self._resolved[key] = e[0]
+        return e[0]
 
     def copy(self, public: bool):
-        c = Defines()
-        for e in self._tab:
-            if not public or e[2]:
-                if e[1] is None:
-                    raise PIOSyntaxError('value not assigned')
-                c._tab.append(e)
-        return c
+        """New child scope, sees only public entries if `public`"""
+        return Defines(self, public)
 
 #--#
@@ -48,6 +48,9 @@ class PIOEmitter(InstructionVisitor):
         ):
             raise PIOSyntaxError('invalid side-set count / en')
         self._side_en = int(bool(side_en))
+        # Side-set takes the MSBs of the delay/side field
+        self._side_shift = 8 + self._delay_count
+        self._side_bit = (16 >> self._delay_count) if side_en else 0
         return
 
     def _resolve_value(self, value: Value, where: str) -> int:
@@ -79,13 +82,6 @@ class PIOEmitter(InstructionVisitor):
             raise PIOSyntaxError(where + ": must be in range -32768..65535")
         return value & 0xffff
 
-    def _emit(self, op, *other):
-        code = op
-        for o in other:
-            code |= o
-        self._out.append(code)
-        return self
-
     def _get(self, tab, key, where):
         val = tab.get(key)
         if val is None:
@@ -98,19 +94,16 @@ class PIOEmitter(InstructionVisitor):
     def side(self, side: Value):
         """add a side-set value to the last instruction"""
         ss = self._resolve_value(side, 'side-set')
-        if not (0 < ss < (1 << (self._sideset_count + self._side_en))):
+        if not (0 <= ss < (1 << (self._sideset_count - self._side_en))):
             raise PIOSyntaxError('side-set count exceeded')
-        if self._side_en:
-            ss |= (16 >> self._delay_count)
-        self._out[-1] |= (ss << 8)
+        self._out[-1] |= (ss | self._side_bit) << self._side_shift
         return self
 
     def delay(self, delay: Value):
         """add a delay to the last instruction"""
         nd = self._check_5_bits(delay, 'delay')
-        if not (0 < nd < (1 << self._delay_count)):
+        if not (0 <= nd < (1 << self._delay_count)):
             raise PIOSyntaxError('delay count exceeded')
-        nd <<= self._sideset_count
         self._out[-1] |= (nd << 8)
         return self
 
@@ -121,11 +114,11 @@ class PIOEmitter(InstructionVisitor):
         <addr> = target address 0..31
         """
         # 0b000 delay/side:5 cond:3 addr:5
-        return self._emit(
-            opcodes.op_jmp,
-            self._get(opcodes.jmp_cond, cond, '<cond>'),
-            self._check_5_bits(addr, '<addr>'),
+        self._out.append(
+            self._get(opcodes.jmp_base, cond, '<cond>')
+            | self._check_5_bits(addr, '<addr>')
         )
+        return self
 
     def wait(self, pol: Value, source: str, index: Value, *, rel=False):
         """wait <pol> <source> <index> (rel)
@@ -136,12 +129,13 @@ class PIOEmitter(InstructionVisitor):
         rel = True when <source>=irq and add SM index to <index>
         """
         # 0b001 delay/side:5 pol:1 source:2 index:5
-        return self._emit(
-            opcodes.op_wait,
-            self._check_1_bit(pol, '<pol>') << 7,
-            self._get(opcodes.wait_source, source, '<source>'),
-            self._check_5_bits(index, '<index>'),
+        self._out.append(
+            self._get(opcodes.wait_base, source, '<source>')
+            | self._check_1_bit(pol, '<pol>') << 7
+            | self._check_5_bits(index, '<index>')
+            | (0x10 if rel else 0)
         )
+        return self
 
     def in_(self, source: str, count: Value):
         """in <source> <bit-count>
@@ -150,11 +144,11 @@ class PIOEmitter(InstructionVisitor):
         <count> = number of bits, 1..32
         """
 	# 0b010 delay/side:5 src:3 nbits:5
-        return self._emit(
-            opcodes.op_in,
-            self._get(opcodes.in_source, source, '<source>'),
-            self._check_pin_count(count, '<count>'),
+        self._out.append(
+            self._get(opcodes.in_base, source, '<source>')
+            | self._check_pin_count(count, '<count>')
         )
+        return self
 
     def out(self, dest: str, count: Value):
         """out <dest> <count>
@@ -163,11 +157,11 @@ class PIOEmitter(InstructionVisitor):
         <count> = number of bits, 1..32
         """
 	# 0b011 delay/side:5 dst:3 nbits:5
-        return self._emit(
-            opcodes.op_out,
-            self._get(opcodes.out_dest, dest, '<dest>'),
-            self._check_pin_count(count, '<count>'),
+        self._out.append(
+            self._get(opcodes.out_base, dest, '<dest>')
+            | self._check_pin_count(count, '<count>')
         )
+        return self
 
     def push(self, *, iffull: bool=False, block: bool=True):
         """push (iffull) (block|noblock)
@@ -176,11 +170,12 @@ class PIOEmitter(InstructionVisitor):
         block = True for `push (iffull) (block)`
         """
 	# 0b100 delay/side:5 0b0 ifF:1 Blk:1 0b00000
-        return self._emit(
-            opcodes.op_push,
-            opcodes.push_iff if iffull else 0,
-            opcodes.push_blk if block else 0,
+        self._out.append(
+            opcodes.op_push
+            | (opcodes.push_iff if iffull else 0)
+            | (opcodes.push_blk if block else 0)
         )
+        return self
 
     def pull(self, *, ifempty: bool=False, block: bool=True):
         """pull (ifempty) (block|noblock)
@@ -189,11 +184,12 @@ class PIOEmitter(InstructionVisitor):
         block = True for `pull (ifempty) (block)`
         """
 	# 0b100 delay/side:5 0b1 ifE:1 Blk:1 0b00000
-        return self._emit(
-            opcodes.op_pull,
-            opcodes.pull_ife if ifempty else 0,
-            opcodes.pull_blk if block else 0,
+        self._out.append(
+            opcodes.op_pull
+            | (opcodes.pull_ife if ifempty else 0)
+            | (opcodes.pull_blk if block else 0)
         )
+        return self
 
     def mov(self, dest: str, op: str, source: str=''):
         """mov <dest>, (<op>) <src>
@@ -206,11 +202,10 @@ class PIOEmitter(InstructionVisitor):
         """
 	# 0b101 delay/side:5 dst:3 op:2 src:3
         src = (op + source) if (op and source) else (op or source)
-        return self._emit(
-            opcodes.op_mov,
-            self._get(opcodes.mov_dest, dest, '<dest>'),
-            self._get(opcodes.mov_source, src, '<source>'),
+        self._out.append(
+            self._get(self._get(opcodes.mov_base, dest, '<dest>'), src, '<source>')
         )
+        return self
 
     def irq(self, irq_num: Value, *, rel=False, clear=False, wait=False):
         """irq (-|set|nowait)|wait|clear <irq_num> (rel)
@@ -223,13 +218,14 @@ class PIOEmitter(InstructionVisitor):
         # clear=0 wait=1 => irq wait
         # clear=1 wait=? => irq clear
 	# 0b110 delay/side:5 0b0 Clr:1 Wait:1 index:5
-        return self._emit(
-            opcodes.op_irq,
-            opcodes.irq_clr if clear else 0,
-            opcodes.irq_wait if wait else 0,
-            0x10 if rel else 0,
-            self._check_5_bits(irq_num, '<irq_num>'),  # 3 bits?
+        self._out.append(
+            opcodes.op_irq
+            | (opcodes.irq_clr if clear else 0)
+            | (opcodes.irq_wait if wait else 0)
+            | (0x10 if rel else 0)
+            | self._check_5_bits(irq_num, '<irq_num>')  # 3 bits?
         )
+        return self
 
     def set(self, dest: str, data: Value):
         """set <dest>, <data>
@@ -238,14 +234,83 @@ class PIOEmitter(InstructionVisitor):
         <data> = 5 bits
         """
 	# 0b111 delay/side:5 dst:3 data:5
-        return self._emit(
-            opcodes.op_set,
-            self._get(opcodes.set_dest, dest, '<dest>'),
-            self._check_5_bits(data, '<data>'),
+        self._out.append(
+            self._get(opcodes.set_base, dest, '<dest>')
+            | self._check_5_bits(data, '<data>')
         )
+        return self
 
     def nop(self):
         """nop ;; mov y, y"""
-        return self.mov('y', 'y')
+        self._out.append(_NOP)
+        return self
+
+
+class TrustedEmitter(PIOEmitter):
+    """TrustedEmitter - PIOEmitter without the checks
+
+    For calls already validated once, such as decoded opcodes or the
+    records of a program assembled before.  Names index the opcodes
+    tables straight, values are only masked to their field: a bad
+    name raises KeyError, a value out of range gives a wrong opcode.
+    Values are ints here, hence no Value annotations.
+    """
+
+    def __init__(self, sideset_count: int=0, side_en: bool=False):
+        super().__init__(sideset_count, side_en)
+        self._delay_mask = (1 << self._delay_count) - 1
+        self._side_mask = (1 << (sideset_count - self._side_en)) - 1
+        return
+
+    def side(self, side):
+        self._out[-1] |= (side & self._side_mask | self._side_bit) << self._side_shift
+        return self
+
+    def delay(self, delay):
+        self._out[-1] |= (delay & self._delay_mask) << 8
+        return self
+
+    def jmp(self, cond: str, addr):
+        self._out.append(_JMP[cond] | addr & 31)
+        return self
+
+    def wait(self, pol, source: str, index, *, rel=False):
+        self._out.append(_WAIT[source] | (pol & 1) << 7 | index & 31 | (0x10 if rel else 0))
+        return self
+
+    def in_(self, source: str, count):
+        self._out.append(_IN[source] | count & 31)
+        return self
+
+    def out(self, dest: str, count):
+        self._out.append(_OUT[dest] | count & 31)
+        return self
+
+    def mov(self, dest: str, op: str, source: str=''):
+        self._out.append(_MOV[dest][(op + source) if (op and source) else (op or source)])
+        return self
+
+    def irq(self, irq_num, *, rel=False, clear=False, wait=False):
+        self._out.append(
+            opcodes.op_irq
+            | (opcodes.irq_clr if clear else 0)
+            | (opcodes.irq_wait if wait else 0)
+            | (0x10 if rel else 0)
+            | irq_num & 31
+        )
+        return self
+
+    def set(self, dest: str, data):
+        self._out.append(_SET[dest] | data & 31)
+        return self
+
+
+_JMP = opcodes.jmp_base
+_WAIT = opcodes.wait_base
+_IN = opcodes.in_base
+_OUT = opcodes.out_base
+_MOV = opcodes.mov_base
+_SET = opcodes.set_base
+_NOP = opcodes.mov_base['y']['y']
 
 #--#
@@ -0,0 +1,107 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .program import PIOProgram
+
+
+_HEADER = '''\
+# Generated by upioasm.freeze, do not edit.
+#
+# Freeze with mpy-cross (manifest.py: module("{module}.py")), the
+# tuples and bytes below then stay in flash.
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x): return x
+'''
+
+_LOAD = '''
+
+def load(name):
+    """The PIOProgram `name`, needs upioasm.program only"""
+    from struct import unpack
+    from upioasm.program import PIOProgram
+    (opcodes, relocs, wrap_target, wrap, origin, side_set,
+     pio_version, defines, labels) = _PROGRAMS[NAMES.index(name)]
+    p = PIOProgram(name, pio_version=pio_version)
+    p.set_opcodes(unpack('<%dH' % (len(opcodes) // 2), opcodes), relocs)
+    p.set_wrap(wrap_target, wrap)
+    p.origin(origin)
+    p.side_set(*side_set)
+    p.set_defines(dict(defines))
+    p.set_labels(dict(labels))
+    return p
+'''
+
+
+def _ident(name: str) -> str:
+    s = ''.join(c if c.isalpha() or c.isdigit() or c == '_' else '_' for c in name)
+    return '_' + s if not s or s[0].isdigit() else s
+
+
+def _pairs(tab: dict[str, int]) -> str:
+    if not tab:
+        return '()'
+    return '( ' + ''.join(f'( {k!r}, {v} ), ' for k, v in tab.items()) + ')'
+
+
+def module_source(programs: 'list[PIOProgram]', module: str='pio_programs') -> str:
+    """Python source of a module holding `programs`, see write_module"""
+    out = [ _HEADER.format(module=module) ]
+    names = [ ]
+    tables = [ ]
+    seen: dict[str, str] = { }  # constant => program and key
+
+    def constant(ident: str, name: str, key: str, value: int):
+        if ident in seen:
+            # Names differing in case or punctuation
+            raise ValueError(f'{ident}: from both {seen[ident]} and {name} {key}')
+        seen[ident] = f'{name} {key}'
+        out.append(f'{ident} = const({value})')
+
+    for p in programs:
+        ident = _ident(p.name).upper()
+        out.append(f'\n# {p.name}')
+        wrap_target, wrap = p.get_wrap()
+        for key, value in ( ( 'WRAP_TARGET', wrap_target ), ( 'WRAP', wrap ) ):
+            constant(f'{ident}_{key}', p.name, key, value)
+        for key, value in p.get_defines().items():
+            constant(f'{ident}_{_ident(key).upper()}', p.name, key, value)
+        codes = p.get_opcodes()
+        raw = bytes(b for code in codes for b in ( code & 0xff, code >> 8 ))
+        names.append(p.name)
+        tables.append(
+            f'    ( {raw!r},\n'
+            f'      0x{p.get_relocs():08x}, {wrap_target}, {wrap}, {p.get_origin()},'
+            f' {p.get_side_set()!r}, {p.pio_version!r},\n'
+            f'      {_pairs(p.get_defines())},\n'
+            f'      {_pairs(p.get_labels())} ),'
+        )
+    out.append('')
+    out.append('NAMES = ( ' + ''.join(f'{n!r}, ' for n in names) + ')')
+    out.append('')
+    out.append('# ( opcodes, relocs, wrap_target, wrap, origin, side_set,')
+    out.append('#   pio_version, defines, labels ) by NAMES')
+    out.append('_PROGRAMS = (')
+    out.extend(tables)
+    out.append(')')
+    return '\n'.join(out) + '\n' + _LOAD
+
+
+def write_module(filename: str, programs: 'list[PIOProgram]'):
+    """Write `programs` as an importable module
+
+    Each program's wrap points and public defines become
+    `micropython.const` names (prefixed with the program name), the
+    opcodes a little-endian bytes literal, and `load(name)` rebuilds
+    a PIOProgram without the assembler.  ValueError when two names
+    make the same constant, `a-b` and `a_b` say.
+    """
+    module = filename.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    source = module_source(programs, module)
+    with open(filename, 'w') as fobj:
+        fobj.write(source)
+    return
+
+#--#
@@ -0,0 +1,130 @@
+from array import array
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .program import PIOProgram
+
+
+class LinkedImage:
+    """LinkedImage - instruction memory contents for one PIO block
+
+    `image` is the relocated opcodes (unused words are 0), `used`
+    a bit mask of the words taken and `offsets` the load offset
+    of each program by name.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.image = array('H', bytes(2 * size))
+        self.used = 0
+        self.offsets: dict[str, int] = { }
+        return
+
+    def offset(self, program: 'PIOProgram') -> int:
+        return self.offsets[program.name]
+
+    def wrap(self, program: 'PIOProgram') -> tuple[int, int]:
+        """Absolute ( wrap_target, wrap ) of `program`"""
+        wrap_target, wrap = program.get_wrap()
+        offset = self.offsets[program.name]
+        return wrap_target + offset, wrap + offset
+
+
+class PIOLinker:
+    """PIOLinker - place several programs in one instruction memory
+
+        lk = PIOLinker()
+        lk.add(pa['ws2812'])
+        lk.add(pa['uart_tx'])
+        image = lk.link()
+
+    Programs with the same opcodes and relocations share one copy,
+    whatever their name or wrap.  An .origin is respected, the others
+    are placed by a depth first search, largest first, over a bit
+    mask of the free words.  Failed ( program, mask ) pairs are remembered so
+    the search stays small enough to run at boot.
+    """
+
+    def __init__(self, size: int=32, used: int=0) -> None:
+        self._size = size
+        self._used = used  # Words taken by something else
+        self._programs: list[PIOProgram] = [ ]
+        return
+
+    def add(self, program: 'PIOProgram') -> None:
+        n = len(program)
+        origin = program.get_origin()
+        if not n or n > self._size or origin + n > self._size:
+            raise ValueError(f'{program.name}: does not fit')
+        for p in self._programs:
+            if p.name == program.name and p is not program:
+                raise ValueError(f'{program.name}: already added')
+        self._programs.append(program)
+        return
+
+    def link(self) -> LinkedImage:
+        """Place all the programs, ValueError if they do not fit"""
+        # ( code, origin ) => [ origin, program, names ], one per copy
+        blobs: dict[tuple, list] = { }
+        for p in self._programs:
+            code = ( bytes(p.get_opcodes()), p.get_relocs() )
+            origin = p.get_origin()
+            key = ( code, origin )
+            if origin < 0:
+                # Share a fixed copy when there is one
+                for k in blobs:
+                    if k[0] == code:
+                        key = k
+                        break
+            elif ( code, -1 ) in blobs:
+                blobs[key] = blobs.pop(( code, -1 ))
+                blobs[key][0] = origin
+            blobs.setdefault(key, [ origin, p, [ ] ])[2].append(p.name)
+
+        used = self._used
+        fixed = [ b for b in blobs.values() if b[0] >= 0 ]
+        free = [ b for b in blobs.values() if b[0] < 0 ]
+        for offset, p, names in fixed:
+            m = ((1 << len(p)) - 1) << offset
+            if used & m:
+                raise ValueError(f'{names[0]}: .origin {offset} overlaps')
+            used |= m
+        free.sort(key=lambda b: -len(b[1]))
+        where = self._place([ len(b[1]) for b in free ], used)
+        if where is None:
+            raise ValueError('programs do not fit')
+        for b, offset in zip(free, where):
+            b[0] = offset
+
+        li = LinkedImage(self._size)
+        for offset, p, names in fixed + free:
+            n = len(p)
+            li.image[offset:offset + n] = p.relocate(offset)
+            li.used |= ((1 << n) - 1) << offset
+            for name in names:
+                li.offsets[name] = offset
+        return li
+
+    def _place(self, sizes: list[int], used: int) -> list[int]|None:
+        # Offsets for `sizes` in the free words of `used`, or None
+        size = self._size
+        where = [ 0 ] * len(sizes)
+        failed: set[tuple[int, int]] = set()
+
+        def fit(k: int, used: int) -> bool:
+            if k == len(sizes):
+                return True
+            if ( k, used ) in failed:
+                return False
+            n = sizes[k]
+            m = (1 << n) - 1
+            for offset in range(size - n + 1):
+                if not used & (m << offset):
+                    where[k] = offset
+                    if fit(k + 1, used | (m << offset)):
+                        return True
+            failed.add(( k, used ))
+            return False
+
+        return where if fit(0, used) else None
+
+#--#
@@ -18,6 +18,7 @@ jmp_cond: dict[str, int]  = {
 }
 
 op_wait = const(0b001 << 13)
+wait_pol = const(1 << 7)
 wait_source: dict[str, int] = {
     'gpio': const(0b00 << 5),
     'pin': const(0b01 << 5),
@@ -47,6 +48,7 @@ out_dest: dict[str, int] = {
     'pindirs': const(0b100 << 5),
     'pc': const(0b101 << 5),
     'isr': const(0b110 << 5),
+    'exec': const(0b111 << 5),
     'osr': const(0b111 << 5),
 }
 
@@ -118,4 +120,18 @@ set_dest: dict[str, int] = {
     # 111 - reserved
 }
 
+# -- Base opcodes, op | operand fields, per mnemonic and operand names.
+# Derived from the tables above so the encoders need one lookup.
+
+jmp_base: dict[str, int] = { k: op_jmp | v for k, v in jmp_cond.items() }
+wait_base: dict[str, int] = { k: op_wait | v for k, v in wait_source.items() }
+in_base: dict[str, int] = { k: op_in | v for k, v in in_source.items() }
+out_base: dict[str, int] = { k: op_out | v for k, v in out_dest.items() }
+set_base: dict[str, int] = { k: op_set | v for k, v in set_dest.items() }
+# dest => (op)source => code
+mov_base: dict[str, dict[str, int]] = {
+    d: { s: op_mov | dv | sv for s, sv in mov_source.items() }
+    for d, dv in mov_dest.items()
+}
+
 #--#
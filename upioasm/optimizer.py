@@ -0,0 +1,206 @@
+from typing import Any, Union, TYPE_CHECKING
+
+try:
+    from micropython import const  # type: ignore[import-not-found]
+except:
+    def const(x: int): return x  # This file only.
+
+if TYPE_CHECKING:
+    from .defines import Defines
+    from .syntax import Instruction
+
+from . import syntax
+from .error import PIOSyntaxError
+
+Value = Union[str, int]
+
+
+# Passes
+FOLD_NOP = const(1)     # nop [n] into the previous instruction's delay
+JMP_NEXT = const(2)     # jmp to the next address
+JMP_WRAP = const(4)     # Trailing jmp to the loop head => .wrap
+SET_SIDE = const(8)     # set pins => side-set of the next instruction
+TIMING = const(16)      # Allow cycle timing to change
+DEFAULT = const(7)
+
+
+class PeepholeOptimizer:
+    """PeepholeOptimizer - fewer instructions, same behaviour
+
+    Runs over an assembler instruction list before encoding.  The
+    cycles of a removed instruction are added to the delay of the
+    previous one, so timing is exact, and when that is not possible
+    the instruction stays.  With TIMING an instruction is removed
+    anyway, and SET_SIDE (which moves a pin change) is allowed.
+
+    Label addresses in `pdefs` and the .wrap options are updated,
+    instructions that are labelled, jmp targets or the wrap target
+    are never removed.
+
+    SET_SIDE assumes the side-set pins are the set pins.
+    """
+
+    def __init__(self, passes: int, pdefs: 'Defines', labels: list[str],
+                 options: dict[str, Any]) -> None:
+        self._passes = passes
+        self._pdefs = pdefs
+        self._labels = labels
+        self._options = options
+        count, opt, pindirs = options.get('.side_set', ( 0, False, False ))
+        self._ss_count = count
+        self._ss_opt = opt
+        self._ss_pindirs = pindirs
+        self._max_delay = (1 << (5 - count - opt)) - 1
+        self.report: list[str] = [ ]
+        self.saved = 0
+
+    def _value(self, v: Value|None, default: int=0) -> int:
+        if v is None:
+            return default
+        return v if isinstance(v, int) else self._pdefs.resolve(str(v))
+
+    def _side(self, i: 'Instruction') -> int|None:
+        # Side-set value driven, None for no side-set
+        if not self._ss_count:
+            return None
+        if self._ss_opt:
+            return None if i._side is None else self._value(i._side)
+        return self._value(i._side)
+
+    def _falls_through(self, i: 'Instruction') -> bool:
+        if isinstance(i, syntax._jmp):
+            return False
+        if isinstance(i, ( syntax.mov, syntax.out )):
+            return i._dest._name not in ( 'pc', 'exec' )
+        return True
+
+    def _jmp_target(self, i: 'Instruction') -> int|None:
+        return self._value(i._target) if isinstance(i, syntax._jmp) else None
+
+    def _label_addrs(self) -> dict[str, int]:
+        addrs = { }
+        for name in self._labels:
+            try:
+                addrs[name] = self._pdefs.resolve(name)
+            except PIOSyntaxError:
+                pass  # Never placed, generate will complain if used
+        return addrs
+
+    def _side_ok(self, i: 'Instruction', prev: 'Instruction|None') -> bool:
+        # Can `i` go without losing a side-set?
+        if not self._ss_count:
+            return True
+        if self._ss_opt:
+            return i._side is None
+        return prev is not None and self._side(prev) == self._side(i)
+
+    def _add_delay(self, i: 'Instruction', cycles: int) -> bool:
+        delay = self._value(i._delay) + cycles
+        if delay > self._max_delay:
+            return False
+        i._delay = delay
+        return True
+
+    def run(self, ilist: 'list[Instruction]') -> 'list[Instruction]':
+        n = len(ilist)
+        opts = self._options
+        wrap = opts.get('.wrap', n) - 1
+        labels = self._label_addrs()
+        barriers = set(labels.values())
+        barriers.add(opts.get('.wrap_target', 0))
+        for i in ilist:
+            t = self._jmp_target(i)
+            if t is not None:
+                barriers.add(t)
+        passes = self._passes
+        timing = passes & TIMING
+
+        keep = [ True ] * n
+        prev = -1
+        for k, i in enumerate(ilist):
+            p = ilist[prev] if prev >= 0 else None
+            # Does the last kept instruction run right before this one?
+            follows = (p is not None and self._falls_through(p)
+                       and not prev <= wrap < k)
+            cycles = 1 + self._value(i._delay)
+            target = self._jmp_target(i)
+            what = ''
+            if passes & FOLD_NOP and isinstance(i, syntax.nop):
+                what = f'nop [{cycles - 1}]'
+            elif (passes & JMP_NEXT and isinstance(i, syntax._jmp)
+                  and target == k + 1 and k != wrap
+                  and i._cond not in ( 'x--', 'y--' )):
+                what = f'jmp {i._cond} {target}'
+            elif (passes & JMP_WRAP and isinstance(i, syntax._jmp)
+                  and i._name == 'jmp' and i._cond == 'always'
+                  and k == wrap and target is not None and target < k):
+                what = f'jmp {target} => .wrap'
+            elif passes & SET_SIDE and timing and self._set_side(ilist, k, wrap, barriers):
+                keep[k] = False
+                continue
+            if not what or not self._side_ok(i, p):
+                prev = k
+                continue
+            if p is not None and k not in barriers and follows and self._add_delay(p, cycles):
+                self.report.append(f'{k:2}: {what}, [{cycles - 1}] into {prev}')
+            elif timing and k not in barriers:
+                # Labels and jmp targets stay, removing the last
+                # instruction would send them past the end
+                self.report.append(f'{k:2}: {what}, -{cycles} cycles')
+            else:
+                prev = k
+                continue
+            keep[k] = False
+            if what.endswith('.wrap'):
+                # The previous instruction now wraps to the loop head
+                opts['.wrap'] = k
+                opts['.wrap_target'] = target
+
+        return self._compact(ilist, keep, labels)
+
+    def _set_side(self, ilist, k, wrap, barriers) -> bool:
+        # set pins, v => side v on the next instruction
+        i = ilist[k]
+        if (not isinstance(i, syntax.set) or i._dest._name != 'pins'
+                or not self._ss_opt or self._ss_pindirs
+                or k == wrap or k + 1 >= len(ilist) or k + 1 in barriers
+                or i._side is not None):
+            return False
+        v = self._value(i._data)
+        nxt = ilist[k + 1]
+        if v >= 1 << self._ss_count or nxt._side is not None:
+            return False
+        nxt._side = v
+        # The set's own cycle and delay go with it
+        cycles = 1 + self._value(i._delay)
+        self.report.append(f'{k:2}: set pins {v} => side {v} on {k + 1}, -{cycles} cycles')
+        return True
+
+    def _compact(self, ilist, keep, labels) -> 'list[Instruction]':
+        n = len(ilist)
+        # Old address => new, a removed one maps to the next kept
+        new = [ 0 ] * (n + 1)
+        count = 0
+        for k in range(n):
+            new[k] = count
+            count += keep[k]
+        new[n] = count
+        self.saved = n - count
+        if not self.saved:
+            return ilist
+        for name, addr in labels.items():
+            self._pdefs.reassign(name, new[addr])
+        out = [ ]
+        for k, i in enumerate(ilist):
+            if keep[k]:
+                if isinstance(i, syntax._jmp) and isinstance(i._target, int):
+                    i._target = new[i._target]
+                out.append(i)
+        opts = self._options
+        for key in ( '.wrap_target', '.wrap' ):
+            if key in opts:
+                opts[key] = new[opts[key]]
+        self.report.append(f'{self.saved} slots saved, {count} used')
+        return out
+
+#--#
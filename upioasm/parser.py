@@ -1,12 +1,16 @@
 from .error import PIOSyntaxError
+from . import trace
 
-from typing import Iterable, TYPE_CHECKING
+from typing import Callable, Iterable, Iterator, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from . import pioasm
+    from .trace import Tracer
 
 
 class Token:
+    __slots__ = ( 'line_no', 'col_no', 'inp' )
+
     def __init__(self, line_no, col_no, inp):
         self.line_no = line_no
         self.col_no = col_no
@@ -20,22 +24,28 @@ class Token:
 
 
 class NewlineToken(Token):
+    __slots__ = ()
     TYPE = 'Newline'
 
 class EOFToken(Token):
+    __slots__ = ()
     TYPE = 'EOF'
 
 class KeywordToken(Token):
+    __slots__ = ()
     TYPE = 'Keyword'
 
 class LabelToken(Token):
+    __slots__ = ()
     TYPE = 'Label'
 
 class SymbolToken(Token):
+    __slots__ = ()
     TYPE = 'Symbol'
 
 
 class NumberToken(Token):
+    __slots__ = ( 'value', )
     TYPE = 'Number'
 
     def __init__(self, line_no, col_no, inp):
@@ -47,9 +57,12 @@ class NumberToken(Token):
         elif n.startswith('0b'):
             base = 2
             n = n[2:]
-        if not n.isdigit():
+        try:
+            if not n.isalnum():
+                raise ValueError
+            self.value = int(n, base)
+        except ValueError:
             raise PIOSyntaxError(f'Bad number at <file>:{line_no}.{col_no}')
-        self.value = int(n, base)
 
 #--------------------------------------------------#
 
@@ -178,6 +191,221 @@ class Scanner:
         yield EOFToken(line_no, col_no, '<eof>')
 
 
+try:
+    from re import compile as _re_compile
+    # ( whitespace, newline|punct|multi-punct|identifier[:]|number|bad )
+    _TOKEN_RE = _re_compile(
+        r'([ \t]*)(\n|[()\[\].,]|[~!%^&*+\-=<>/]+'
+        r'|[A-Za-z_][A-Za-z0-9_]*:?|[0-9][A-Za-z0-9_]*|.)'
+    )
+    _TOKEN_RE.findall  # Not on micropython
+except:
+    _TOKEN_RE = None
+
+# First char of a token => 0:newline 1:punct 2:identifier 3:number
+_TOKEN_KIND: dict[str, int] = { '\n': 0 }
+for _c in '()[].,~!%^&*+-=<>/':
+    _TOKEN_KIND[_c] = 1
+for _c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz':
+    _TOKEN_KIND[_c] = 2
+for _c in '0123456789':
+    _TOKEN_KIND[_c] = 3
+
+
+class LineScanner(Scanner):
+    # Generates the same tokens as Scanner, but a line at a time.
+    #
+    # Comments are cut out with str.find, leaving a buffer of code
+    # segments ( offset, line_no, col_no ) to recover positions.  The
+    # buffer is tokenized each time it ends with a newline, with a
+    # regex on CPython or an index-based loop on micropython.
+
+    def __init__(self) -> None:
+        self.line_no = 0  # Last line read
+        self._words: dict[str, tuple] = { }
+        self._tokenize = (
+            self._tokenize_loop if _TOKEN_RE is None else self._tokenize_re
+        )
+
+    def token_reader(self, readline) -> Iterator[Token]:
+        buf = ''
+        segs: list[tuple[int, int, int]] = [ ]
+        s = 0  # 0-4 => "_/**/" as in char_reader
+        line_no = col_no = 0
+        while line := readline():
+            line_no += 1
+            self.line_no = line_no
+            n = len(line)
+            col_no = n - 1
+            pos = 0
+            if s == 1:
+                # Only when a line lacks the "\n"
+                c = line[0]
+                if c == '*':
+                    s = 2
+                elif c == '/':
+                    segs.append(( len(buf), line_no, 0 ))
+                    buf += '\n'
+                    col_no = n = 0
+                    s = 0
+                else:
+                    segs.append(( len(buf), line_no, -1 ))
+                    buf += '/' + c
+                    s = 0
+                pos = 1
+            elif s == 3:
+                s = 0 if line[0] == '/' else 2
+                pos = 1
+            while pos < n:
+                if s == 2:
+                    # Multi-line comment, ends at "*" "/" but note
+                    # the char after a "*" is never a new "*".
+                    k = line.find('*', pos)
+                    if k < 0:
+                        break
+                    if k + 1 == n:
+                        s = 3
+                    elif line[k + 1] == '/':
+                        s = 0
+                    pos = k + 2
+                    continue
+                start = pos
+                while True:
+                    k = line.find(';', pos)
+                    j = line.find('/', pos)
+                    if j < 0 or 0 <= k < j:
+                        break
+                    if j + 1 == n:
+                        s = 1
+                        break
+                    c = line[j + 1]
+                    if c == '*' or c == '/':
+                        break
+                    # Division, the char after "/" is not examined.
+                    pos = j + 2
+                    if pos >= n:
+                        j = k = -1
+                        break
+                if j < 0 or 0 <= k < j:
+                    if k < 0:
+                        # Code to end of line
+                        segs.append(( len(buf), line_no, start ))
+                        buf += line[start:]
+                        break
+                    segs.append(( len(buf), line_no, start ))
+                    buf += line[start:k] + '\n'
+                    col_no = k
+                    break
+                segs.append(( len(buf), line_no, start ))
+                buf += line[start:j]
+                if s == 1:
+                    break
+                if line[j + 1] == '*':
+                    s = 2
+                    pos = j + 2
+                    continue
+                # "//" newline at the second "/"
+                buf += ' \n'
+                col_no = j + 1
+                break
+            if buf.endswith('\n'):
+                yield from self._tokenize(buf, segs)
+                buf = ''
+                segs = [ ]
+        if s != 0:
+            raise PIOSyntaxError('Unterminated comment')
+        segs.append(( len(buf), line_no, col_no ))
+        buf += '\n'  # Easier EOF handling.
+        yield from self._tokenize(buf, segs)
+        yield EOFToken(line_no + 1, 0, '<eof>')
+
+    def _position(self, segs: list[tuple[int, int, int]], i: int):
+        # Line and column of buffer offset `i`
+        for ofs, line_no, col_no in reversed(segs):
+            if ofs <= i:
+                return line_no, col_no + i - ofs
+        return segs[0][1], segs[0][2] + i
+
+    def _tokenize_re(self, buf: str, segs: list[tuple[int, int, int]]):
+        if not buf.isascii():
+            yield from self._tokenize_loop(buf, segs)
+            return
+        words = self._words
+        ofs, line_no, col0 = segs[0]
+        simple = len(segs) == 1
+        i = 0
+        for ws, tok in _TOKEN_RE.findall(buf):
+            i += len(ws)
+            if simple:
+                col_no = col0 + i
+            else:
+                line_no, col_no = self._position(segs, i)
+            i += len(tok)
+            k = _TOKEN_KIND.get(tok[0])
+            if k == 2:
+                if tok[-1] == ':':
+                    yield LabelToken(line_no, col_no, tok[:-1])
+                    continue
+                if (cw := words.get(tok)) is None:
+                    cw = words[tok] = self._word(tok)
+                yield cw[0](line_no, col_no, cw[1])
+            elif k == 1:
+                yield KeywordToken(line_no, col_no, tok)
+            elif k == 0:
+                yield NewlineToken(line_no, col_no, '\\n')
+            elif k == 3:
+                yield NumberToken(line_no, col_no, tok.lower())
+            else:
+                raise PIOSyntaxError(f'Bad input at <file>:{line_no}.{col_no}')
+
+    def _word(self, w: str):
+        # 3.3.6 NOTE "pioasm instruction names, keywords and
+        # directives are case insensitive"
+        if is_reserved(lc := w.lower()):
+            return KeywordToken, lc
+        return SymbolToken, w
+
+    def _tokenize_loop(self, buf: str, segs: list[tuple[int, int, int]]):
+        PCHARS = '~!%^&*+-=<>/'
+        n = len(buf)
+        i = 0
+        while i < n:
+            c = buf[i]
+            if c == ' ' or c == '\t':
+                i += 1
+                continue
+            a = i
+            i += 1
+            line_no, col_no = self._position(segs, a)
+            if c == '\n':
+                yield NewlineToken(line_no, col_no, '\\n')
+            elif c in '()[].,':
+                yield KeywordToken(line_no, col_no, c)
+            elif c in PCHARS:
+                while i < n and buf[i] in PCHARS:
+                    i += 1
+                yield KeywordToken(line_no, col_no, buf[a:i])
+            elif c.isalpha() or c == '_':
+                while i < n and ((c := buf[i]).isalpha() or c.isdigit()
+                                 or c == '_'):
+                    i += 1
+                w = buf[a:i]
+                if i < n and buf[i] == ':':
+                    i += 1
+                    yield LabelToken(line_no, col_no, w)
+                elif is_reserved(lc := w.lower()):
+                    yield KeywordToken(line_no, col_no, lc)
+                else:
+                    yield SymbolToken(line_no, col_no, w)
+            elif c.isdigit():
+                while i < n and ((c := buf[i]).isalpha() or c.isdigit()
+                                 or c == '_'):
+                    i += 1
+                yield NumberToken(line_no, col_no, buf[a:i].lower())
+            else:
+                raise PIOSyntaxError(f'Bad input at <file>:{line_no}.{col_no}')
+
+
 RESERVED_TAB: list[str] = (
     # Must be sorted by alpha
     'auto',
@@ -208,6 +436,7 @@ RESERVED_TAB: list[str] = (
     'opt',
     'origin',
     'osr',
+    'osre',
     'out',
     'pc',
     'pin',
@@ -279,18 +508,150 @@ class Prec:
 class Expr:
     """Parsed expression"""
 
+    def evaluate(self, resolve: Callable[[str], int]) -> int:
+        """The value, `resolve` maps a symbol to its value"""
+        raise PIOSyntaxError(f'Cannot evaluate {self}')
+
 
 class Stmt:
     """Parsed statement"""
 
 
+# Statement records, yielded by PIOParser.parse.  Operand values are
+# an int, a symbol (str) or an Expr to evaluate once defines are known.
+
+class Record:
+    __slots__ = ( 'line_no', 'col_no' )
+
+    def __init__(self, token: Token):
+        self.line_no = token.line_no
+        self.col_no = token.col_no
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self} at {self.line_no}.{self.col_no}>'
+
+
+class DirectiveRecord(Record):
+    """.<name> args, e.g. .define => ( name, value, public )"""
+    __slots__ = ( 'name', 'args' )
+
+    def __init__(self, token: Token, name: str, *args):
+        super().__init__(token)
+        self.name = name
+        self.args = args
+
+    def __str__(self):
+        name, args = self.name, self.args
+        if name == 'define':
+            return f'.define{" public" if args[2] else ""} {args[0]} {args[1]}'
+        if name == 'side_set':
+            return (f'.side_set {args[0]}'
+                    + f'{" opt" if args[1] else ""}{" pindirs" if args[2] else ""}')
+        if name == 'lang_opt':
+            return f'.lang_opt {args[0]} {args[1]} = {args[2]}'
+        return ' '.join([ '.' + name ] + [ str(a) for a in args ])
+
+
+class LabelRecord(Record):
+    __slots__ = ( 'name', 'public' )
+
+    def __init__(self, token: Token, name: str, public: bool=False):
+        super().__init__(token)
+        self.name = name
+        self.public = public
+
+    def __str__(self):
+        return f'{"public " if self.public else ""}{self.name}:'
+
+
+class InstructionRecord(Record):
+    """An instruction as InstructionVisitor arguments
+
+    `visit(v)` calls `v.<op>(*args, **kwargs)` then the delay and
+    side-set, as syntax.Instruction.visit does.
+    """
+    __slots__ = ( 'op', 'args', 'kwargs', 'side', 'delay', 'irq_pn' )
+
+    def __init__(self, token: Token, op: str, *args, **kwargs):
+        super().__init__(token)
+        self.op = op
+        self.args = args
+        self.kwargs = kwargs
+        self.side: 'int|str|Expr|None' = None
+        self.delay: 'int|str|Expr|None' = None
+        self.irq_pn = ''  # rp2350 prev/next, not encoded yet
+
+    def visit(self, v):
+        if self.irq_pn:
+            raise PIOSyntaxError(f'{self.op} {self.irq_pn} not supported'
+                                 f' at {self.line_no}.{self.col_no}')
+        getattr(v, self.op)(*self.args, **self.kwargs)
+        if self.delay is not None:
+            v.delay(self.delay)
+        if self.side is not None:
+            v.side(self.side)
+        return v
+
+    def __str__(self):
+        op, args, kw = self.op, self.args, self.kwargs
+        if op == 'jmp':
+            s = f'jmp {args[0] + ", " if args[0] else ""}{args[1]}'
+        elif op == 'wait':
+            pn = f' {self.irq_pn}' if self.irq_pn else ''
+            s = f'wait {args[0]} {args[1]}{pn}, {args[2]}{" rel" if kw["rel"] else ""}'
+        elif op in ( 'in_', 'out', 'set' ):
+            s = f'{op.rstrip("_")} {args[0]}, {args[1]}'
+        elif op in ( 'push', 'pull' ):
+            s = (op + (' iffull' if kw.get('iffull') else '')
+                 + (' ifempty' if kw.get('ifempty') else '')
+                 + ('' if kw['block'] else ' noblock'))
+        elif op == 'mov':
+            s = f'mov {args[0]}, {args[1]}{args[2]}'
+        elif op == 'irq':
+            pn = f'{self.irq_pn} ' if self.irq_pn else ''
+            action = 'clear' if kw['clear'] else 'wait' if kw['wait'] else 'set'
+            s = f'irq {pn}{action} {args[0]}{" rel" if kw["rel"] else ""}'
+        else:
+            s = op
+        if self.side is not None:
+            s += f' side {self.side}'
+        if self.delay is not None:
+            s += f' [{self.delay}]'
+        return s
+
+
+class _Symbolic(Exception):
+    pass
+
+def _no_symbols(s: str) -> int:
+    raise _Symbolic(s)
+
+def _value(x) -> 'int|str|Expr':
+    # Token or Expr => int, symbol or, when it uses symbols, Expr
+    if isinstance(x, NumberToken):
+        return x.value
+    if isinstance(x, Token):
+        return x.inp
+    if isinstance(x, ( NumberExpr, SymbolExpr, ParenExpr )):
+        return x.value()
+    try:
+        return x.evaluate(_no_symbols)
+    except _Symbolic:
+        return x
+
+
 class PIOParser:
-    def __init__(self):
+    def __init__(self, pioasm: 'pioasm|None'=None, tracer: 'Tracer|None'=None):
+        self._pioasm = pioasm
+        if tracer is None:
+            tracer = trace.Tracer() if pioasm is None else pioasm.tracer()
+        self._trace = tracer
         self._previous: Optional[Token] = None
         self._current: Optional[Token] = None
+        self._scanner: Optional[LineScanner] = None
         self._reader: Optional[Iterator[Token]] = None
         self._exprs: list[Expr] = [ ]
-        self._stmts: list[Stmt] = [ ]
+        self._stmts: list[Record] = [ ]
         return
 
     def next_token(self):
@@ -308,14 +669,22 @@ class PIOParser:
         return self._previous
 
     @property
-    def current(self) -> Token:
+    def current(self) -> 'Token|None':
         """The "current" or next unhandled token
 
         Often used by parsing function as a lookahead.  See also the
-        consume methods.
+        consume methods.  None before the first token, or when the
+        scanner failed.
         """
         return self._current
 
+    @property
+    def line_no(self) -> int:
+        """Line of the current token, else the last line scanned"""
+        if self._current is not None:
+            return self._current.line_no
+        return 0 if self._scanner is None else self._scanner.line_no
+
     def advance(self):
         """Pull the next unhandled token to current
 
@@ -324,10 +693,13 @@ class PIOParser:
         consume methods.
         """
         self._previous = self._current
-        # Maybe loop until non-error
+        # None while scanning, should it fail
+        self._current = None
         self._current = self.next_token()
         # Error? => report...
-        print(f'  Advance ==> {self._previous} . {self._current}')
+        tr = self._trace
+        if tr.flags & trace.PARSE:
+            tr(f'  Advance ==> {self._previous} . {self._current}')
         return
 
     def consume_cls(self, token_cls, error=''):
@@ -335,7 +707,8 @@ class PIOParser:
         # exception if required by error.  Returns the token if
         # matched, otherwise None.
         if isinstance(self.current, token_cls):
-            print('Consuming the', token_cls)
+            if self._trace.flags & trace.PARSE:
+                self._trace(f'Consuming the {token_cls}')
             c = self.current
             self.advance()
             return c
@@ -349,7 +722,8 @@ class PIOParser:
         # exception if required by error.  Returns True iff matched.
         c = self.current
         if isinstance(c, KeywordToken) and c.inp == keyword:
-            print('Consuming the', keyword)
+            if self._trace.flags & trace.PARSE:
+                self._trace(f'Consuming the {keyword}')
             self.advance()
             return True
         elif error:
@@ -368,8 +742,11 @@ class PIOParser:
 
         # Move unhandled current to previous, and then handle it.
         self.advance()
+        tr = self._trace
+        pratt = tr.flags & trace.PRATT
         previous_rule = get_rule(self.previous, True)
-        print('Got prev rule=', previous_rule)
+        if pratt:
+            tr(f'Got prev rule= {previous_rule}')
         prefix_fn = previous_rule[1]
         if prefix_fn is None:
             raise PIOSyntaxError('Not a prefix operator')
@@ -377,11 +754,12 @@ class PIOParser:
         # Note for a true prefix operator, additional parsing will
         # occur leaving current at the next unhandled token.  For
         # literals, current remains at the next uhandled token.
-        before = f'{self.previous} . {self.current}'
+        if pratt:
+            before = f'{self.previous} . {self.current}'
         prefix_fn(self)
-        after = f'{self.previous} . {self.current}'
-
-        print(f'Update by prefix-fn {before} ==> {after}')
+        if pratt:
+            after = f'{self.previous} . {self.current}'
+            tr(f'Update by prefix-fn {before} ==> {after}')
 
         if isinstance(self.previous, NewlineToken):
             # Force restart to get prefix-fn at start of next line.
@@ -392,34 +770,44 @@ class PIOParser:
         # starting non-expression syntax.
         current_rule = get_rule(self.current)
         while current_rule and precedence <= current_rule[3]:
-            print(f'Loop: {precedence} <= {current_rule}')
+            if pratt:
+                tr(f'Loop: {precedence} <= {current_rule}')
             infix_fn = current_rule[2]
             self.advance()  # shift previous . current
             if infix_fn is None:
                 raise PIOSyntaxError(f'Not an infix operator {self.previous}')
-            before = f'{self.previous} . {self.current}'
+            if pratt:
+                before = f'{self.previous} . {self.current}'
             # Call the infix handler for the now previous token.
             # It must consume current via a recursive call to
             # parse_precedence, leaving the next unhandled token in
             # current.
             infix_fn(self)
-            after = f'{self.previous} . {self.current}'
-            print(f'Update by infix-fn {before} ==> {after}')
+            if pratt:
+                after = f'{self.previous} . {self.current}'
+                tr(f'Update by infix-fn {before} ==> {after}')
             current_rule = get_rule(self.current)
-        print(f'Done: {precedence} > {current_rule}')
+        if pratt:
+            tr(f'Done: {precedence} > {current_rule}')
 
         return
 
-    def parse(self, filename: str, readline: Callable[[], str]):
-        self._reader = Scanner().token_reader(readline)
+    def parse(self, filename: str, readline: Callable[[], str]) -> Iterator[Record]:
+        """Statement records, as each line is parsed"""
+        self._scanner = LineScanner()
+        self._reader = self._scanner.token_reader(readline)
         self.advance()  # First unhandled token in current.
+        tr = self._trace
         while not isinstance(self.current, EOFToken):
-            print()
             self.parse_precedence(Prec.NONE)
-            print('Emitted stmts:', self._stmts)
-            while self._stmts:
-                yield self._stmts.pop(0)
-            print(f'Left on stack: {self.previous} . {self.current}')
+            if tr.flags & trace.STMT:
+                tr(f'Emitted stmts: {self._stmts}')
+            if self._stmts:
+                # At most the statements of one line
+                yield from self._stmts
+                self._stmts.clear()
+            if tr.flags & trace.STMT:
+                tr(f'Left on stack: {self.previous} . {self.current}')
 
     def parse_value(self, error: str) -> Expr:
         # Note pioasm requires parens around non-trivial exprs,
@@ -440,15 +828,17 @@ class PIOParser:
         return expr
 
     def push_expr(self, expr: Expr):
-        print('-->> push:', expr)
+        if self._trace.flags & trace.EXPR:
+            self._trace(f'-->> push: {expr}')
         self._exprs.append(expr)
 
     def pop_expr(self):
         expr =  self._exprs.pop(-1)
-        print('--<< pop:', expr)
+        if self._trace.flags & trace.EXPR:
+            self._trace(f'--<< pop: {expr}')
         return expr
 
-    def emit_stmt(self, stmt: Stmt):
+    def emit_stmt(self, stmt: Record):
         self._stmts.append(stmt)
 
 #--------------------------------------------------#
@@ -457,7 +847,10 @@ class NumberExpr(Expr):
     # Wraps a NumberToken in an Expr
 
     def __init__(self, p: PIOParser):
-        self._token = p.previous
+        tok = p.previous
+        if not isinstance(tok, NumberToken):
+            raise PIOSyntaxError(f'expected <number> at {tok}')
+        self._token: NumberToken = tok
         p.push_expr(self)
 
     def __str__(self):
@@ -466,6 +859,12 @@ class NumberExpr(Expr):
     def __repr__(self):
         return f'NumberExpr({self._token})'
 
+    def value(self) -> int:
+        return self._token.value
+
+    def evaluate(self, resolve: Callable[[str], int]) -> int:
+        return self._token.value
+
 
 class SymbolExpr(Expr):
     # Wraps a SymbolToken in an Expr
@@ -480,6 +879,12 @@ class SymbolExpr(Expr):
     def __repr__(self):
         return f'SymbolExpr({self._token})'
 
+    def value(self) -> str:
+        return self._token.inp
+
+    def evaluate(self, resolve: Callable[[str], int]) -> int:
+        return resolve(self._token.inp)
+
 
 class PrefixExpr(Expr):
     _OP = '-?-'
@@ -493,24 +898,46 @@ class PrefixExpr(Expr):
     def __str__(self):
         return f'({self._OP} {str(self._expr)})'
 
+    def evaluate(self, resolve: Callable[[str], int]) -> int:
+        return self._apply(self._expr.evaluate(resolve))
+
+    def _apply(self, a: int) -> int:
+        raise PIOSyntaxError(f'Cannot evaluate {self}')
+
 class UnaryNotInv(PrefixExpr):
     _OP = '!'  # Also '~'
 
+    def _apply(self, a: int) -> int:
+        return ~a
+
 class UnaryPlus(PrefixExpr):
     _OP = '+'
 
+    def _apply(self, a: int) -> int:
+        return a
+
 class UnaryMinus(PrefixExpr):
     _OP = '-'
 
+    def _apply(self, a: int) -> int:
+        return -a
+
 class UnaryReverse(PrefixExpr):
     _OP = '::'
 
+    def _apply(self, a: int) -> int:
+        # 32 bit reverse
+        r = 0
+        for _ in range(32):
+            r = (r << 1) | (a & 1)
+            a >>= 1
+        return r
+
 
 class BinaryExpr(Expr):
     _OP = '-?-'
 
     def __init__(self, p: PIOParser):
-        print('gimme...')
         p.parse_precedence(get_rule(self._OP)[3] + 1)
         self._rhs: Expr = p.pop_expr()
         self._lhs: Expr = p.pop_expr()
@@ -519,33 +946,72 @@ class BinaryExpr(Expr):
     def __str__(self):
         return f'({self._OP} {str(self._lhs)} {str(self._rhs)})'
 
+    def evaluate(self, resolve: Callable[[str], int]) -> int:
+        a = self._lhs.evaluate(resolve)
+        b = self._rhs.evaluate(resolve)
+        try:
+            return self._apply(a, b)
+        except (ZeroDivisionError, OverflowError, ValueError) as e:
+            # x / 0, x % 0, x << -1
+            raise PIOSyntaxError(f'{self}: {e}')
+
+    def _apply(self, a: int, b: int) -> int:
+        raise PIOSyntaxError(f'Cannot evaluate {self}')
+
 class CompareNE(BinaryExpr):
     _OP = '!='
 
+    def _apply(self, a: int, b: int) -> int:
+        return int(a != b)
+
 class InfixMod(BinaryExpr):
     _OP = '%'
 
+    def _apply(self, a: int, b: int) -> int:
+        return a - b * int(a / b)  # As C
+
 class InfixTimes(BinaryExpr):
     _OP = '*'
 
+    def _apply(self, a: int, b: int) -> int:
+        return a * b
+
 class InfixPlus(BinaryExpr):
     _OP = '+'
 
+    def _apply(self, a: int, b: int) -> int:
+        return a + b
+
 class InfixMinus(BinaryExpr):
     _OP = '-'
 
+    def _apply(self, a: int, b: int) -> int:
+        return a - b
+
 class InfixDiv(BinaryExpr):
     _OP = '/'
 
+    def _apply(self, a: int, b: int) -> int:
+        return int(a / b)  # As C, truncates
+
 class LessThan(BinaryExpr):
     _OP = '<'
 
+    def _apply(self, a: int, b: int) -> int:
+        return int(a < b)
+
 class InfixLShift(BinaryExpr):
     _OP = '<<'
 
+    def _apply(self, a: int, b: int) -> int:
+        return a << b
+
 class InfixRShift(BinaryExpr):
     _OP = '>>'
 
+    def _apply(self, a: int, b: int) -> int:
+        return a >> b
+
 
 class ParenExpr(Expr):
 
@@ -559,6 +1025,12 @@ class ParenExpr(Expr):
     def __str__(self):
         return f'"("{str(self._expr)}")"'
 
+    def value(self) -> 'int|str|Expr':
+        return _value(self._expr)
+
+    def evaluate(self, resolve: Callable[[str], int]) -> int:
+        return self._expr.evaluate(resolve)
+
 #--------------------------------------------------#
 
 class NewlineStmt:
@@ -567,13 +1039,16 @@ class NewlineStmt:
 
 
 class UnaryDot(Stmt):
-    def __init__(self, p: Parser):
+    def __init__(self, p: PIOParser):
+        self._token = p.previous
         if p.consume_kw('program'):
             self._parse_program(p)
         elif p.consume_kw('define'):
             self._parse_define(p)
         elif p.consume_kw('lang_opt'):
             self._parse_lang_opt(p)
+        elif p.consume_kw('origin'):
+            self._parse_origin(p)
         elif p.consume_kw('side_set'):
             self._parse_side_set(p)
         elif p.consume_kw('word'):
@@ -583,23 +1058,26 @@ class UnaryDot(Stmt):
         elif p.consume_kw('wrap_target'):
             self._parse_wrap_target(p)
         else:
-            raise PIOSyntaxError(f'Invalid .{p.current.inp}')
+            raise PIOSyntaxError(f'Invalid .{p.current}')
 
-    def _parse_program(self, p: Parser):
+    def _emit(self, p: PIOParser, name: str, *args):
+        p.emit_stmt(DirectiveRecord(self._token, name, *args))
+
+    def _parse_program(self, p: PIOParser):
         # "." program . <name>
         name = p.consume_cls(SymbolToken, '.program expected <name>')
-        p.emit_stmt(f'.program {name.inp}')
+        self._emit(p, 'program', name.inp)
 
-    def _parse_define(self, p: Parser):
+    def _parse_define(self, p: PIOParser):
         # "." define . <name> <expr>
         is_public = bool(p.consume_kw('public'))
         name = p.consume_cls(SymbolToken, '.define expected <name>')
         p.parse_precedence(Prec.EXPR)
         # '.define <name> expected <expr>')
         value = p.pop_expr()
-        p.emit_stmt(f'.define{" public" if is_public else ""} {name.inp} {value}')
+        self._emit(p, 'define', name.inp, _value(value), is_public)
 
-    def _parse_lang_opt(self, p: Parser):
+    def _parse_lang_opt(self, p: PIOParser):
         # "." lang_opt . <lang> <key> = <value>
         lang = p.consume_cls(SymbolToken, '.lang_opt expected <lang>')
         key = p.consume_cls(SymbolToken, '.lang_opt <lang> expected <key>')
@@ -609,32 +1087,48 @@ class UnaryDot(Stmt):
             # Not parsing, blindly take the rest of the line
             val.append(str(p.current))
             p.advance()
-        p.emit_stmt(f'.lang_opt {lang.inp} {key.inp} = {"".join(val)}')
+        self._emit(p, 'lang_opt', lang.inp, key.inp, ''.join(val))
+
+    def _parse_origin(self, p: PIOParser):
+        # "." origin . <offset>
+        offset = p.parse_value('.origin expected <offset>')
+        self._emit(p, 'origin', _value(offset))
 
-    def _parse_side_set(self, p: Parser):
-        # "." side_set . <count>
+    def _parse_side_set(self, p: PIOParser):
+        # "." side_set . <count> [opt] [pindirs]
         count = p.consume_cls(NumberToken, '.side_set expected <number>')
-        p.emit_stmt(f'.side_set {count.value}')
+        opt = p.consume_kw('opt')
+        pindirs = p.consume_kw('pindirs')
+        self._emit(p, 'side_set', count.value, opt, pindirs)
+
+    def _parse_word(self, p: PIOParser):
+        # "." word . <value>
+        value = p.parse_value('.word expected <value>')
+        self._emit(p, 'word', _value(value))
 
-    def _parse_wrap(self, p: Parser):
+    def _parse_wrap(self, p: PIOParser):
         # "." wrap
-        p.emit_stmt(f'.wrap')
+        self._emit(p, 'wrap')
 
-    def _parse_wrap_target(self, p: Parser):
+    def _parse_wrap_target(self, p: PIOParser):
         # "." wrap_target
-        p.emit_stmt(f'.wrap_target')
+        self._emit(p, 'wrap_target')
 
 
-class PublicStmt(Stmt): pass
+class PublicStmt(Stmt):
+    def __init__(self, p: PIOParser):
+        # public . <label>:
+        label = p.consume_cls(LabelToken, 'public expected <label>:')
+        p.emit_stmt(LabelRecord(label, label.inp, True))
 
 
 class LabelStmt:
     def __init__(self, p: PIOParser):
-        p.emit_stmt(f'{p.previous.inp}:')
+        p.emit_stmt(LabelRecord(p.previous, p.previous.inp))
 
 
 class InstructionStmt:  # Mixin
-    def _parse_side_delay(self, p: PIOParser):
+    def _parse_side_delay(self, p: PIOParser, instr: InstructionRecord):
         side = None
         delay = None
 
@@ -651,28 +1145,28 @@ class InstructionStmt:  # Mixin
         if side is None and p.consume_kw('side'):
             side = p.parse_value('side expected <expr>')
 
-        #return side, delay
-        return (
-            f'{"" if side is None else " side %s" % side}'
-            + f'{"" if delay is None else " [%s]" % delay}'
-        )
+        if side is not None:
+            instr.side = _value(side)
+        if delay is not None:
+            instr.delay = _value(delay)
+        p.emit_stmt(instr)
 
 
 class JmpStmt(InstructionStmt):
     
     def __init__(self, p: PIOParser):
         # jmp [<cond>] [,] <target>
+        token = p.previous
         cond = self._parse_condition(p)
-        print(f'got jmp cond={cond}')
+        if p._trace.flags & trace.STMT:
+            p._trace(f'got jmp cond={cond}')
         if cond:
             p.consume_kw(',')
         p.parse_precedence(Prec.EXPR)
         #'jmp expected <target>'
         target = p.pop_expr()
-        side_delay = self._parse_side_delay(p)
-        p.emit_stmt(
-            f'jmp{(" %s," % cond) if cond else ""} {target}{side_delay}'
-        )
+        self._parse_side_delay(
+            p, InstructionRecord(token, 'jmp', cond, _value(target)))
 
     def _parse_condition(self, p: PIOParser):
         # !x x-- !y y-- x!=y pin !osre <always>
@@ -689,6 +1183,7 @@ class JmpStmt(InstructionStmt):
                 p.consume_kw('y', 'jmp x!= expected "y"')
                 return 'x!=y'
             p.consume_kw('--', 'jmp x expected "--"')
+            return 'x--'
         if p.consume_kw('y'):
             p.consume_kw('--', 'jmp y expected "--"')
             return 'y--'
@@ -702,6 +1197,7 @@ class WaitStmt(InstructionStmt):
 
     def __init__(self, p: PIOParser):
         # wait [<pol>] <source> ...
+        token = p.previous
         pol = p.parse_value('wait <pol>')
         source = p.consume_one_of(self.SOURCE)
         irq_pn = ''
@@ -732,13 +1228,10 @@ class WaitStmt(InstructionStmt):
             )
         else:
             raise PIOSyntaxError(f'Unexpected {source=}')
-        p.emit_stmt(
-            f'wait {pol} {source}'
-            + f'{" %s," % irq_pn if irq_pn else ","}'
-            # jmppin ["+" index]
-            + f' {index}{" irq_rel" if irq_rel else ""}'
-            # side_delay
-        )
+        instr = InstructionRecord(token, 'wait', _value(pol), source,
+                                  _value(index), rel=irq_rel)
+        instr.irq_pn = irq_pn
+        self._parse_side_delay(p, instr)
 
 
 class InStmt(InstructionStmt):
@@ -746,60 +1239,65 @@ class InStmt(InstructionStmt):
 
     def __init__(self, p: PIOParser):
         # in <source> [,] <value>
+        token = p.previous
         source = p.consume_cls(KeywordToken, 'in expected <source>')
         if source.inp not in self.DEST:
-            raise PIOSyntaxError(f'Invalid in <source> "{p.current.inp}"')
+            raise PIOSyntaxError(f'Invalid in <source> "{source.inp}"')
         p.consume_kw(',')
         count = p.parse_value('in <source> expected <count>')
-        side_delay = self._parse_side_delay(p)
-        p.emit_stmt(f'in {source.inp}, {count.value}{side_delay}')
+        self._parse_side_delay(
+            p, InstructionRecord(token, 'in_', source.inp, _value(count)))
 
 
 class OutStmt(InstructionStmt):
-    DEST = ( 'pins', 'x', 'y', 'null', 'pindirs', 'pc', 'isr', 'osr' )
+    DEST = ( 'pins', 'x', 'y', 'null', 'pindirs', 'pc', 'isr', 'exec' )
 
     def __init__(self, p: PIOParser):
         # out . <dest> [,] <value>
+        token = p.previous
         dest = p.consume_cls(KeywordToken, 'out expected <dest>')
         if dest.inp not in self.DEST:
-            raise PIOSyntaxError(f'Invalid out <dest> "{p.current.inp}"')
+            raise PIOSyntaxError(f'Invalid out <dest> "{dest.inp}"')
         p.consume_kw(',')
         count = p.parse_value('out <dest> expected <count>')
-        side_delay = self._parse_side_delay(p)
-        p.emit_stmt(f'out {dest.inp}, {count.value}{side_delay}')
+        self._parse_side_delay(
+            p, InstructionRecord(token, 'out', dest.inp, _value(count)))
 
 
 class PushStmt(InstructionStmt):
     def __init__(self, p: PIOParser):
         # push [iffull] [blocking]
+        token = p.previous
         iffull = p.consume_kw('iffull')
         block = p.consume_kw('block') or not p.consume_kw('noblock')
-        # side_delay
-        p.emit_stmt('push ...')
+        self._parse_side_delay(
+            p, InstructionRecord(token, 'push', iffull=iffull, block=block))
 
 
 class PullStmt(InstructionStmt):
     def __init__(self, p: PIOParser):
         # pull [ifempty] [blocking]
+        token = p.previous
         ifempty = p.consume_kw('ifempty')
         block = p.consume_kw('block') or not p.consume_kw('noblock')
-        # side_delay
-        p.emit_stmt('pull ...')
+        self._parse_side_delay(
+            p, InstructionRecord(token, 'pull', ifempty=ifempty, block=block))
 
 
 class MovStmt(InstructionStmt):
-    DEST = ( 'pins', 'x', 'y', 'pc', 'exec' )
+    DEST = ( 'pins', 'x', 'y', 'pindirs', 'exec', 'pc', 'isr', 'osr' )
     OP = ( '!', '~', '::' )
     SOURCE = ( 'pins', 'x', 'y', 'null', 'status', 'isr', 'osr' )
 
     def __init__(self, p: PIOParser):
         # mov <dest> [,] [op] <source>
+        token = p.previous
         dest = self._parse_dest(p)
         p.consume_kw(',')
         op = self._parse_op(p)
         source = self._parse_source(p)
-        side_delay = self._parse_side_delay(p)
-        p.emit_stmt(f'mov {dest}, {op}{source}')
+        self._parse_side_delay(
+            p, InstructionRecord(token, 'mov', dest, op, source))
 
     def _parse_dest(self, p: PIOParser):
         dest = p.consume_one_of(self.DEST, 'mov expected <dest>')
@@ -807,21 +1305,21 @@ class MovStmt(InstructionStmt):
 
     def _parse_op(self, p: PIOParser):
         op = p.consume_one_of(self.OP)
-        return op
+        # ! and ~ are both invert
+        return '~' if op == '!' else op or ''
 
     def _parse_source(self, p: PIOParser):
         source = p.consume_one_of(
             self.SOURCE, 'mov <dest>, [<op>] expected <source>'
         )
-        if source == '!':
-            source = '~'
         return source
 
 
 class IrqStmt(InstructionStmt):
     def __init__(self, p: PIOParser):
         # irq [-|prev|next] ...
-        irq_pn = None
+        token = p.previous
+        irq_pn = ''
         if p.consume_kw('prev'):
             irq_pn = 'prev'
         elif p.consume_kw('next'):
@@ -829,18 +1327,19 @@ class IrqStmt(InstructionStmt):
         # ... clear <value> [rel]
         # ... wait <value> [rel]
         # ... [-|nowait|set] <value> [rel]
+        clear = wait = False
         if p.consume_kw('clear'):
-            action = 'clear'
+            clear = True
         elif p.consume_kw('wait'):
-            action = 'clear'
-        elif p.consume_kw('set') or p.consume_kw('nowait') or True:
-            action = 'set'
+            wait = True
+        elif p.consume_kw('set') or p.consume_kw('nowait'):
+            pass
         index = p.parse_value('irq expected <index>')
         rel = p.consume_kw('rel')
-        p.emit_stmt(
-            f'irq {"%s " % irq_pn if irq_pn else ""}'
-            + f'{action} {index}{" rel" if rel else ""}'
-        )
+        instr = InstructionRecord(token, 'irq', _value(index),
+                                  rel=rel, clear=clear, wait=wait)
+        instr.irq_pn = irq_pn
+        self._parse_side_delay(p, instr)
 
 
 class SetStmt(InstructionStmt):
@@ -848,10 +1347,12 @@ class SetStmt(InstructionStmt):
 
     def __init__(self, p: PIOParser):
         # set <dest> [,] <value>
+        token = p.previous
         dest = self._parse_dest(p)
         p.consume_kw(',')
         value = p.parse_value('set <dest>, expcteed <value>')
-        p.emit_stmt(f'set {dest}, {value}')
+        self._parse_side_delay(
+            p, InstructionRecord(token, 'set', dest, _value(value)))
 
     def _parse_dest(self, p: PIOParser):
         dest = p.consume_one_of(self._DEST, 'set expected <dest>')
@@ -860,8 +1361,7 @@ class SetStmt(InstructionStmt):
 
 class NopStmt(InstructionStmt):
     def __init__(self, p: PIOParser):
-        side_delay = self._parse_side_delay(p)
-        p.emit_stmt(f'nop{side_delay}')
+        self._parse_side_delay(p, InstructionRecord(p.previous, 'nop'))
 
 #--------------------------------------------------#
 
@@ -902,7 +1402,7 @@ PRATT_TAB = (
     ( '~', UnaryNotInv, None, Prec.NONE ),
 )
 
-def get_rule(token: str | Token, required: bool = False):
+def get_rule(token: str | Token | None, required: bool = False):
     if isinstance(token, KeywordToken):
         token = token.inp
     if isinstance(token, str):
@@ -917,7 +1417,6 @@ def get_rule(token: str | Token, required: bool = False):
         if a < len(r) and r[a][0] == token:
             return r[a]
         if required:
-            print('---', a, r[a], token)
             raise PIOSyntaxError(f'No rule for {token=}')
         return None
     if isinstance(token, LabelToken):
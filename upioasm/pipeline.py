@@ -0,0 +1,208 @@
+from typing import Callable, TYPE_CHECKING
+
+from .defines import Defines
+from .emitter import PIOEmitter
+from .error import PIOSyntaxError
+from .parser import PIOParser, DirectiveRecord, LabelRecord, Record
+from .program import PIOProgram
+from .resolver import ResolverVisitor
+
+if TYPE_CHECKING:
+    from . import pioasm
+
+
+class PIOPipeline:
+    """PIOPipeline - .pio source straight to opcodes, in one pass
+
+        programs = PIOPipeline(pa).run('uart.pio', fobj.readline)
+
+    Each record from the parser is handled as it arrives.  An
+    instruction is visited through a ResolverVisitor into the
+    program's PIOEmitter at once, so no statement list is kept.  A
+    jmp to a label further down is emitted with address 0 and
+    patched when the program ends.
+
+    Defines before the first .program are seen by every program, as
+    are `defines` (shared from another file, say).
+    .side_set, .origin, .wrap_target, .wrap and .word are honoured,
+    .lang_opt is ignored.
+    """
+
+    def __init__(self, pioasm: 'pioasm', pio_version: str='rp2040',
+                 defines: 'dict[str, int]|None'=None) -> None:
+        self._pioasm = pioasm
+        self._pio_version = pio_version
+        self._filename = '-'
+        self._gdefs = Defines()
+        for key, value in (defines or { }).items():
+            self._gdefs.define(key, value, False)
+        self._programs: list[PIOProgram] = [ ]
+        self._begin(None)
+        return
+
+    def get_defines(self) -> dict[str, int]:
+        """Defines outside any program, `defines` included"""
+        return {
+            key: value for key, value, public in self._gdefs.items() if value is not None
+        }
+
+    def _begin(self, program: PIOProgram|None):
+        self._program = program
+        self._pdefs = self._gdefs if program is None else self._gdefs.copy(False)
+        self._emitter: PIOEmitter|None = None
+        self._rv: ResolverVisitor|None = None
+        self._side_set = ( 0, False, False )
+        self._relocs = 0
+        self._labels: list[str] = [ ]
+        self._fixups: list[tuple[int, object, Record]] = [ ]
+        self._wrap_target = 0
+        self._wrap = -1
+        return
+
+    def run(self, filename: str, readline: Callable[[], str]) -> list[PIOProgram]:
+        """Assemble all the programs in the source, => the programs"""
+        self._filename = filename
+        parser = PIOParser(self._pioasm)
+        records = parser.parse(filename, readline)
+        while True:
+            try:
+                r = next(records)
+            except StopIteration:
+                break
+            except PIOSyntaxError as e:
+                # From the parser itself, at its current token, or
+                # from the scanner at its line
+                raise PIOSyntaxError(f'{filename}:{parser.line_no}: {e}')
+            try:
+                if isinstance(r, DirectiveRecord):
+                    getattr(self, '_dot_' + r.name)(*r.args)
+                elif isinstance(r, LabelRecord):
+                    self._label(r)
+                else:
+                    self._instruction(r)
+            except PIOSyntaxError as e:
+                raise self._error(e, r)
+        self._end()
+        return self._programs
+
+    def _error(self, e: Exception, r: Record) -> PIOSyntaxError:
+        return PIOSyntaxError(f'{self._filename}:{r.line_no}: {e} ({r})')
+
+    def _eval(self, x) -> int:
+        if isinstance(x, int):
+            return x
+        if isinstance(x, str):
+            return self._pdefs.resolve(x)
+        return x.evaluate(self._pdefs.resolve)
+
+    def _codes(self):
+        # The program's emitter, made at the first instruction when
+        # the side-set is known
+        if self._program is None:
+            raise PIOSyntaxError('instruction outside of program')
+        if self._emitter is None:
+            count, opt, pindirs = self._side_set
+            self._emitter = PIOEmitter(count + opt, opt)
+            self._rv = ResolverVisitor(self._pdefs, self._emitter)
+        return self._emitter.get_array()
+
+    def _addr(self) -> int:
+        e = self._emitter
+        return 0 if e is None else len(e.get_array())
+
+    def _instruction(self, r):
+        addr = len(self._codes())
+        if addr >= 32:
+            raise PIOSyntaxError('program > 32 instructions')
+        if r.op == 'jmp':
+            cond, target = r.args
+            try:
+                r.args = ( cond, self._eval(target) )
+            except PIOSyntaxError:
+                # Maybe a label further down
+                self._fixups.append(( addr, target, r ))
+                r.args = ( cond, 0 )
+            self._relocs |= 1 << addr
+        r.visit(self._rv)
+        return
+
+    def _label(self, r: LabelRecord):
+        if self._program is None:
+            raise PIOSyntaxError('label outside of program')
+        self._pdefs.define(r.name, self._addr(), r.public)
+        self._labels.append(r.name)
+        return
+
+    def _end(self):
+        # Backpatch and register the program
+        p = self._program
+        if p is None:
+            return
+        codes = self._codes()
+        for addr, target, r in self._fixups:
+            r.args = ( r.args[0], target )
+            try:
+                a = self._eval(target)
+            except PIOSyntaxError as e:
+                raise self._error(e, r)
+            if not 0 <= a < 32:
+                raise self._error(PIOSyntaxError('<addr>: must be in range 0..31'), r)
+            codes[addr] |= a
+        p.set_opcodes(codes, self._relocs)
+        defines = {
+            key: value for key, value, public in self._pdefs.items() if public
+        }
+        p.set_defines(defines)
+        p.set_labels({
+            name: defines[name] for name in self._labels if name in defines
+        })
+        p.set_wrap(self._wrap_target, self._wrap)
+        p.side_set(*self._side_set)
+        self._programs.append(p)
+        self._begin(None)
+        return
+
+    def _dot_program(self, name: str):
+        self._end()
+        self._begin(self._pioasm.program(name, pio_version=self._pio_version))
+        return
+
+    def _dot_define(self, name: str, value, public: bool):
+        self._pdefs.define(name, self._eval(value), public)
+        return
+
+    def _dot_side_set(self, count: int, opt: bool, pindirs: bool):
+        if self._program is None or self._emitter is not None:
+            raise PIOSyntaxError('.side_set before the first instruction')
+        self._side_set = ( count, bool(opt), bool(pindirs) )
+        return
+
+    def _dot_origin(self, offset):
+        if self._program is None:
+            raise PIOSyntaxError('origin outside of program')
+        offset = self._eval(offset)
+        if not 0 <= offset < 32:
+            raise PIOSyntaxError('origin not 0..31')
+        self._program.origin(offset)
+        return
+
+    def _dot_wrap_target(self):
+        self._wrap_target = self._addr()
+        return
+
+    def _dot_wrap(self):
+        # After the last instruction of the loop
+        self._wrap = self._addr() - 1
+        return
+
+    def _dot_word(self, value):
+        codes = self._codes()
+        if len(codes) >= 32:
+            raise PIOSyntaxError('program > 32 instructions')
+        codes.append(self._eval(value) & 0xffff)
+        return
+
+    def _dot_lang_opt(self, lang: str, key: str, value: str):
+        return
+
+#--#
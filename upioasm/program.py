@@ -1,7 +1,100 @@
+from array import array
+
+
 class PIOProgram:
-    def __init__(self, name: str, pio_version: str):
-        pass
+    """PIOProgram - an assembled program, ready to load
+
+    Holds the opcodes plus what is needed to place the program in
+    instruction memory and configure a state machine: public defines
+    and labels, wrap points, origin and side-set configuration.
+
+    Opcodes, labels and wrap points are relative to 0.  A bit mask
+    marks the words holding an absolute (jmp) address, so loading at
+    another offset is one pass in `relocate`, without the assembler.
+    """
+
+    def __init__(self, name: str, pio_version: str='rp2040'):
+        self.name = name
+        self.pio_version = pio_version
+        self._opcodes = array('H')
+        self._relocs = 0
+        self._defines: dict[str, int] = { }
+        self._labels: dict[str, int] = { }
+        self._wrap_target = 0
+        self._wrap = -1
+        self._origin = -1
+        self._side_set = ( 0, False, False )
+        return
+
+    def __len__(self):
+        return len(self._opcodes)
+
+    def origin(self, offset: int):
+        """Require loading at `offset`, or -1 for anywhere"""
+        self._origin = offset
+
+    def get_origin(self) -> int:
+        return self._origin
+
+    def side_set(self, count: int, opt: bool=False, pindirs: bool=False):
+        """.side_set <count> (opt) (pindirs)
+
+        Note the delay/side-set field uses count + opt bits.
+        """
+        self._side_set = ( count, opt, pindirs )
+
+    def get_side_set(self) -> tuple[int, bool, bool]:
+        return self._side_set
+
+    def set_opcodes(self, opcodes, relocs: int=-1):
+        """Opcodes, and bit n set in `relocs` when word n is a jmp
+
+        By default every word with a jmp opcode is relocated.
+        """
+        self._opcodes = array('H', opcodes)
+        if relocs < 0:
+            relocs = 0
+            for i, code in enumerate(self._opcodes):
+                if code < 0x2000:
+                    relocs |= 1 << i
+        self._relocs = relocs
+
+    def get_opcodes(self) -> array:
+        return self._opcodes
+
+    def get_relocs(self) -> int:
+        return self._relocs
+
+    def relocate(self, offset: int) -> array:
+        """Opcodes to load at `offset`, the jmp addresses moved"""
+        codes = array('H', self._opcodes)
+        relocs = self._relocs
+        if offset and relocs:
+            for i in range(len(codes)):
+                if relocs >> i & 1:
+                    code = codes[i]
+                    codes[i] = (code & 0xffe0) | ((code + offset) & 0x1f)
+        return codes
+
+    def set_defines(self, defines: dict[str, int]):
+        self._defines = dict(defines)
+
+    def get_defines(self) -> dict[str, int]:
+        return self._defines
+
+    def set_labels(self, labels: dict[str, int]):
+        self._labels = dict(labels)
+
+    def get_labels(self) -> dict[str, int]:
+        return self._labels
+
+    def set_wrap(self, wrap_target: int, wrap: int):
+        """Wrap from `wrap` back to `wrap_target`, -1 for the end"""
+        self._wrap_target = wrap_target
+        self._wrap = wrap
 
-    def origin(self, offset: int): pass
+    def get_wrap(self) -> tuple[int, int]:
+        wrap = self._wrap if self._wrap >= 0 else len(self._opcodes) - 1
+        return self._wrap_target, wrap
 
 #--#
@@ -1,23 +1,43 @@
 ## Register types
 
 class Register:
+    __slots__ = ()
     _name: str
 
-class InSourceReg(Register): pass
+class InSourceReg(Register):
+    __slots__ = ()
 
-class OutDestReg(Register): pass
+class OutDestReg(Register):
+    __slots__ = ()
 
-class MovDestReg(Register): pass
+class MovDestReg(Register):
+    __slots__ = ()
 
-class MovSourceReg(Register): pass
+class MovSourceReg(Register):
+    __slots__ = ()
+
+class _MovOpReg(MovSourceReg):
+    # ~<source> or ::<source>
+    __slots__ = ( '_name', )
+
+    def __init__(self, name: str):
+        self._name = name
+
+# Interned, op + name => _MovOpReg
+_op_regs: dict[str, MovSourceReg] = { }
+
+def _op_reg(name: str) -> MovSourceReg:
+    reg = _op_regs.get(name)
+    if reg is None:
+        reg = _op_regs[name] = _MovOpReg(name)
+    return reg
 
 class MovSourceMixin(MovSourceReg):
+    __slots__ = ()
 
     def __invert__(self) -> MovSourceReg:
         """~<source>"""
-        reg = MovSourceReg()
-        reg._name = '~' + self._name
-        return reg
+        return _op_reg('~' + self._name)
 
     @property
     def inverted(self) -> MovSourceReg:
@@ -27,42 +47,51 @@ class MovSourceMixin(MovSourceReg):
     @property
     def reversed(self) -> MovSourceReg:
         """::<source>"""
-        reg = MovSourceReg()
-        reg._name = '::' + self._name
-        return reg
+        return _op_reg('::' + self._name)
 
-class SetDestReg(Register): pass
+class SetDestReg(Register):
+    __slots__ = ()
 
 ## Register classes
 
 class _pins(InSourceReg, OutDestReg, MovDestReg, MovSourceMixin, SetDestReg):
+    __slots__ = ()
     _name = 'pins'
 
 class _x(InSourceReg, OutDestReg, MovDestReg, MovSourceMixin, SetDestReg):
+    __slots__ = ()
     _name = 'x'
 
 class _y(InSourceReg, OutDestReg, MovDestReg, MovSourceMixin, SetDestReg):
+    __slots__ = ()
     _name = 'y'
 
 class _null(InSourceReg, OutDestReg, MovSourceMixin):
+    __slots__ = ()
     _name =  'null'
 
 class _pindirs(OutDestReg, SetDestReg):
+    __slots__ = ()
     _name = 'pindirs'
 
 class _pc(OutDestReg, MovDestReg):
+    __slots__ = ()
     _name = 'pc'
 
 class _status(MovSourceMixin):
+    __slots__ = ()
     _name = 'status'
 
 class _isr(InSourceReg, OutDestReg, MovSourceMixin):
+    __slots__ = ()
     _name = 'isr'
 
 class _osr(InSourceReg, OutDestReg, MovSourceMixin):
+    __slots__ = ()
     _name = 'osr'
 
 class _exec(OutDestReg, MovDestReg):
+    __slots__ = ()
     _name = 'exec'
 
 ## Register objects
@@ -12,15 +12,20 @@ Value = Union[int, Symbol]
 class ResolverVisitor(InstructionVisitor):
     """Wedge converting symbols to numbers"""
 
-    def __init__(self, pdefs: Defines, nextv: InstructionVisitor):
+    def __init__(self, pdefs: 'Defines', nextv: InstructionVisitor):
         self._pdefs = pdefs
         self._nextv = nextv
         return
 
     def _resolve(self, x: Value) -> int:
-        # maybe eval (expression) here?
-        # A `Label` converts to a `str`.
-        return x if isinstance(x, int) else self._pdefs.resolve(str(x))
+        # A `Label` converts to a `str`, a parser Expr evaluates.
+        if isinstance(x, int):
+            return x
+        if isinstance(x, str):
+            return self._pdefs.resolve(x)
+        if hasattr(x, 'evaluate'):
+            return x.evaluate(self._pdefs.resolve)
+        return self._pdefs.resolve(str(x))
 
     def side(self, side: Value) -> InstructionVisitor:
         self._nextv.side(self._resolve(side))
@@ -70,4 +75,72 @@ class ResolverVisitor(InstructionVisitor):
         self._nextv.nop()
         return self
 
+
+class TeeVisitor(InstructionVisitor):
+    """Fan each call out to several visitors, in order"""
+
+    def __init__(self, visitors: list[InstructionVisitor]):
+        self._visitors = visitors
+        return
+
+    def side(self, side: Value) -> InstructionVisitor:
+        for v in self._visitors:
+            v.side(side)
+        return self
+
+    def delay(self, delay: Value) -> InstructionVisitor:
+        for v in self._visitors:
+            v.delay(delay)
+        return self
+
+    def jmp(self, cond: str, addr: Value) -> InstructionVisitor:
+        for v in self._visitors:
+            v.jmp(cond, addr)
+        return self
+
+    def wait(self, pol: Value, source: str, index: Value, *, rel=False) -> InstructionVisitor:
+        for v in self._visitors:
+            v.wait(pol, source, index, rel=rel)
+        return self
+
+    def in_(self, source: str, count: Value) -> InstructionVisitor:
+        for v in self._visitors:
+            v.in_(source, count)
+        return self
+
+    def out(self, dest: str, count: Value) -> InstructionVisitor:
+        for v in self._visitors:
+            v.out(dest, count)
+        return self
+
+    def push(self, *, iffull: bool=False, block: bool=True) -> InstructionVisitor:
+        for v in self._visitors:
+            v.push(iffull=iffull, block=block)
+        return self
+
+    def pull(self, *, ifempty: bool=False, block: bool=True) -> InstructionVisitor:
+        for v in self._visitors:
+            v.pull(ifempty=ifempty, block=block)
+        return self
+
+    def mov(self, dest: str, op: str, source: str='') -> InstructionVisitor:
+        for v in self._visitors:
+            v.mov(dest, op, source)
+        return self
+
+    def irq(self, irq_num: Value, *, rel=False, clear=False, wait=False) -> InstructionVisitor:
+        for v in self._visitors:
+            v.irq(irq_num, rel=rel, clear=clear, wait=wait)
+        return self
+
+    def set(self, dest: str, data: Value) -> InstructionVisitor:
+        for v in self._visitors:
+            v.set(dest, data)
+        return self
+
+    def nop(self) -> InstructionVisitor:
+        for v in self._visitors:
+            v.nop()
+        return self
+
 #--#
@@ -0,0 +1,6 @@
+# upioasm.sim - host side PIO simulator
+
+from .block import PIOBlock
+from .statemachine import StateMachine
+
+#--#
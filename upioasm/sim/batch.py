@@ -0,0 +1,468 @@
+# Needs numpy, so not imported by upioasm.sim
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from ..program import PIOProgram
+
+from .statemachine import check_word
+
+M32 = 0xffffffff
+U64 = np.uint64
+NOJMP = 32  # Not a jump target
+
+
+def _mask(n):
+    # Low `n` bits set, n may be an array of 0..32
+    return (np.left_shift(U64(1), np.asarray(n, dtype=U64)) - U64(1))
+
+
+def _codes(pcs: list[tuple], shift: int=0, mask: int=7) -> list[int]:
+    # Distinct (arg >> shift) & mask over the decoded ( pc, a1, a2 )
+    # below, a1 for shift 0..7 and a2 for shift 8 on.
+    return sorted({ (d[1 + (shift >= 8)] >> (shift & 7)) & mask for d in pcs })
+
+
+def _rotl(v, n: int):
+    n &= 31
+    return ((v << U64(n)) | (v >> U64(32 - n))) & U64(M32)
+
+
+def _reverse(v):
+    v = ((v >> U64(1)) & U64(0x55555555)) | ((v & U64(0x55555555)) << U64(1))
+    v = ((v >> U64(2)) & U64(0x33333333)) | ((v & U64(0x33333333)) << U64(2))
+    v = ((v >> U64(4)) & U64(0x0f0f0f0f)) | ((v & U64(0x0f0f0f0f)) << U64(4))
+    v = ((v >> U64(8)) & U64(0x00ff00ff)) | ((v & U64(0x00ff00ff)) << U64(8))
+    return ((v >> U64(16)) | (v << U64(16))) & U64(M32)
+
+
+class BatchSim:
+    """BatchSim - one program on `n` independent state machines
+
+    Each lane is SM0 of its own PIO block, with its own GPIOs and
+    IRQ flags.  All registers are arrays of n, set them (x, y,
+    gpio_in, ...) before `run` to give each lane its own inputs.
+
+    Every cycle all lanes fetch and decode with whole-array ops,
+    then each opcode present is executed once with its effects
+    masked to the lanes running it (not in a delay, not another
+    opcode).  Only FIFO transfers index single lanes.  Timing
+    matches upioasm.sim.StateMachine.
+
+    FIFOs differ from hardware: TX is a stream of up to `tx_depth`
+    words filled by `put`, and RX collects up to `rx_depth` words
+    before push stalls, read back with `get`.  Programs using out
+    exec or mov exec are refused with ValueError when built.
+    """
+
+    def __init__(self, program: 'PIOProgram', n: int, *, offset: int=0,
+                 tx_depth: int=16, rx_depth: int=16,
+                 in_base=0, out_base=0, out_count=32, set_base=0,
+                 set_count=5, sideset_base=0, jmp_pin=0,
+                 in_shiftdir=0, out_shiftdir=0,
+                 autopush=False, push_thresh=32,
+                 autopull=False, pull_thresh=32,
+                 status_sel=0, status_n=0):
+        self.n = n
+        self.in_base = in_base
+        self.out_base = out_base
+        self.out_count = out_count
+        self.set_base = set_base
+        self.set_count = set_count
+        self.jmp_pin = jmp_pin
+        self.in_shiftdir = in_shiftdir
+        self.out_shiftdir = out_shiftdir
+        self.autopush = autopush
+        self.push_thresh = push_thresh or 32
+        self.autopull = autopull
+        self.pull_thresh = pull_thresh or 32
+        self.status_sel = status_sel
+        self.status_n = status_n
+        self._decode(program, offset, sideset_base)
+
+        self.clock = 0
+        z = lambda: np.zeros(n, dtype=U64)
+        self.pc = np.full(n, offset, dtype=np.intp)
+        self.x, self.y = z(), z()
+        self.isr, self.osr = z(), z()
+        self.isr_count = z()
+        self.osr_count = np.full(n, 32, dtype=U64)
+        self.gpio_in, self.gpio_out, self.gpio_dir = z(), z(), z()
+        self.irq = z()
+        self.tx = np.zeros(( n, tx_depth ), dtype=U64)
+        self.tx_pos, self.tx_len = z(), z()
+        self.rx = np.zeros(( n, rx_depth ), dtype=U64)
+        self.rx_len = z()
+        self._delay = z()
+        self._irq_waiting = np.zeros(n, dtype=bool)
+        self.stalled = np.zeros(n, dtype=bool)
+        return
+
+    def _decode(self, program: 'PIOProgram', offset: int, sideset_base: int):
+        codes = [ 0 ] * 32
+        for i, code in enumerate(program.relocate(offset)):
+            op, dest = check_word(code) >> 13, (code >> 5) & 7
+            if op == 3 and dest == 7 or op == 5 and dest == 4:
+                raise ValueError(f'exec unsupported in batch mode, 0x{code:04x}')
+            codes[offset + i] = code
+        self._word = np.array(codes, dtype=U64)
+        # pc => ( pc, a1, a2 ) by op
+        self._dec = [ ( pc, (w >> 5) & 7, w & 0x1f ) for pc, w in enumerate(codes) ]
+        self._ops = [ w >> 13 for w in codes ]
+        wrap_target, wrap = program.get_wrap()
+        wrap_target += offset
+        wrap += offset
+        self._fall = np.array([
+            wrap_target if pc == wrap else (pc + 1) & 31
+            for pc in range(32)
+        ], dtype=U64)
+        count, opt, pindirs = program.get_side_set()
+        self._ss_bits = count + opt
+        self._ss_opt = opt
+        self._ss_pindirs = pindirs
+        self._ss_base = sideset_base
+        self._ss_mask = _rotl(U64((1 << count) - 1), sideset_base)
+        return
+
+    #--- Host side
+
+    def put(self, words):
+        """Append words to each lane's TX stream, shape (n,) or (n, k)"""
+        words = np.asarray(words, dtype=U64).reshape(self.n, -1)
+        k = words.shape[1]
+        # Drop what was already pulled
+        if self.tx_pos.any():
+            keep = self.tx.shape[1]
+            rows = np.arange(self.n)[:, None]
+            cols = (np.arange(keep)[None, :] + self.tx_pos[:, None]) % keep
+            self.tx = self.tx[rows, cols]
+            self.tx_len -= self.tx_pos
+            self.tx_pos[:] = 0
+        if int(self.tx_len.max()) + k > self.tx.shape[1]:
+            raise ValueError('TX stream full')
+        cols = self.tx_len[:, None].astype(np.intp) + np.arange(k)[None, :]
+        self.tx[np.arange(self.n)[:, None], cols] = words & U64(M32)
+        self.tx_len += U64(k)
+
+    def get(self) -> list:
+        """Words pushed so far by each lane, and clear them"""
+        out = [ self.rx[i, :int(m)].tolist() for i, m in enumerate(self.rx_len) ]
+        self.rx_len[:] = 0
+        return out
+
+    def pins(self):
+        d = self.gpio_dir
+        return (self.gpio_out & d) | (self.gpio_in & ~d & U64(M32))
+
+    #--- Run
+
+    def run(self, cycles: int, gpio_in=None, record: bool=False):
+        """Advance all lanes `cycles` clocks
+
+        gpio_in: optional (cycles, n) inputs, one row per clock.
+        With record, returns gpio_out after each clock as (cycles, n).
+        """
+        hist = np.zeros(( cycles, self.n ), dtype=np.uint32) if record else None
+        for t in range(cycles):
+            if gpio_in is not None:
+                self.gpio_in[:] = gpio_in[t]
+            self.step()
+            if hist is not None:
+                hist[t] = self.gpio_out
+        return hist
+
+    def step(self):
+        d = self._delay
+        active = d == 0
+        np.subtract(d, U64(1), out=d, where=~active)
+        pc = self.pc
+        w = self._word[pc]
+        op = w >> U64(13)
+        a1 = (w >> U64(5)) & U64(7)
+        a2 = w & U64(0x1f)
+        ds = (w >> U64(8)) & U64(0x1f)
+        nd = 5 - self._ss_bits
+        if self._ss_bits:
+            side = ds >> U64(nd)
+            en = active
+            if self._ss_opt:
+                bit = U64(1 << (self._ss_bits - 1))
+                en = active & ((side & bit) != 0)
+                side &= bit - U64(1)
+            self._side_set(en, side)
+        npc = self._fall[pc]
+        stall = np.zeros(self.n, dtype=bool)
+        # The few distinct pcs being run, grouped by op
+        counts = np.bincount(np.where(active, pc, 32), minlength=33)
+        groups: dict[int, list[tuple]] = { }
+        for p in np.flatnonzero(counts[:32]).tolist():
+            groups.setdefault(self._ops[p], [ ]).append(self._dec[p])
+        for k, pcs in groups.items():
+            m = active & (op == k) if len(groups) > 1 else active
+            if k == 4:
+                # push/pull by bit 7
+                pl = (a1 & U64(4)) != 0
+                for c in _codes(pcs, 2, 1):
+                    if c:
+                        self._pull(m & pl, a1, stall)
+                    else:
+                        self._push(m & ~pl, a1, stall)
+            else:
+                _HANDLERS[k](self, m, a1, a2, npc, stall, pcs)
+        go = active & ~stall
+        np.copyto(pc, npc, where=go, casting='unsafe')
+        np.copyto(d, ds & U64((1 << nd) - 1), where=go)
+        self.stalled = stall
+        self.clock += 1
+
+    def _side_set(self, m, side):
+        v = _rotl(side, self._ss_base) & self._ss_mask
+        reg = self.gpio_dir if self._ss_pindirs else self.gpio_out
+        np.copyto(reg, (reg & ~self._ss_mask & U64(M32)) | v, where=m)
+
+    def _write_pins(self, m, data, base: int, count, dirs: bool):
+        mask = _rotl(_mask(count), base)
+        reg = self.gpio_dir if dirs else self.gpio_out
+        np.copyto(reg, (reg & ~mask & U64(M32)) | (_rotl(data, base) & mask), where=m)
+
+    # Handlers run the lanes selected by `m`, setting `npc` for a
+    # jump and `stall` for lanes that did not complete.
+
+    def _jmp(self, m, cond, addr, npc, stall, pcs):
+        x = self.x
+        y = self.y
+        taken = np.zeros(self.n, dtype=bool)
+        for c in _codes(pcs):
+            mc = m & (cond == c)
+            if c == 0:
+                taken |= mc
+            elif c == 1:
+                taken |= mc & (x == 0)
+            elif c == 2:
+                taken |= mc & (x != 0)
+                np.subtract(x, U64(1), out=x, where=mc)
+                x &= U64(M32)
+            elif c == 3:
+                taken |= mc & (y == 0)
+            elif c == 4:
+                taken |= mc & (y != 0)
+                np.subtract(y, U64(1), out=y, where=mc)
+                y &= U64(M32)
+            elif c == 5:
+                taken |= mc & (x != y)
+            elif c == 6:
+                taken |= mc & (((self.pins() >> U64(self.jmp_pin)) & U64(1)) != 0)
+            else:
+                taken |= mc & (self.osr_count < U64(self.pull_thresh))
+        np.copyto(npc, addr, where=taken)
+
+    def _wait(self, m, a1, index, npc, stall, pcs):
+        pol = a1 >> U64(2)
+        source = a1 & U64(3)
+        level = np.zeros(self.n, dtype=U64)
+        for c in _codes(pcs, 0, 3):
+            mc = m & (source == c)
+            if c == 0:
+                v = self.pins() >> index
+            elif c == 1:
+                v = self.pins() >> ((index + U64(self.in_base)) & U64(31))
+            else:
+                # irq, source 3 is refused by _decode
+                bit = np.left_shift(U64(1), index & U64(7))
+                v = (self.irq & bit) != 0
+                # Clear the flag when waiting for 1
+                clr = mc & v & (pol == 1)
+                np.copyto(self.irq, self.irq & ~bit & U64(0xff), where=clr)
+            np.copyto(level, v & U64(1) if c < 2 else v, where=mc, casting='unsafe')
+        stall |= m & (level != pol)
+
+    def _source(self, m, src, codes: list[int]):
+        v = np.zeros(self.n, dtype=U64)
+        for c in codes:
+            if c == 0:
+                s = _rotl(self.pins(), 32 - self.in_base)
+            elif c == 1:
+                s = self.x
+            elif c == 2:
+                s = self.y
+            elif c == 5:
+                if self.status_sel:
+                    level = self.rx_len
+                else:
+                    level = np.minimum(self.tx_len - self.tx_pos, U64(4))
+                s = np.where(level < U64(self.status_n), U64(M32), U64(0))
+            elif c == 6:
+                s = self.isr
+            elif c == 7:
+                s = self.osr
+            else:
+                continue  # null, reserved
+            np.copyto(v, s, where=m & (src == c))
+        return v
+
+    def _push_isr(self, m):
+        # Push the lanes in `m` that have room, => bool pushed
+        lanes = np.flatnonzero(m)
+        rl = self.rx_len[lanes]
+        room = rl < U64(self.rx.shape[1])
+        ln = lanes[room]
+        self.rx[ln, rl[room].astype(np.intp)] = self.isr[ln]
+        self.rx_len[ln] += U64(1)
+        self.isr[ln] = 0
+        self.isr_count[ln] = 0
+        pushed = np.zeros(self.n, dtype=bool)
+        pushed[ln] = True
+        return pushed
+
+    def _pull_tx(self, m):
+        # Pull into the lanes in `m` that have data, => bool pulled
+        lanes = np.flatnonzero(m)
+        pos = self.tx_pos[lanes]
+        avail = pos < self.tx_len[lanes]
+        ln = lanes[avail]
+        self.osr[ln] = self.tx[ln, pos[avail].astype(np.intp)]
+        self.tx_pos[ln] += U64(1)
+        self.osr_count[ln] = 0
+        pulled = np.zeros(self.n, dtype=bool)
+        pulled[ln] = True
+        return pulled
+
+    def _in(self, m, src, count, npc, stall, pcs):
+        if self.autopush:
+            full = m & (self.isr_count >= U64(self.push_thresh))
+            if full.any():
+                st = full & ~self._push_isr(full)
+                stall |= st
+                m = m & ~st
+        n = np.where(count == 0, U64(32), count)
+        data = self._source(m, src, _codes(pcs)) & _mask(n)
+        isr = self.isr
+        if self.in_shiftdir:
+            isr = (isr >> n) | (data << (U64(32) - n))
+        else:
+            isr = (isr << n) | data
+        np.copyto(self.isr, isr & U64(M32), where=m)
+        np.copyto(self.isr_count, np.minimum(self.isr_count + n, U64(32)), where=m)
+        if self.autopush:
+            full = m & (self.isr_count >= U64(self.push_thresh))
+            if full.any():
+                self._push_isr(full)
+
+    def _out(self, m, dest, count, npc, stall, pcs):
+        if self.autopull:
+            empty = m & (self.osr_count >= U64(self.pull_thresh))
+            if empty.any():
+                st = empty & ~self._pull_tx(empty)
+                stall |= st
+                m = m & ~st
+        n = np.where(count == 0, U64(32), count)
+        osr = self.osr
+        if self.out_shiftdir:
+            data = osr & _mask(n)
+            osr = osr >> n
+        else:
+            data = osr >> (U64(32) - n)
+            osr = (osr << n) & U64(M32)
+        np.copyto(self.osr, osr, where=m)
+        np.copyto(self.osr_count, np.minimum(self.osr_count + n, U64(32)), where=m)
+        self._write(m, dest, data, n, npc, _codes(pcs))
+
+    def _write(self, m, dest, data, count, npc, codes: list[int]):
+        # out/mov destinations
+        for c in codes:
+            mc = m & (dest == c)
+            if c == 1:
+                np.copyto(self.x, data, where=mc)
+            elif c == 2:
+                np.copyto(self.y, data, where=mc)
+            elif c == 5:
+                np.copyto(npc, data & U64(31), where=mc)
+            elif c == 0 or c == 4:
+                self._write_pins(mc, data, self.out_base, count, c == 4)
+            elif c == 6:
+                np.copyto(self.isr, data, where=mc)
+                np.copyto(self.isr_count, count, where=mc)
+
+    def _push(self, m, a1, stall):
+        m = m & ~(((a1 & U64(2)) != 0) & (self.isr_count < U64(self.push_thresh)))
+        if not m.any():
+            return
+        full = m & ~self._push_isr(m)
+        block = (a1 & U64(1)) != 0
+        stall |= full & block
+        # A non-blocking push to a full FIFO drops the data
+        drop = full & ~block
+        self.isr[drop] = 0
+        self.isr_count[drop] = 0
+
+    def _pull(self, m, a1, stall):
+        m = m & ~(((a1 & U64(2)) != 0) & (self.osr_count < U64(self.pull_thresh)))
+        if not m.any():
+            return
+        empty = m & ~self._pull_tx(m)
+        block = (a1 & U64(1)) != 0
+        stall |= empty & block
+        # Non-blocking pull from empty copies x
+        nb = empty & ~block
+        np.copyto(self.osr, self.x, where=nb)
+        self.osr_count[nb] = 0
+
+    def _mov(self, m, dest, a2, npc, stall, pcs):
+        op = a2 >> U64(3)
+        data = self._source(m, a2 & U64(7), _codes(pcs, 8))
+        ops = _codes(pcs, 11, 3)
+        if 1 in ops:
+            data = np.where(op == 1, ~data & U64(M32), data)
+        if 2 in ops:
+            data = np.where(op == 2, _reverse(data), data)
+        dests = _codes(pcs)
+        if 6 in dests:
+            mc = m & (dest == 6)
+            np.copyto(self.isr, data, where=mc)
+            self.isr_count[mc] = 0
+        if 7 in dests:
+            mc = m & (dest == 7)
+            np.copyto(self.osr, data, where=mc)
+            self.osr_count[mc] = 0
+        dests = [ c for c in dests if c < 6 ]
+        if dests:
+            self._write(m, dest, data, U64(self.out_count), npc, dests)
+
+    def _irq(self, m, a1, a2, npc, stall, pcs):
+        # SM0 of each lane, so rel does not change the number
+        bit = np.left_shift(U64(1), a2 & U64(7))
+        clear = m & ((a1 & U64(2)) != 0)
+        raised = m & ~clear & ~self._irq_waiting
+        irq = np.where(clear, self.irq & ~bit & U64(0xff), self.irq)
+        irq = np.where(raised, irq | bit, irq)
+        self.irq = irq
+        # irq wait, until the flag is cleared (by the host here)
+        st = m & ~clear & ((a1 & U64(1)) != 0) & ((irq & bit) != 0)
+        np.copyto(self._irq_waiting, st, where=m)
+        stall |= st
+
+    def _set(self, m, dest, data, npc, stall, pcs):
+        for c in _codes(pcs):
+            mc = m & (dest == c)
+            if c == 1:
+                np.copyto(self.x, data, where=mc)
+            elif c == 2:
+                np.copyto(self.y, data, where=mc)
+            elif c == 0 or c == 4:
+                self._write_pins(mc, data, self.set_base, self.set_count, c == 4)
+
+
+_HANDLERS = (
+    BatchSim._jmp,
+    BatchSim._wait,
+    BatchSim._in,
+    BatchSim._out,
+    None,  # push/pull
+    BatchSim._mov,
+    BatchSim._irq,
+    BatchSim._set,
+)
+
+#--#
@@ -0,0 +1,123 @@
+from array import array
+from typing import TYPE_CHECKING
+
+from .statemachine import StateMachine, check_word
+
+if TYPE_CHECKING:
+    from ..program import PIOProgram
+
+
+class PIOBlock:
+    """PIOBlock - four state machines sharing instruction memory
+
+    Also shared are the 8 IRQ flags and the GPIOs: `gpio_in` is
+    driven by the test, `gpio_out` and `gpio_dir` by the SMs.  A pin
+    reads back its output value when its direction is out.
+
+    With log=True every change of `gpio_out` is recorded as
+    ( clock, gpio_out ) in `pin_log`, and every IRQ flag set as
+    ( clock, irq_num ) in `irq_log`.
+    """
+
+    def __init__(self, log: bool=False) -> None:
+        self.instr = array('H', [ 0 ] * 32)
+        self._version = 0
+        self.clock = 0
+        self.irq = 0
+        self.gpio_in = 0
+        self.gpio_out = 0
+        self.gpio_dir = 0
+        self.pin_log: list[tuple[int, int]]|None = [ ] if log else None
+        self.irq_log: list[tuple[int, int]]|None = [ ] if log else None
+        self.sm = [ StateMachine(self, i) for i in range(4) ]
+        return
+
+    def load(self, program: 'PIOProgram', offset: int=0) -> int:
+        """Copy the opcodes to instruction memory at `offset`, as rp2"""
+        codes = program.relocate(offset)
+        if offset + len(codes) > 32:
+            raise ValueError('program does not fit')
+        for code in codes:
+            check_word(code)
+        for i, code in enumerate(codes):
+            self.instr[offset + i] = code
+        self._version += 1
+        return offset
+
+    def state_machine(self, index: int, program: 'PIOProgram|None'=None,
+                      offset: int=0, **config) -> StateMachine:
+        """Configure and enable SM `index`, as rp2.StateMachine"""
+        sm = self.sm[index]
+        if program is not None:
+            sm.init(program, offset, **config)
+        elif config:
+            sm.configure(**config)
+        sm.active(True)
+        return sm
+
+    def pins(self) -> int:
+        return (self.gpio_out & self.gpio_dir) | (self.gpio_in & ~self.gpio_dir)
+
+    def set_pins(self, value: int, clock: int):
+        if value != self.gpio_out:
+            self.gpio_out = value
+            if self.pin_log is not None:
+                self.pin_log.append(( clock, value ))
+
+    def set_pindirs(self, value: int, clock: int):
+        self.gpio_dir = value
+
+    def set_irq(self, n: int):
+        self.irq |= 1 << n
+        if self.irq_log is not None:
+            self.irq_log.append(( self.clock, n ))
+
+    def clear_irq(self, n: int):
+        self.irq &= ~(1 << n)
+
+    def run(self, cycles: int):
+        """Advance all enabled SMs by `cycles` clocks
+
+        SMs execute in index order within a clock.  Clocks where
+        every SM is in a delay, or stalled with nothing else able to
+        unstall it, are skipped over.
+        """
+        end = self.clock + cycles
+        sms = [ sm for sm in self.sm if sm.enabled ]
+        if len(sms) == 1:
+            self._run_one(sms[0], end)
+            return
+        t = self.clock
+        while t < end:
+            self.clock = t
+            progressed = stalled = False
+            nxt = end
+            for sm in sms:
+                if sm._ready <= t:
+                    sm._ready = sm._step(t)
+                    if not sm.stalled:
+                        progressed = True
+                if sm.stalled:
+                    stalled = True
+                elif sm._ready < nxt:
+                    nxt = sm._ready
+            if stalled and progressed:
+                nxt = t + 1
+            t = nxt
+        self.clock = end
+        return
+
+    def _run_one(self, sm: StateMachine, end: int):
+        step = sm._step
+        t = max(self.clock, sm._ready)
+        while t < end:
+            self.clock = t
+            t = step(t)
+            if sm.stalled:
+                # Only the test can unstall a single SM.
+                t = end
+        sm._ready = t
+        self.clock = end
+        return
+
+#--#
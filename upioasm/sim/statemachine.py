@@ -0,0 +1,428 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .block import PIOBlock
+    from ..program import PIOProgram
+
+M32 = 0xffffffff
+FIFO_DEPTH = 4
+
+
+def _rotl(v: int, n: int) -> int:
+    n &= 31
+    return ((v << n) | (v >> (32 - n))) & M32
+
+
+def check_word(word: int) -> int:
+    """`word` unless it uses an encoding the model rejects"""
+    if word >> 13 == 1 and (word >> 5) & 3 == 3:
+        raise ValueError(f'reserved wait source in 0x{word:04x}')
+    return word
+
+
+def _reverse(v: int) -> int:
+    r = 0
+    for _ in range(32):
+        r = (r << 1) | (v & 1)
+        v >>= 1
+    return r
+
+
+class StateMachine:
+    """StateMachine - cycle-level model of one PIO state machine
+
+    Instructions are decoded once per load into tuples of
+    ( handler, arg1, arg2, side-set, delay ) so the run loop is a
+    table lookup and one call per executed instruction.  Delay
+    cycles are skipped over by the PIOBlock scheduler instead of
+    being stepped one at a time.
+
+    Config follows rp2.StateMachine where it can, with pin
+    groups given as ( base, count ) numbers:
+
+        in_base, out_base, out_count, set_base, set_count,
+        sideset_base, jmp_pin,
+        in_shiftdir, out_shiftdir (0=left, 1=right),
+        autopush, push_thresh, autopull, pull_thresh,
+        status_sel (0=tx, 1=rx), status_n
+    """
+
+    def __init__(self, block: 'PIOBlock', index: int):
+        self._block = block
+        self.index = index
+        self.enabled = False
+        self.configure()
+        self.restart()
+        return
+
+    def configure(self, *, wrap_target=0, wrap=31,
+                  sideset_count=0, side_opt=False, side_pindirs=False,
+                  in_base=0, out_base=0, out_count=32, set_base=0,
+                  set_count=5, sideset_base=0, jmp_pin=0,
+                  in_shiftdir=0, out_shiftdir=0,
+                  autopush=False, push_thresh=32,
+                  autopull=False, pull_thresh=32,
+                  status_sel=0, status_n=0):
+        """Set the SM config registers, sideset_count excludes opt"""
+        self.wrap_target = wrap_target
+        self.wrap = wrap
+        self._ss_bits = sideset_count + side_opt
+        self._ss_opt = side_opt
+        self._ss_pindirs = side_pindirs
+        self._ss_mask = _rotl((1 << sideset_count) - 1, sideset_base)
+        self._ss_base = sideset_base
+        self.in_base = in_base
+        self.out_base = out_base
+        self.out_count = out_count
+        self.set_base = set_base
+        self.set_count = set_count
+        self.jmp_pin = jmp_pin
+        self.in_shiftdir = in_shiftdir
+        self.out_shiftdir = out_shiftdir
+        self.autopush = autopush
+        self.push_thresh = push_thresh or 32
+        self.autopull = autopull
+        self.pull_thresh = pull_thresh or 32
+        self.status_sel = status_sel
+        self.status_n = status_n
+        self._code: list[tuple]|None = None
+        return
+
+    def init(self, program: 'PIOProgram', offset: int=0, **config):
+        """Configure for a program already loaded at `offset`"""
+        wrap_target, wrap = program.get_wrap()
+        count, opt, pindirs = program.get_side_set()
+        self.configure(
+            wrap_target=wrap_target + offset, wrap=wrap + offset,
+            sideset_count=count, side_opt=opt, side_pindirs=pindirs,
+            **config,
+        )
+        self.restart()
+        self.pc = offset
+        return self
+
+    def restart(self):
+        """Clear the internal state, as SM_RESTART"""
+        self.pc = self.wrap_target
+        self.x = self.y = 0
+        self.isr = self.osr = 0
+        self.isr_count = 0
+        self.osr_count = 32  # Empty
+        self.tx: list[int] = [ ]
+        self.rx: list[int] = [ ]
+        self.stalled = False
+        self._irq_waiting = False
+        self._exec: int|None = None
+        self._ready = self._block.clock
+        return
+
+    def active(self, value: bool|None=None) -> bool:
+        if value is not None:
+            self.enabled = bool(value)
+            self._ready = self._block.clock
+        return self.enabled
+
+    #--- Host side FIFO access
+
+    def put(self, word: int) -> bool:
+        """Push to the TX FIFO, False if full"""
+        if len(self.tx) >= FIFO_DEPTH:
+            return False
+        self.tx.append(word & M32)
+        return True
+
+    def get(self) -> int|None:
+        """Pop from the RX FIFO, None if empty"""
+        return self.rx.pop(0) if self.rx else None
+
+    #--- Decode
+
+    def decode(self, word: int) -> tuple:
+        op = check_word(word) >> 13
+        ds = (word >> 8) & 0x1f
+        a1 = (word >> 5) & 7
+        a2 = word & 0x1f
+        nd = 5 - self._ss_bits
+        side = -1
+        if self._ss_bits:
+            side = ds >> nd
+            if self._ss_opt:
+                en = 1 << (self._ss_bits - 1)
+                side = (side & (en - 1)) if side & en else -1
+        delay = ds & ((1 << nd) - 1)
+        fn = _HANDLERS[op]
+        if fn is None:
+            fn = StateMachine._pull if a1 & 4 else StateMachine._push
+        return ( fn, a1, a2, side, delay )
+
+    def _decode_all(self) -> list[tuple]:
+        code = self._code = [ self.decode(w) for w in self._block.instr ]
+        self._code_version = self._block._version
+        return code
+
+    #--- Execute
+
+    def _step(self, clock: int) -> int:
+        # Execute one instruction at `clock`, returns the next clock
+        # this SM needs to run.
+        code = self._code
+        if code is None or self._code_version != self._block._version:
+            code = self._decode_all()
+        word = self._exec
+        if word is not None:
+            # out/mov exec, runs instead of the next fetch
+            self._exec = None
+            fn, a1, a2, side, delay = self.decode(word)
+            pc = -1
+        else:
+            pc = self.pc
+            fn, a1, a2, side, delay = code[pc]
+        if side >= 0:
+            self._side_set(side, clock)
+        npc = fn(self, a1, a2)
+        if npc is None:
+            # Stalled, retry without delay
+            self.stalled = True
+            if pc < 0:
+                self._exec = word
+            return clock + 1
+        self.stalled = False
+        if npc < 0:
+            if pc < 0:
+                npc = self.pc  # exec'd instruction falls through
+            elif pc == self.wrap:
+                npc = self.wrap_target
+            else:
+                npc = (pc + 1) & 31
+        self.pc = npc
+        if self._exec is not None:
+            # The delay of out/mov exec is ignored
+            return clock + 1
+        return clock + 1 + delay
+
+    def _side_set(self, side: int, clock: int):
+        b = self._block
+        v = _rotl(side, self._ss_base) & self._ss_mask
+        if self._ss_pindirs:
+            b.set_pindirs((b.gpio_dir & ~self._ss_mask) | v, clock)
+        else:
+            b.set_pins((b.gpio_out & ~self._ss_mask) | v, clock)
+
+    def _pins_in(self) -> int:
+        return _rotl(self._block.pins(), 32 - self.in_base)
+
+    def _irq_num(self, a2: int) -> int:
+        # Bit 4 => rel, add SM index modulo 4
+        if a2 & 0x10:
+            return (a2 & 4) | ((a2 + self.index) & 3)
+        return a2 & 7
+
+    # Handlers return the next pc, -1 for the next instruction, or
+    # None to stall.
+
+    def _jmp(self, cond: int, addr: int):
+        if cond == 0:
+            return addr
+        if cond == 1:
+            return addr if self.x == 0 else -1
+        if cond == 2:
+            x = self.x
+            self.x = (x - 1) & M32
+            return addr if x else -1
+        if cond == 3:
+            return addr if self.y == 0 else -1
+        if cond == 4:
+            y = self.y
+            self.y = (y - 1) & M32
+            return addr if y else -1
+        if cond == 5:
+            return addr if self.x != self.y else -1
+        if cond == 6:
+            return addr if (self._block.pins() >> self.jmp_pin) & 1 else -1
+        # !osre
+        return addr if self.osr_count < self.pull_thresh else -1
+
+    def _wait(self, a1: int, index: int):
+        pol = a1 >> 2
+        source = a1 & 3
+        if source == 0:
+            level = (self._block.pins() >> index) & 1
+        elif source == 1:
+            level = (self._block.pins() >> ((self.in_base + index) & 31)) & 1
+        else:
+            # irq, source 3 is rejected by decode
+            n = self._irq_num(index)
+            level = (self._block.irq >> n) & 1
+            if level == pol and pol:
+                self._block.clear_irq(n)
+            return -1 if level == pol else None
+        return -1 if level == pol else None
+
+    def _source(self, src: int) -> int:
+        if src == 0:
+            return self._pins_in()
+        if src == 1:
+            return self.x
+        if src == 2:
+            return self.y
+        if src == 6:
+            return self.isr
+        if src == 7:
+            return self.osr
+        if src == 5:
+            # status, all-ones when FIFO level < N
+            n = len(self.rx if self.status_sel else self.tx)
+            return M32 if n < self.status_n else 0
+        return 0  # null or reserved
+
+    def _in(self, src: int, count: int):
+        n = count or 32
+        if self.autopush and self.isr_count >= self.push_thresh:
+            if len(self.rx) >= FIFO_DEPTH:
+                return None
+            self.rx.append(self.isr)
+            self.isr = 0
+            self.isr_count = 0
+        data = self._source(src) & ((1 << n) - 1)
+        if self.in_shiftdir:
+            self.isr = ((self.isr >> n) | (data << (32 - n))) & M32
+        else:
+            self.isr = ((self.isr << n) | data) & M32
+        self.isr_count = min(self.isr_count + n, 32)
+        if self.autopush and self.isr_count >= self.push_thresh:
+            if len(self.rx) < FIFO_DEPTH:
+                self.rx.append(self.isr)
+                self.isr = 0
+                self.isr_count = 0
+        return -1
+
+    def _out(self, dest: int, count: int):
+        n = count or 32
+        if self.autopull and self.osr_count >= self.pull_thresh:
+            if not self.tx:
+                return None
+            self.osr = self.tx.pop(0)
+            self.osr_count = 0
+        if self.out_shiftdir:
+            data = self.osr & ((1 << n) - 1)
+            self.osr = (self.osr >> n) if n < 32 else 0
+        else:
+            data = self.osr >> (32 - n)
+            self.osr = (self.osr << n) & M32
+        self.osr_count = min(self.osr_count + n, 32)
+        return self._write(dest, data, n)
+
+    def _write(self, dest: int, data: int, count: int):
+        # Shared by out/mov/set destinations
+        b = self._block
+        if dest == 1:
+            self.x = data
+        elif dest == 2:
+            self.y = data
+        elif dest == 5:
+            return data & 31
+        elif dest == 0 or dest == 4:
+            mask = _rotl((1 << count) - 1, self.out_base)
+            v = _rotl(data, self.out_base) & mask
+            if dest == 0:
+                b.set_pins((b.gpio_out & ~mask) | v, b.clock)
+            else:
+                b.set_pindirs((b.gpio_dir & ~mask) | v, b.clock)
+        elif dest == 6:
+            self.isr = data
+            self.isr_count = count
+        elif dest == 7:
+            self._exec = data & 0xffff
+        return -1
+
+    def _push(self, a1: int, a2: int):
+        if a1 & 2 and self.isr_count < self.push_thresh:
+            return -1  # iffull
+        if len(self.rx) >= FIFO_DEPTH:
+            if a1 & 1:
+                return None  # block
+        else:
+            self.rx.append(self.isr)
+        self.isr = 0
+        self.isr_count = 0
+        return -1
+
+    def _pull(self, a1: int, a2: int):
+        if a1 & 2 and self.osr_count < self.pull_thresh:
+            return -1  # ifempty
+        if self.tx:
+            self.osr = self.tx.pop(0)
+        elif a1 & 1:
+            return None  # block
+        else:
+            self.osr = self.x
+        self.osr_count = 0
+        return -1
+
+    def _mov(self, dest: int, a2: int):
+        op = a2 >> 3
+        data = self._source(a2 & 7)
+        if op == 1:
+            data = ~data & M32
+        elif op == 2:
+            data = _reverse(data)
+        if dest == 0:
+            return self._write(0, data, self.out_count)
+        if dest == 4:
+            self._exec = data & 0xffff
+            return -1
+        if dest == 6:
+            self.isr = data
+            self.isr_count = 0
+            return -1
+        if dest == 7:
+            self.osr = data
+            self.osr_count = 0
+            return -1
+        return self._write(dest, data, 32)
+
+    def _irq(self, a1: int, a2: int):
+        b = self._block
+        n = self._irq_num(a2)
+        if a1 & 2:
+            b.clear_irq(n)
+            return -1
+        if self._irq_waiting:
+            if (b.irq >> n) & 1:
+                return None
+            self._irq_waiting = False
+            return -1
+        b.set_irq(n)
+        if a1 & 1:
+            self._irq_waiting = True
+            return None
+        return -1
+
+    def _set(self, dest: int, data: int):
+        b = self._block
+        if dest == 1:
+            self.x = data
+        elif dest == 2:
+            self.y = data
+        elif dest == 0 or dest == 4:
+            mask = _rotl((1 << self.set_count) - 1, self.set_base)
+            v = _rotl(data, self.set_base) & mask
+            if dest == 0:
+                b.set_pins((b.gpio_out & ~mask) | v, b.clock)
+            else:
+                b.set_pindirs((b.gpio_dir & ~mask) | v, b.clock)
+        return -1
+
+
+_HANDLERS = (
+    StateMachine._jmp,
+    StateMachine._wait,
+    StateMachine._in,
+    StateMachine._out,
+    None,  # push/pull
+    StateMachine._mov,
+    StateMachine._irq,
+    StateMachine._set,
+)
+
+#--#
@@ -4,11 +4,31 @@ from typing import Any, Callable, Union, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .assembler import PIOAssembler
+    from .emitter import InstructionVisitor
 
-from .emitter import InstructionVisitor
+from .error import PIOSyntaxError
 from .registers import *
 
-_asm: PIOAssembler # = None
+try:
+    from _thread import _local
+except ImportError:
+    class _local:  # type: ignore[no-redef]
+        pass  # micropython, one thread assembles at a time
+
+# The assembler running a DSL body, per thread
+_active = _local()
+
+def _asm() -> 'PIOAssembler':
+    a = getattr(_active, 'asm', None)
+    if a is None:
+        raise PIOSyntaxError('outside of asm_pio')
+    return a
+
+def _enter(asm: 'PIOAssembler|None') -> 'PIOAssembler|None':
+    # Make `asm` active, => the one it replaces (asm_pio may nest)
+    previous = getattr(_active, 'asm', None)
+    _active.asm = asm
+    return previous
 
 Symbol = str
 Value = Union[int, Symbol]
@@ -35,6 +55,8 @@ class Label:
         jmp(L50)
     """
 
+    __slots__ = ( '_name', '_callback' )
+
     def __init__(self, name: str, callback: Callable[['Label'], None]):
         self._name = name
         self._callback = callback
@@ -58,29 +80,29 @@ class Label:
 
 def dot_define(symbol: str, value: Value, *, public: bool=False):
     """.define (public) <symbol> <value>"""
-    return _asm.define(symbol, value, public)
+    return _asm().define(symbol, value, public)
 
 def dot_origin(offset: Value):
     """.origin <offset>"""
-    return _asm.origin(offset)
+    return _asm().origin(offset)
 
 def dot_side_set(count: int, *, opt=True, pindirs=False):
     """.side_set <count> (opt) (pindirs)"""
-    return _asm.side_set(count, opt, pindirs)
+    return _asm().side_set(count, opt, pindirs)
 
 def dot_wrap_target():
     """.wrap_target"""
-    return _asm.wrap_target()
+    return _asm().wrap_target()
 
 def dot_wrap():
     """.wrap"""
-    return _asm.wrap()
+    return _asm().wrap()
 
 #def dot_lang_opt(): pass
 
 def dot_word(value: Value):
     """.word <value>"""
-    return _asm.word(value)
+    return _asm().word(value)
 
 #def dot_pio_version(): pass
 
@@ -99,17 +121,19 @@ def dot_mov_status():
 #--------------------------------------------------#
 
 def label(symbol: str='', *, public=False, forward=False):
-    return _asm.label(symbol, public=public, forward=forward)
+    return _asm().label(symbol, public=public, forward=forward)
 
 #--------------------------------------------------#
 
 class Instruction:
-    _delay: Value|None = None
-    _side: Value|None = None
+    # Slots throughout, no instance __dict__
+    __slots__ = ( '_delay', '_side' )
     _name = '-setme-'
 
     def __init__(self) -> None:
-        _asm.append(self)
+        self._delay: Value|None = None
+        self._side: Value|None = None
+        _asm().append(self)
         return
 
     def side(self, value: Value):
@@ -123,7 +147,7 @@ class Instruction:
     def __getitem__(self, count: Value):
         return self.delay(count)
 
-    def visit(self, v: InstructionVisitor) -> None:
+    def visit(self, v: 'InstructionVisitor') -> None:
         if self._delay is not None:
             v.delay(self._delay)
         if self._side is not None:
@@ -131,6 +155,7 @@ class Instruction:
 
 
 class _jmp(Instruction):
+    __slots__ = ( '_target', )
     _name = 'jmp'
     _cond = 'always'
 
@@ -140,50 +165,60 @@ class _jmp(Instruction):
         self._target = target
         super().__init__()
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.jmp('' if self._cond == 'always' else self._cond, self._target)
         super().visit(v)
 
 
 class jmp(_jmp):
     """jmp <target>"""
+    __slots__ = ()
 
     class not_x(_jmp):
         """jmp !x <target>"""
+        __slots__ = ()
         _cond = '!x'
 
     class x_dec(_jmp):
         """jmp x--, <target>"""
+        __slots__ = ()
         _cond = 'x--'
 
     class not_y(_jmp):
         """jmp !y, <target>"""
+        __slots__ = ()
         _cond = '!y'
 
     class y_dec(_jmp):
         """jmp y--, <target>"""
+        __slots__ = ()
         _cond = 'y--'
 
     class x_not_y(_jmp):
         """jmp x!=y, <target>"""
+        __slots__ = ()
         _cond = 'x!=y'
 
     class pin(_jmp):
         """jmp pin, <target>"""
+        __slots__ = ()
         _cond = 'pin'
 
     class not_osre(_jmp):
         """jmp !osre, <target>"""
+        __slots__ = ()
         _cond = '!osre'
 
 
 class wait(Instruction):
+    __slots__ = ( '_pol', '_source', '_index', '_rel' )
     _name = 'wait'
-    _rel = False
 
     def __init__(self, pol: int):
         self._pol = pol
         self._source = '?'
+        self._index = 0
+        self._rel = False
         super().__init__()
 
     def gpio(self, gpio_num: int):
@@ -199,39 +234,42 @@ class wait(Instruction):
         self._index = irq_num
         self._rel = rel
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.wait(self._pol, self._source, self._index, rel=self._rel)
         super().visit(v)
 
 
 class in_(Instruction):
     """in <source>, <bit_count>"""
+    __slots__ = ( '_source', '_count' )
     _name = 'in'
     def __init__(self, source: InSourceReg, bit_count: int):
         self._source = source
         self._count = bit_count
         super().__init__()
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.in_(self._source._name, self._count)
         super().visit(v)
 
 
 class out(Instruction):
     """out <destination>, <bit_count>"""
+    __slots__ = ( '_dest', '_count' )
     _name = 'out'
     def __init__(self, dest: OutDestReg, bit_count: int):
         self._dest = dest
         self._count = bit_count
         super().__init__()
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.out(self._dest._name, self._count)
         super().visit(v)
 
 
 class push(Instruction):
     """push (iffull) (block|noblock)"""
+    __slots__ = ( '_iffull', '_block' )
     _name = 'push'
 
     def __init__(self, *, iffull=False, block=True):
@@ -239,13 +277,14 @@ class push(Instruction):
         self._block = block
         super().__init__()
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.push(iffull=self._iffull, block=self._block)
         super().visit(v)
 
 
 class pull(Instruction):
     """pull (ifempty) (block|noblock)"""
+    __slots__ = ( '_ifempty', '_block' )
     _name = 'pull'
 
     def __init__(self, *, ifempty=False, block=True):
@@ -253,13 +292,14 @@ class pull(Instruction):
         self._block = block
         super().__init__()
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.pull(ifempty=self._ifempty, block=self._block)
         super().visit(v)
 
 
 class mov(Instruction):
     """mov <destination>, (op) <source>"""
+    __slots__ = ( '_dest', '_source' )
     _name = 'mov'
 
     def __init__(self, dest: MovDestReg, source: MovSourceReg):
@@ -267,46 +307,53 @@ class mov(Instruction):
         self._source = source
         super().__init__()
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.mov(self._dest._name, self._source._name)
         super().visit(v)
 
 
 class _irq(Instruction):
+    __slots__ = ( '_index', '_rel' )
     _name = 'irq'
     _clear = False
-    _wait = True
+    _wait = False
 
     def __init__(self, irq_num: int, *, rel=False):
         self._index = irq_num
         self._rel = rel
         super().__init__()
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.irq(self._index, rel=self._rel, clear=self._clear, wait=self._wait)
         super().visit(v)
 
 
 class irq(_irq):
     """irq <irq_num> (rel) ;; same as irq.set"""
+    __slots__ = ()
 
     class set(_irq):
         """irq set <irq_num> (rel) ;; set irq flag, nowait"""
+        __slots__ = ()
 
     class nowait(_irq):
         """irq nowait <irq_num> (rel) ;; same as irq.set"""
+        __slots__ = ()
 
     class wait(_irq):
         """irq wait <irq_num> (rel) ;; set irq flag, wait for it to clear"""
+        __slots__ = ()
         _wait = True
 
     class clear(_irq):
         """irq clear <irq_num> (rel) ;; clear irq flag"""
+        __slots__ = ()
         _clear = True
 
 
 class set(Instruction):
     """set <destination>, <value>"""
+    __slots__ = ( '_dest', '_data' )
     _name = 'set'
 
     def __init__(self, dest: SetDestReg, data: Value):
@@ -314,16 +361,17 @@ class set(Instruction):
         self._data = data
         super().__init__()
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.set(self._dest._name, self._data)
         super().visit(v)
 
 
 class nop(Instruction):
     """nop ;; same as mov y, y"""
+    __slots__ = ()
     _name = 'nop'
 
-    def visit(self, v: InstructionVisitor):
+    def visit(self, v: 'InstructionVisitor'):
         v.nop()
         super().visit(v)
 
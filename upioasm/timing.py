@@ -0,0 +1,286 @@
+from heapq import heappush, heappop
+from typing import Iterator, Union
+
+from .emitter import InstructionVisitor
+
+Symbol = str
+Value = Union[Symbol, int]
+State = tuple  # ( pc, x, y ), x/y None when not known
+
+INF = float('inf')
+
+# mov source => index into ( unknown, x, y, 0 )
+_MOV_KNOWN = { 'x': 1, 'y': 2, 'null': 3 }
+
+
+class _Instr:
+    __slots__ = ( 'op', 'arg', 'value', 'delay', 'blocking' )
+
+    def __init__(self, op: str, arg: str='', value: int=0, blocking: bool=False):
+        self.op = op
+        self.arg = arg
+        self.value = value
+        self.delay = 0
+        self.blocking = blocking
+
+
+class TimingVisitor(InstructionVisitor):
+    """Collect what the cycle analysis needs, behind a ResolverVisitor"""
+
+    def __init__(self) -> None:
+        self._ilist: list[_Instr] = [ ]
+
+    def __iter__(self) -> Iterator[_Instr]:
+        return iter(self._ilist)
+
+    def __len__(self):
+        return len(self._ilist)
+
+    def _add(self, op: str, arg: str='', value: int=0, blocking: bool=False):
+        self._ilist.append(_Instr(op, arg, value, blocking))
+        return self
+
+    def delay(self, delay: Value) -> InstructionVisitor:
+        self._ilist[-1].delay = int(delay)
+        return self
+
+    def jmp(self, cond: str, addr: Value) -> InstructionVisitor:
+        return self._add('jmp', cond, int(addr))
+
+    def wait(self, pol: Value, source: str, index: Value, *, rel=False) -> InstructionVisitor:
+        return self._add('wait', blocking=True)
+
+    def in_(self, source: str, count: Value) -> InstructionVisitor:
+        return self._add('in')
+
+    def out(self, dest: str, count: Value) -> InstructionVisitor:
+        return self._add('out', dest)
+
+    def push(self, *, iffull: bool=False, block: bool=True) -> InstructionVisitor:
+        return self._add('push', blocking=block)
+
+    def pull(self, *, ifempty: bool=False, block: bool=True) -> InstructionVisitor:
+        return self._add('pull', blocking=block)
+
+    def mov(self, dest: str, op: str, source: str='') -> InstructionVisitor:
+        # Only a plain copy of x, y or null keeps a known value.
+        src = (op + source) if (op and source) else (op or source)
+        return self._add('mov', dest, _MOV_KNOWN.get(src, 0))
+
+    def irq(self, irq_num: Value, *, rel=False, clear=False, wait=False) -> InstructionVisitor:
+        return self._add('irq', blocking=wait and not clear)
+
+    def set(self, dest: str, data: Value) -> InstructionVisitor:
+        return self._add('set', dest, int(data))
+
+    def nop(self) -> InstructionVisitor:
+        return self._add('mov')
+
+
+class CycleAnalyzer:
+    """CycleAnalyzer - static best/worst cycle counts
+
+    Explores ( pc, x, y ) states from the program entry, x and y
+    are known after a `set` (or a copy of a known value) so the
+    trip count of a `jmp x--`/`y--` loop follows.  Each instruction
+    costs 1 + delay cycles.
+
+    Counts are from the first arrival at `start` to the next arrival
+    at `end`.  The worst case is None (unbounded) when a path can
+    block (wait, blocking push/pull, irq wait), loop on an unknown
+    condition or jump to a computed address.  The best case assumes
+    no stalls, and is None when `end` is never reached.
+    """
+
+    def __init__(self, ilist: list[_Instr], wrap_target: int=0, wrap: int=-1,
+                 labels: dict[str, int]|None=None, entry: int=0):
+        self._ilist = ilist
+        self._wrap_target = wrap_target
+        self._wrap = wrap if wrap >= 0 else len(ilist) - 1
+        self._labels = labels or { }
+        self._steps: dict[State, tuple[int, list, bool]] = { }
+        start = ( entry, None, None )
+        self._reached = self._explore([ start ], -1)
+        self._reached.add(start)
+
+    def _addr(self, where: Value) -> int:
+        return where if isinstance(where, int) else self._labels[where]
+
+    def _next(self, pc: int) -> int:
+        if pc == self._wrap:
+            return self._wrap_target
+        pc += 1
+        return pc if pc < len(self._ilist) else -1
+
+    def _step(self, state: State) -> tuple[int, list, bool]:
+        # => ( cycles, next states (-1 pc for unknown), blocking )
+        r = self._steps.get(state)
+        if r is not None:
+            return r
+        pc, x, y = state
+        i = self._ilist[pc]
+        nxt = self._next(pc)
+        op = i.op
+        succ: list[State]
+        if op == 'jmp':
+            cond = i.arg
+            taken = ( i.value, x, y )
+            fall = ( nxt, x, y )
+            if cond in ( '', 'always' ):
+                succ = [ taken ]
+            elif cond in ( '!x', '!y' ):
+                v = x if cond == '!x' else y
+                succ = [ taken, fall ] if v is None else [ taken if v == 0 else fall ]
+            elif cond == 'x--':
+                succ = ([ ( i.value, None, y ), ( nxt, None, y ) ] if x is None
+                        else [ ( i.value, x - 1, y ) ] if x
+                        else [ ( nxt, None, y ) ])
+            elif cond == 'y--':
+                succ = ([ ( i.value, x, None ), ( nxt, x, None ) ] if y is None
+                        else [ ( i.value, x, y - 1 ) ] if y
+                        else [ ( nxt, x, None ) ])
+            elif cond == 'x!=y' and x is not None and y is not None:
+                succ = [ taken if x != y else fall ]
+            else:
+                succ = [ taken, fall ]
+        elif op in ( 'set', 'mov', 'out' ):
+            dest = i.arg
+            if dest in ( 'pc', 'exec' ):
+                succ = [ ( -1, x, y ) ]
+            else:
+                v = None
+                if op == 'set':
+                    v = i.value
+                elif op == 'mov':
+                    v = ( None, x, y, 0 )[i.value]
+                if dest == 'x':
+                    x = v
+                elif dest == 'y':
+                    y = v
+                succ = [ ( nxt, x, y ) ]
+        else:
+            succ = [ ( nxt, x, y ) ]
+        n = len(self._ilist)
+        for k, t in enumerate(succ):
+            if t[0] >= n:
+                succ[k] = ( -1, t[1], t[2] )
+        r = ( 1 + i.delay, succ, i.blocking )
+        self._steps[state] = r
+        return r
+
+    def _explore(self, starts: list[State], end: int) -> set[State]:
+        # States reachable in one or more steps, not going past `end`
+        seen: set[State] = set()
+        todo = list(starts)
+        while todo:
+            for n in self._step(todo.pop())[1]:
+                if n not in seen and n[0] >= 0:
+                    seen.add(n)
+                    if n[0] != end:
+                        todo.append(n)
+        return seen
+
+    def _starts(self, start: int, end: int) -> list[State]:
+        at = [ s for s in self._reached if s[0] == start ]
+        if not at:
+            return [ ( start, None, None ) ]
+        # Drop re-arrivals, unless start is only reached in a loop.
+        again = self._explore(at, end)
+        return [ s for s in at if s not in again ] or at
+
+    def _best(self, starts: list[State], end: int) -> int|None:
+        heap: list = [ ]
+        n = 0
+        for s in starts:
+            cycles, succ, _ = self._step(s)
+            for t in succ:
+                n += 1
+                heappush(heap, ( cycles, n, t ))
+        done: set[State] = set()
+        while heap:
+            cost, _, s = heappop(heap)
+            if s[0] < 0 or s in done:
+                continue
+            if s[0] == end:
+                return cost
+            done.add(s)
+            cycles, succ, _ = self._step(s)
+            for t in succ:
+                n += 1
+                heappush(heap, ( cost + cycles, n, t ))
+        return None
+
+    def _worst(self, starts: list[State], end: int) -> int|None:
+        memo: dict[State, float] = { }
+        worst: float = 0
+        for s in starts:
+            cycles, succ, blocking = self._step(s)
+            w: float = INF if blocking else 0
+            for t in succ:
+                w = max(w, self._longest(t, end, memo))
+            worst = max(worst, cycles + w)
+        return None if worst == INF else int(worst)
+
+    def _longest(self, root: State, end: int, memo: dict[State, float]) -> float:
+        # Longest cycles from `root` to `end`, INF on a loop or block.
+        ON = -1
+        stack = [ root ]
+        while stack:
+            s = stack[-1]
+            m = memo.get(s)
+            if m is None:
+                if s[0] == end:
+                    memo[s] = 0
+                    stack.pop()
+                    continue
+                if s[0] < 0 or self._step(s)[2]:
+                    memo[s] = INF
+                    stack.pop()
+                    continue
+                memo[s] = ON
+                for t in self._step(s)[1]:
+                    if t not in memo:
+                        stack.append(t)
+            elif m == ON:
+                cycles, succ, _ = self._step(s)
+                w: float = 0
+                for t in succ:
+                    mt = memo[t]
+                    w = max(w, INF if mt == ON else mt)
+                memo[s] = cycles + w
+                stack.pop()
+            else:
+                stack.pop()
+        return memo[root]
+
+    def cycles(self, start: Value, end: Value) -> tuple[int|None, int|None]:
+        """( best, worst ) cycles from label/addr `start` to `end`"""
+        a = self._addr(start)
+        b = self._addr(end)
+        starts = self._starts(a, b)
+        best = self._best(starts, b)
+        if best is None:
+            return None, None
+        return best, self._worst(starts, b)
+
+    def wrap_cycles(self) -> tuple[int|None, int|None]:
+        """( best, worst ) cycles once around the .wrap loop"""
+        return self.cycles(self._wrap_target, self._wrap_target)
+
+    def instr_cycles(self, pc: int) -> int:
+        return 1 + self._ilist[pc].delay
+
+    def blocking(self, pc: int) -> bool:
+        return self._ilist[pc].blocking
+
+
+def format_cycles(best: int|None, worst: int|None) -> str:
+    if best is None:
+        return 'never'
+    if worst is None:
+        return f'{best}+ (unbounded)'
+    if best == worst:
+        return f'{best}'
+    return f'{best}..{worst}'
+
+#--#
@@ -0,0 +1,49 @@
+from typing import Callable
+
+try:
+    from micropython import const  # type: ignore[import-not-found]
+except:
+    def const(x: int): return x  # This file only.
+
+
+# Categories
+PARSE = const(1)        # Token shifts, advance/consume
+PRATT = const(2)        # Rule dispatch in parse_precedence
+EXPR = const(4)         # Expression stack push/pop
+STMT = const(8)         # Statements emitted by the parser
+ASM = const(16)         # PIOAssembler.generate defines and listings
+OPT = const(32)         # PeepholeOptimizer report
+ALL = const(63)
+
+
+class Tracer:
+    """Tracer - per-category switch for diagnostic output
+
+    Call sites test the flags before formatting anything, so a
+    disabled category costs one attribute load and an `&`:
+
+        tr = self._trace
+        if tr.flags & trace.PARSE:
+            tr(f'expensive {thing}')
+
+    The sink is any callable taking a line, `print` by default.
+    """
+
+    def __init__(self, flags: int=0, sink: Callable[[str], None]|None=None):
+        self.flags = flags
+        self._sink = print if sink is None else sink
+        return
+
+    def __call__(self, line: str):
+        self._sink(line)
+
+    def enable(self, flags: int):
+        self.flags |= flags
+
+    def disable(self, flags: int):
+        self.flags &= ~flags
+
+    def set_sink(self, sink: Callable[[str], None]):
+        self._sink = sink
+
+#--#